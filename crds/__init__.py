@@ -15,6 +15,7 @@ __rationale__ = "Define known JWST step parameter reftypes"
 
 __all__ = [
     "getrecommendations",
+    "getrecommendations_batch",
     "getreferences",
     "assign_bestrefs",
     "get_pickled_mapping",
@@ -38,7 +39,7 @@ from .core import exceptions
 from .core.exceptions import *
 from .core.constants import ALL_OBSERVATORIES, INSTRUMENT_KEYWORDS
 
-from .core.heavy_client import getreferences, getrecommendations
+from .core.heavy_client import getreferences, getrecommendations, getrecommendations_batch
 from .core.heavy_client import get_symbolic_mapping, get_pickled_mapping
 from .core.heavy_client import get_context_name
 
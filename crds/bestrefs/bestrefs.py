@@ -7,6 +7,8 @@ For more details on the several modes of operations and command line parameters
 """
 import sys
 import os
+import itertools
+import multiprocessing
 from collections import namedtuple, OrderedDict
 
 # ===================================================================
@@ -113,6 +115,11 @@ crds.bestrefs use cases
   reprocessing.  See *crds bestrefs --help* for more information on individual
   switches.
 
+  Within each affected type,  only datasets whose parameters fall inside the
+  match cases and useafter dates changed by the new rules are looked up.
+  Changes which cannot be localized,  e.g. rmap header changes,  select every
+  dataset of the type.  --all-affected-types disables this screening.
+
   Running reprocessing mode requires setting *CRDS_SERVER_URL*.
 
   3. Context Testing Mode
@@ -172,7 +179,7 @@ best references::
 
   --datasets is used to specify a list of dataset IDs as would be found under --instruments.
 
-  --load-pickles can be used to specify a list of .pkl or .json files that define parameter
+  --load-pickles can be used to specify a list of .pkl, .json, or .npz files that define parameter
     sets.  These can most easily be created using --save-pickle.
 
 ................
@@ -204,7 +211,7 @@ source in command line order.
 crds.bestrefs can save the parameters obtained from various sources into .pkl
 or .json formatted save files using --save-pickle.  The single combined result
 of multiple pickle or instrument parameter sources is saved.  The file
-extension (.json or .pkl) defines the format used.
+extension (.json, .pkl, or .npz) defines the format used.
 
 The preferred .json format defines a singleton { id: parameters}
 dictionary on each line as a series of isolated .json objects.  Strictly
@@ -213,6 +220,11 @@ speaking only each individual line is .json,  but this localizes any errors.
 .json format is preferred over .pkl because it is more transparent and robust
 across different versions of Python.
 
+The .npz header store format is a columnar,  dictionary encoded NumPy file
+intended for archive scale parameter sets.  It is much smaller on disk and in
+memory than .pkl or .json since headers are decoded one at a time as they are
+processed.  When loading an .npz file,  --only-ids limits the datasets read.
+
 .........
 Verbosity
 .........
@@ -277,6 +289,8 @@ than errors as the default.
 
         cmdline.UniqueErrorsMixin.__init__(self, *args, **keys)
 
+        self.log_capture = None    # LogCapture deferring tracked errors in --processes workers
+
         self.updates = OrderedDict()  # map of reference updates
         self.kill_list = OrderedDict()
 
@@ -284,6 +298,8 @@ than errors as the default.
 
         self.skip_filekinds = [typ.lower() for typ in self.args.skip_types]
         self.affected_instruments = None
+        self.affected_regions = None
+        self._region_types = (None, None)   # (dataset, affected types) of last region check
 
         # See also complex_init()
         self.new_context = None     # Mapping filename
@@ -327,6 +343,8 @@ than errors as the default.
                 self.observatory, self.old_context, self.new_context,
                 include_header_diffs=True, hide_boring_diffs=True)
             self.affected_instruments = differ.get_affected()
+            if not self.args.all_affected_types:
+                self.affected_regions = differ.get_affected_regions()
             log.info("Mapping differences from", repr(self.old_context),
                      "-->", repr(self.new_context), "affect:\n",
                      log.PP(self.affected_instruments))
@@ -446,10 +464,10 @@ than errors as the default.
                           help="Instruments to compute best references for, all historical datasets in database.")
 
         self.add_argument("-p", "--load-pickles", nargs="*", default=None,
-                          help="Load dataset headers and prior bestrefs from pickle files,  in worst-to-best update order.  Can also load .json files.")
+                          help="Load dataset headers and prior bestrefs from pickle files,  in worst-to-best update order.  Can also load .json or .npz files.")
 
         self.add_argument("-a", "--save-pickle", default=None,
-                          help="Write out the combined dataset headers to the specified pickle file.  Can also store .json file.")
+                          help="Write out the combined dataset headers to the specified pickle file.  Can also store .json or .npz file.")
 
         self.add_argument("-t", "--types", nargs="+",  metavar="REFERENCE_TYPES",  default=(),
                           help="Explicitly define the list of reference types to process, --skip-types also still applies.")
@@ -463,6 +481,10 @@ than errors as the default.
         self.add_argument("--diffs-only", action="store_true", default=None,
                           help="For context-to-context comparison, choose only instruments and types from context differences.")
 
+        self.add_argument("--all-affected-types", action="store_true",
+                          help="With --diffs-only, compute bestrefs for every dataset of the affected types, not only "
+                          "datasets which fall within the changed match cases and useafter dates.")
+
         self.add_argument("--datasets-since", default=None, type=reformat_date_or_auto,
                           help="Cut-off date for datasets, none earlier than this.  Use 'auto' to exploit reference USEAFTER.  OFF by default.")
 
@@ -537,6 +559,9 @@ than errors as the default.
         self.add_argument("--eliminate-duplicate-cases", action="store_true",
                           help="Categorize unique bestrefs results as errors to determine representative test cases...  Replaces normal error counts with coverage counts and ids.")
 
+        self.add_argument("--processes", type=int, default=1, metavar="N",
+                          help="Compute bestrefs using N forked worker processes.  Results are merged in dataset order.")
+
         cmdline.UniqueErrorsMixin.add_args(self)
 
     def setup_contexts(self):
@@ -668,10 +693,13 @@ than errors as the default.
         """Compute bestrefs for datasets."""
         # Finish __init__() inside --pdb
         if self.complex_init():
-            for i, dataset in enumerate(self.new_headers):
-                if i != 0 and i % 1000 == 0:
-                    log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
-                self.process(dataset)
+            if self.args.processes > 1:
+                self.process_parallel(self.new_headers, self.args.processes)
+            else:
+                for i, dataset in enumerate(self.new_headers):
+                    if i != 0 and i % 1000 == 0:
+                        log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
+                    self.process(dataset)
             self.post_processing()
         self.report_stats()
         if self.args.eliminate_duplicate_cases:
@@ -698,6 +726,68 @@ than errors as the default.
             self.increment_stat("datasets", 1)
             self._process(dataset)
 
+    def process_parallel(self, datasets, processes):
+        """Process `datasets` in contiguous shards using `processes` forked workers,
+        merging each shard's updates, kill list, stats, headers, and tracked errors back
+        into `self` in dataset order so that results match a serial run.   Workers inherit
+        the loaded contexts and headers from this process.   When headers are fetched by
+        segment,  shards are whole segments so that each segment is fetched only once.
+        """
+        datasets = list(datasets)
+        shards = self.shard_datasets(datasets, processes)
+        log.verbose("Processing", len(datasets), "sources in", len(shards), "shards using",
+                    processes, "processes.", verbosity=5)
+        global _PARALLEL_SCRIPT
+        _PARALLEL_SCRIPT = self
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                for results in pool.imap(_process_shard, shards):
+                    self.merge_shard_results(results)
+                    log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
+        finally:
+            _PARALLEL_SCRIPT = None
+
+    def shard_datasets(self, datasets, processes):
+        """Split `datasets` into contiguous shards for process_parallel(),  aligned with
+        the segments headers are fetched in,  if any.
+        """
+        if datasets and self.new_headers.segment_index(datasets[0]) is not None:
+            return [list(shard) for (_index, shard) in
+                    itertools.groupby(datasets, self.new_headers.segment_index)]
+        shard_size = max(1, min(1000, len(datasets) // (processes * 4)))
+        return [datasets[i:i+shard_size] for i in range(0, len(datasets), shard_size)]
+
+    def process_shard(self, datasets):
+        """Process each of `datasets` in a worker and return a ShardResults of its outcomes.
+        Log output and tracked errors are captured so the parent can replay them in dataset
+        order,  applying --max-errors-per-class across all shards.
+        """
+        self.updates, self.kill_list = OrderedDict(), OrderedDict()
+        self.stats.counts.clear()
+        for generator in set(filter(None, [self.new_headers, self.old_headers])):
+            generator.start_worker()
+        keep_headers = self.args.update_pickle or self.args.save_pickle
+        shard_headers = {}
+        with cmdline.LogCapture() as capture:
+            self.log_capture = capture
+            try:
+                for dataset in datasets:
+                    self.process(dataset)
+                    if keep_headers and dataset in self.new_headers.headers:
+                        shard_headers[dataset] = self.new_headers.headers[dataset]
+            finally:
+                self.log_capture = None
+        return ShardResults(self.updates, self.kill_list, dict(self.stats.counts), capture, shard_headers)
+
+    def merge_shard_results(self, results):
+        """Merge the ShardResults of a worker process into the state of `self`."""
+        results.log_capture.replay(self)
+        self.updates.update(results.updates)
+        self.kill_list.update(results.kill_list)
+        for name, amount in results.stats.items():
+            self.increment_stat(name, amount)
+        self.new_headers.merge_headers(results.headers)
+
     def _process(self, dataset):
         """Core best references,  add to update tuples."""
         self.active_header = new_header = self.new_headers.get_lookup_parameters(dataset)
@@ -753,6 +843,8 @@ than errors as the default.
             applicable_types = set(self.locator.header_to_reftypes(header, context))
         if self.affected_instruments:
             types = set(self.affected_instruments[instrument.lower()])
+            if self.affected_regions is not None:
+                types &= self.region_types(instrument, dataset, header)
             if applicable_types:
                 types &= applicable_types
             if not types:
@@ -769,6 +861,27 @@ than errors as the default.
         types = sorted(list(types))
         return types
 
+    def region_types(self, instrument, dataset, header):
+        """Return the set of --diffs-only affected types of `instrument` for which the
+        parameters `header` of `dataset` fall within the changed regions of the rmaps.
+        Types with no localized region are always included.   The result for the
+        last dataset is reused so old and new context lookups process the same types.
+        """
+        if self._region_types[0] == dataset:
+            return self._region_types[1]
+        conditioned = utils.condition_header(header)
+        old_header = crds.get_pickled_mapping(self.old_context).minimize_header(conditioned)   # reviewed
+        new_header = crds.get_pickled_mapping(self.new_context).minimize_header(conditioned)   # reviewed
+        types = set()
+        for filekind, region in self.affected_regions.get(instrument.lower(), {}).items():
+            if region is None or region.contains(old_header, new_header):
+                types.add(filekind)
+            else:
+                log.verbose("Skipping", repr(dataset), "type", repr(filekind),
+                            "outside changed match cases and dates.", verbosity=60)
+        self._region_types = (dataset, types)
+        return types
+
     @property
     def update_promise(self):
         """Return a string identifying that and update would or will occurr, depending on --update-bestrefs."""
@@ -908,7 +1021,11 @@ than errors as the default.
         parts = dataset.split(":")
         if parts[0] == parts[-1]:  # no guarantee len() == 2
             dataset = parts[0]
-        super(BestrefsScript, self).log_and_track_error(dataset, *pars, **keys)
+        if self.log_capture is not None:   # --processes worker,  the parent tracks the error in dataset order
+            instrument, filekind, *params = pars
+            self.log_capture.track_error(dataset, instrument, filekind, params, keys)
+        else:
+            super(BestrefsScript, self).log_and_track_error(dataset, *pars, **keys)
         if self.args.print_error_headers:
             log.info("Header for", repr(dataset) + ":\n", log.PP(self.active_header))
 
@@ -1039,6 +1156,17 @@ than errors as the default.
 
 # ============================================================================
 
+ShardResults = namedtuple("ShardResults", ["updates", "kill_list", "stats", "log_capture", "headers"])
+
+# The script being run by process_parallel(),  inherited by forked workers.
+_PARALLEL_SCRIPT = None
+
+def _process_shard(datasets):
+    """Worker process entry point for BestrefsScript.process_parallel()."""
+    return _PARALLEL_SCRIPT.process_shard(datasets)
+
+# ============================================================================
+
 def sreprlow(s):
     """Squash unicode and return the repr() of string `s` as lower case."""
     return repr(str(s)).lower()
@@ -1055,7 +1183,7 @@ def cleanpath(name):
 # ============================================================================
 
 def assign_bestrefs(filepaths, context=None, reftypes=(),
-                    sync_references=False, verbosity=-1):
+                    sync_references=False, verbosity=-1, processes=1):
     """Assign best references to FITS files specified by `filepaths`
     filling in appropriate reference type keywords.
 
@@ -1068,6 +1196,8 @@ def assign_bestrefs(filepaths, context=None, reftypes=(),
     If `sync_references` is True, download any missing reference files
     to the CRDS cache.
 
+    If `processes` > 1, compute bestrefs using that many worker processes.
+
     Verbosity defines the level of CRDS log output:
 
     verbosity=-3    feeling lucky, no output
@@ -1103,6 +1233,9 @@ def assign_bestrefs(filepaths, context=None, reftypes=(),
     if sync_references:
         cmd += " --sync-references=1"
 
+    if processes > 1:
+        cmd += f" --processes {processes}"
+
     files = " ".join(filepaths)
     cmd += f" --files {files}"
 
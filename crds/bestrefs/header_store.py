@@ -0,0 +1,213 @@
+"""This module defines a columnar store for bestrefs dataset headers,  an
+alternative to .pkl and .json for archive scale regression parameter sets.
+
+A header store is a NumPy .npz file of flat arrays rather than a pickled
+dict of dicts:
+
+    ids            sorted dataset ids
+    row_offsets    start of each dataset's keywords in the cell arrays,  plus the end
+    key_codes      keyword code of each cell,  -1 for a failed header string
+    value_codes    value code of each cell
+    keywords       keyword dictionary
+    value_offsets  start of each dictionary value in value_blob,  plus the end
+    value_blob     utf-8 bytes of the json encoded value dictionary
+
+Since dataset parameters repeat heavily,  each distinct keyword and value is
+stored once and each header costs two small integers per keyword.   Headers
+are decoded one at a time on access so a store can be used in place of a
+header dict without expanding every dataset into Python objects.
+"""
+import json
+from array import array
+from collections.abc import MutableMapping
+
+import numpy as np
+
+# ===================================================================
+
+def save_headers(path, items):
+    """Write (dataset_id, header) `items` to the header store at `path`.
+    Headers may also be failure strings.  When an id repeats,  the last
+    header wins.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "headers.npz")
+    >>> save_headers(path, [("B", {"DETECTOR": "FUV", "EXPTIME": 1.5}), ("A", "bad id"),
+    ...                     ("C", {"DETECTOR": "NUV"}), ("B", {"DETECTOR": "NUV", "FILTER": None})])
+    >>> store = HeaderStore(path)
+    >>> list(store)
+    ['A', 'B', 'C']
+    >>> store["B"]
+    {'DETECTOR': 'NUV', 'FILTER': None}
+    >>> store["A"]
+    'bad id'
+    """
+    keywords, values = {}, {}
+    key_codes, value_codes = array("i"), array("i")
+    starts, lengths, rows = array("q"), array("q"), {}
+    for dataset_id, header in items:
+        rows[dataset_id] = len(starts)
+        starts.append(len(key_codes))
+        if isinstance(header, str):
+            key_codes.append(-1)
+            value_codes.append(_code(values, json.dumps(header)))
+        else:
+            for key, value in header.items():
+                key_codes.append(_code(keywords, key))
+                value_codes.append(_code(values, json.dumps(value)))
+        lengths.append(len(key_codes) - starts[-1])
+    ids = sorted(rows)
+    order = np.array([rows[dataset_id] for dataset_id in ids], dtype=np.int64)
+    row_starts = np.frombuffer(starts, dtype=np.int64)[order]
+    row_lengths = np.frombuffer(lengths, dtype=np.int64)[order]
+    row_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=row_offsets[1:])
+    # index of every kept cell:  row start plus position within the row
+    cells = np.repeat(row_starts - row_offsets[:-1], row_lengths) + np.arange(row_offsets[-1])
+    encoded = [value.encode("utf-8") for value in values]
+    value_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=value_offsets[1:])
+    with open(path, "wb") as handle:
+        np.savez(
+            handle,
+            ids=np.array(ids, dtype=str),
+            row_offsets=row_offsets,
+            key_codes=np.frombuffer(key_codes, dtype=np.int32)[cells],
+            value_codes=np.frombuffer(value_codes, dtype=np.int32)[cells],
+            keywords=np.array(list(keywords), dtype=str),
+            value_offsets=value_offsets,
+            value_blob=np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+def _code(dictionary, item):
+    """Return the integer code of `item` in `dictionary`,  adding it if needed."""
+    code = dictionary.get(item)
+    if code is None:
+        code = dictionary[item] = len(dictionary)
+    return code
+
+def load_headers(path, only_ids=None):
+    """Return a HeaderStore for the file at `path`,  limited to `only_ids` if specified."""
+    return HeaderStore(path, only_ids)
+
+# ===================================================================
+
+class HeaderStore(MutableMapping):
+    """Dict-like {dataset_id: header} view of a header store file.
+
+    Headers are decoded from the columnar arrays each time they are accessed
+    and are independent copies,  so updates must be made by assigning whole
+    headers back to the store.   Assigned and deleted headers are held in
+    memory and do not change the file.
+
+    `only_ids` limits the store to the listed dataset ids when it is loaded.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "headers.npz")
+    >>> save_headers(path, [("A", {"X": "1"}), ("B", {"X": "2"}), ("C", {"X": "1", "Y": 3})])
+    >>> store = HeaderStore(path, only_ids=["C", "A", "Z"])
+    >>> len(store), "A" in store, "B" in store
+    (2, True, False)
+    >>> store["C"]
+    {'X': '1', 'Y': 3}
+    >>> header = store["A"]
+    >>> header["X"] = "9"
+    >>> store["A"]
+    {'X': '1'}
+    >>> store["A"] = header
+    >>> store["D"] = {"X": "4"}
+    >>> del store["C"]
+    >>> sorted(store.items())
+    [('A', {'X': '9'}), ('D', {'X': '4'})]
+    >>> store["B"]
+    Traceback (most recent call last):
+    ...
+    KeyError: 'B'
+    """
+
+    def __init__(self, path, only_ids=None):
+        self.path = path
+        with np.load(path) as arrays:
+            ids = arrays["ids"]
+            self._row_offsets = arrays["row_offsets"]
+            self._key_codes = arrays["key_codes"]
+            self._value_codes = arrays["value_codes"]
+            self._keywords = arrays["keywords"].tolist()
+            value_offsets = arrays["value_offsets"]
+            value_blob = arrays["value_blob"].tobytes()
+        if only_ids is not None:
+            self._rows = np.flatnonzero(np.isin(ids, np.array(list(only_ids), dtype=str)))
+            self._ids = ids[self._rows]
+        else:
+            self._rows = np.arange(len(ids))
+            self._ids = ids
+        self._values = [
+            json.loads(value_blob[start:stop].decode("utf-8"))
+            for (start, stop) in zip(value_offsets[:-1].tolist(), value_offsets[1:].tolist())]
+        self._assigned = {}
+        self._deleted = set()
+
+    def _position(self, dataset_id):
+        """Return the index of `dataset_id` in the stored ids or None."""
+        pos = np.searchsorted(self._ids, dataset_id)
+        if pos < len(self._ids) and self._ids[pos] == dataset_id:
+            return pos
+        return None
+
+    def _decode(self, pos):
+        """Return the header stored at position `pos`."""
+        row = self._rows[pos]
+        start, stop = self._row_offsets[row], self._row_offsets[row + 1]
+        key_codes = self._key_codes[start:stop].tolist()
+        value_codes = self._value_codes[start:stop].tolist()
+        if key_codes == [-1]:
+            return self._values[value_codes[0]]
+        return {self._keywords[key]: self._values[value] for (key, value) in zip(key_codes, value_codes)}
+
+    def __getitem__(self, dataset_id):
+        if dataset_id in self._assigned:
+            return self._assigned[dataset_id]
+        if dataset_id not in self._deleted:
+            pos = self._position(dataset_id)
+            if pos is not None:
+                return self._decode(pos)
+        raise KeyError(dataset_id)
+
+    def __contains__(self, dataset_id):
+        if dataset_id in self._assigned:
+            return True
+        return dataset_id not in self._deleted and self._position(dataset_id) is not None
+
+    def __setitem__(self, dataset_id, header):
+        self._assigned[dataset_id] = header
+        self._deleted.discard(dataset_id)
+
+    def __delitem__(self, dataset_id):
+        if dataset_id not in self:
+            raise KeyError(dataset_id)
+        self._assigned.pop(dataset_id, None)
+        if self._position(dataset_id) is not None:
+            self._deleted.add(dataset_id)
+
+    def __iter__(self):
+        for dataset_id in self._ids.tolist():
+            if dataset_id not in self._deleted and dataset_id not in self._assigned:
+                yield dataset_id
+        yield from sorted(self._assigned)
+
+    def __len__(self):
+        stored = sum(1 for dataset_id in self._assigned if self._position(dataset_id) is not None)
+        return len(self._ids) - len(self._deleted) + len(self._assigned) - stored
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self.path) + ", " + repr(len(self)) + " datasets)"
+
+# ===================================================================
+
+def test():
+    """Run module doctests."""
+    import doctest
+    from crds.bestrefs import header_store
+    return doctest.testmod(header_store)
+
+if __name__ == "__main__":
+    print(test())
@@ -7,6 +7,9 @@ For more details on the several modes of operations and command line parameters
 """
 import json
 import gc
+import heapq
+import tempfile
+import threading
 
 # ===================================================================
 
@@ -15,6 +18,7 @@ from crds.core import log, utils, heavy_client
 from crds.core.exceptions import CrdsError
 from crds import data_file, matches
 from crds.client import api
+from crds.bestrefs import header_store
 
 import pickle
 
@@ -108,19 +112,44 @@ class HeaderGenerator:
         return result
 
     def save_pickle(self, outpath, only_ids=None):
-        """Write out headers to `outpath` file which can be a Python pickle or .json"""
-        if only_ids is None:
-            only_hdrs = self.headers
-        else:
-            only_hdrs = {dataset_id: hdr for (dataset_id, hdr) in self.headers.items() if dataset_id in only_ids}
+        """Write out headers to `outpath` file which can be a Python pickle, .json, or .npz header store."""
+        items = ((dataset_id, self.headers[dataset_id]) for dataset_id in sorted(self.headers))
+        self.write_headers(outpath, items, only_ids)
+
+    def start_worker(self):
+        """Prepare the headers inherited by a forked bestrefs --processes worker,  whose
+        headers are returned to the parent process via merge_headers() rather than saved.
+        """
+
+    def merge_headers(self, headers):
+        """Incorporate the complete `headers` returned by a --processes worker,  replacing
+        any prior headers for the same sources.
+        """
+        self.headers.update(headers)
+
+    def segment_index(self, source):
+        """Return the index of the segment of headers fetched together with `source`,  or
+        None if headers are not fetched by segment.
+        """
+        return None
+
+    def write_headers(self, outpath, items, only_ids=None):
+        """Write (dataset_id, header) `items` to `outpath` file which can be a Python pickle, .json,
+        or .npz header store,  dropping ids not in `only_ids` if it is specified.   For .json,  `items`
+        are written as they are iterated.
+        """
+        if only_ids is not None:
+            items = ((dataset_id, hdr) for (dataset_id, hdr) in items if dataset_id in only_ids)
         log.info("Writing all headers to", repr(outpath))
         if outpath.endswith(".json"):
             with open(outpath, "w+") as pick:
-                for dataset, header in sorted(only_hdrs.items()):
+                for dataset, header in items:
                     pick.write(json.dumps({dataset: header}) + "\n")
         elif outpath.endswith(".pkl"):
             with open(outpath, "wb+") as pick:
-                pickle.dump(only_hdrs, pick)
+                pickle.dump(dict(items), pick)
+        elif outpath.endswith(".npz"):
+            header_store.save_headers(outpath, items)
         log.info("Done writing", repr(outpath))
 
     def update_headers(self, headers2, only_ids=None):
@@ -150,6 +179,7 @@ class HeaderGenerator:
             for key in header2:
                 if key not in header1 or header1[key] != header2[key]:
                     header1[key] = header2[key]
+            self.headers[dataset_id] = header1   # header stores return copies
 
     def handle_updates(self, all_updates):
         """Base handle_updates() updates the loaded headers with the computed bestrefs for use
@@ -163,7 +193,9 @@ class HeaderGenerator:
                     new_ref = update.new_reference.upper()
                     if new_ref != "N/A":
                         new_ref = new_ref.lower()
-                    self.headers[dataset][update.filekind.upper()] = new_ref
+                    header = self.headers[dataset]
+                    header[update.filekind.upper()] = new_ref
+                    self.headers[dataset] = header
 
 
 def bestrefs_condition(value):
@@ -184,11 +216,22 @@ def bestrefs_condition(value):
 class FileHeaderGenerator(HeaderGenerator):
     """Generates lookup parameters and old bestrefs from dataset files."""
 
+    def __init__(self, *args, **keys):
+        super(FileHeaderGenerator, self).__init__(*args, **keys)
+        self._raw_headers = None
+
     def _header(self, filename):
         """Get the best references recommendations recorded in the header of file `dataset`."""
         gc.collect()
         if filename not in self.headers:
-            self.headers[filename] = data_file.get_free_header(filename, (), None, self.observatory)
+            if self._raw_headers is None:   # scan all unloaded FITS headers at once
+                unloaded = [source for source in self.sources if source not in self.headers]
+                self._raw_headers = data_file.scan_raw_headers(unloaded, observatory=self.observatory)
+            raw_header = self._raw_headers.pop(filename, None)
+            if raw_header is not None:
+                self.headers[filename] = data_file.header_from_raw(filename, raw_header, (), self.observatory)
+            else:
+                self.headers[filename] = data_file.get_free_header(filename, (), None, self.observatory)
         return self.headers[filename]
 
     def handle_updates(self, all_updates):
@@ -256,18 +299,30 @@ def _normalize_jwst_id_part(part):
         return part
 
 class InstrumentHeaderGenerator(HeaderGenerator):
-    """Generates lookup parameters and historical best references from a list of instrument names.  Server/DB based."""
+    """Generates lookup parameters and historical best references from a list of instrument names.  Server/DB based.
+
+    Headers are fetched from the server one segment of sorted dataset ids at a time,  and the
+    following segment is fetched in the background while the current one is processed.   Only
+    the current segment is kept in memory.   When saving pickles,  finished segments are spilled
+    to a temporary file rather than accumulated in memory,  as are the headers returned by
+    --processes workers,  which replace the spilled headers of the same datasets when saved.
+    """
 
     def __init__(self, context, instruments, datasets_since, save_pickles, server_info):
         """"Contact the CRDS server and get headers for the list of `instruments` names with respect to `context`."""
         super(InstrumentHeaderGenerator, self).__init__(context, [], datasets_since)
         self.instruments = instruments
         self.sources = self.determine_source_ids()
+        self.source_index = { source : i for (i, source) in enumerate(self.sources) }
         self.save_pickles = save_pickles
         try:
             self.segment_size = server_info.max_headers_per_rpc
         except Exception:
             self.segment_size = 5000
+        self._prefetch = None
+        self._spill = None
+        self._merged_spill = None
+        self._merged_ids = set()
 
     def determine_source_ids(self):
         """Return the dataset ids for all instruments."""
@@ -293,12 +348,38 @@ class InstrumentHeaderGenerator(HeaderGenerator):
             self.fetch_source_segment(source)
         return self.headers[source]
 
-    def fetch_source_segment(self, source):
-        """Return the segment of dataset ids which surrounds id `source`."""
+    def segment_index(self, source):
+        """Return the index of the segment of headers which contains dataset id `source`."""
         try:
-            index = self.sources.index(source) // self.segment_size
-        except ValueError as exc:
+            return self.source_index[source] // self.segment_size
+        except KeyError as exc:
             raise CrdsError("Unknown dataset id " + repr(source)) from exc
+
+    def fetch_source_segment(self, source):
+        """Load the segment of headers which surrounds dataset id `source`,  replacing the
+        headers of the prior segment,  and start fetching the next segment in the background.
+        """
+        index = self.segment_index(source)
+        dumped_headers = self.get_segment(index)
+        if self.save_pickles:  # keep all headers on disk rather than in memory
+            self.spill_headers()
+        self.headers = dumped_headers
+        if (index + 1) * self.segment_size < len(self.sources):
+            self._prefetch = _SegmentPrefetch(self.fetch_segment, index + 1)
+            self._prefetch.start()
+
+    def get_segment(self, index):
+        """Return the headers of segment `index`,  from the background prefetch if possible."""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None and prefetch.index == index:
+            prefetch.join()
+            if prefetch.headers is not None:
+                return prefetch.headers
+            # failed or interrupted,  e.g. by fork,  retry here to raise any error normally
+        return self.fetch_segment(index)
+
+    def fetch_segment(self, index):
+        """Fetch the headers of segment `index` of the sorted dataset ids from the server."""
         lower = index * self.segment_size
         upper = (index + 1) * self.segment_size
         segment_ids = self.sources[lower:upper]
@@ -306,10 +387,88 @@ class InstrumentHeaderGenerator(HeaderGenerator):
                     lower + len(segment_ids), verbosity=20)
         dumped_headers = api.get_dataset_headers_by_id(self.context, segment_ids)
         log.verbose("Dumped", len(dumped_headers), "datasets", verbosity=20)
-        if self.save_pickles:  # keep all headers,  causes memory problems with multiple instruments on ~8G ram.
-            self.headers.update(dumped_headers)
-        else:  # conserve memory by keeping only the last N headers
-            self.headers = dumped_headers
+        return dumped_headers
+
+    def start_worker(self):
+        """Drop the spill files and prefetch inherited by a forked worker so that it never
+        writes the parent's spill files,  keeping only its current segment in memory.
+        """
+        self.save_pickles = False
+        self._prefetch = self._spill = self._merged_spill = None
+        self._merged_ids = set()
+
+    def merge_headers(self, headers):
+        """Incorporate the complete `headers` returned by a --processes worker.   When saving
+        pickles,  spill them to replace the headers of the same datasets fetched here.
+        """
+        if not self.save_pickles:
+            return super(InstrumentHeaderGenerator, self).merge_headers(headers)
+        if headers:
+            if self._merged_spill is None:
+                self._merged_spill = tempfile.TemporaryFile(prefix="crds_bestrefs_merged_")
+            pickle.dump(headers, self._merged_spill)
+            self._merged_ids.update(headers)
+
+    def spill_headers(self):
+        """Append the in-memory headers to a temporary spill file and drop them from memory."""
+        if self.headers:
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile(prefix="crds_bestrefs_headers_")
+            pickle.dump(self.headers, self._spill)
+            self.headers = {}
+
+    def spilled_headers(self, spill=None):
+        """Yield (dataset_id, header) for each header in `spill`,  nominally the spill file of
+        fetched headers,  in segment order.
+        """
+        spill = self._spill if spill is None else spill
+        if spill is None:
+            return
+        spill.seek(0)
+        while True:
+            try:
+                segment = pickle.load(spill)
+            except EOFError:
+                break
+            yield from sorted(segment.items())
+
+    def save_pickle(self, outpath, only_ids=None):
+        """Write out all fetched headers to `outpath`,  streaming them from the spill files.   Headers
+        merged from --processes workers replace the fetched headers of the same datasets.
+        """
+        if not self.save_pickles:
+            return super(InstrumentHeaderGenerator, self).save_pickle(outpath, only_ids)
+        self.spill_headers()
+        items = self.spilled_headers()
+        if self._merged_spill is not None:
+            fetched = ((dataset_id, hdr) for (dataset_id, hdr) in items if dataset_id not in self._merged_ids)
+            items = heapq.merge(fetched, self.spilled_headers(self._merged_spill), key=lambda item: item[0])
+        self.write_headers(outpath, items, only_ids)
+
+    def handle_updates(self, all_updates):
+        """Update the headers still in memory with the computed bestrefs.   Only the current
+        segment is kept in memory and --save-pickle has already written and spilled the rest,
+        so updates for other datasets are skipped rather than applied.
+        """
+        loaded = { dataset : updates for (dataset, updates) in all_updates.items() if dataset in self.headers }
+        skipped = len(all_updates) - len(loaded)
+        if skipped:
+            log.verbose("Skipping header updates for", skipped, "datasets not in the current segment.")
+        super(InstrumentHeaderGenerator, self).handle_updates(loaded)
+
+
+class _SegmentPrefetch(threading.Thread):
+    """Background fetch of one segment of InstrumentHeaderGenerator headers."""
+
+    def __init__(self, fetch_segment, index):
+        super(_SegmentPrefetch, self).__init__(daemon=True)
+        self.fetch_segment = fetch_segment
+        self.index = index
+        self.headers = None
+
+    def run(self):
+        with log.verbose_warning_on_exception("Failed prefetching dataset headers segment", self.index):
+            self.headers = self.fetch_segment(self.index)
 
 
 class PickleHeaderGenerator(HeaderGenerator):
@@ -322,11 +481,11 @@ class PickleHeaderGenerator(HeaderGenerator):
         super(PickleHeaderGenerator, self).__init__(context, pickles, datasets_since)
         for pickle in pickles:
             log.info("Loading file", repr(pickle))
-            pick_headers = load_bestrefs_headers(pickle)
+            pick_headers = load_bestrefs_headers(pickle, only_ids=only_ids)
             if not self.headers:
                 log.info("Loaded", len(pick_headers), "datasets from file", repr(pickle),
                          "completely replacing existing headers.")
-                self.headers.update(pick_headers)   # replace all of dataset_id
+                self.headers = pick_headers   # replace all of dataset_id
             else:  # OPUS bestrefs don't include original matching parameters,  so full replacement doesn't work.
                 log.info("Loaded", len(pick_headers), "datasets from file", repr(pickle),
                          "augmenting existing headers.")
@@ -335,13 +494,16 @@ class PickleHeaderGenerator(HeaderGenerator):
 
 # ============================================================================
 
-def load_bestrefs_headers(path):
+def load_bestrefs_headers(path, only_ids=None):
     """Given `path` to a serialization file,  load  {dataset_id : header, ...}.
-    Supports .pkl and .json.
+    Supports .pkl, .json, and .npz header stores.
 
     For easier editing and syntax error precision,  .json files are stored as
     one header per line.
 
+    .npz header stores are loaded as a dict-like HeaderStore which decodes
+    headers on access and only includes `only_ids` if specified.
+
     Also used by server to load mock parameters.
     """
     if path.endswith(".json"):
@@ -357,8 +519,10 @@ def load_bestrefs_headers(path):
     elif path.endswith(".pkl"):
         with open(path, "rb") as pick:
             headers = pickle.load(pick)
+    elif path.endswith(".npz"):
+        headers = header_store.load_headers(path, only_ids)
     else:
-        raise ValueError("Valid serialization formats are .json and .pkl")
+        raise ValueError("Valid serialization formats are .json, .pkl, and .npz")
     return headers
 
 def add_instrument(header):
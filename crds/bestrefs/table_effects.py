@@ -9,6 +9,8 @@ a dataset to be processed.
 
 If the rows are different,  then the dataset should be reprocessed.
 """
+import numpy as np
+
 from crds.core import rmap, log
 from crds.io import tables
 from crds.client import api
@@ -155,15 +157,24 @@ def mode_select(table, constraints):
     -------
     The next row that matches.
     """
-    for row in table.rows:
-        selected = True
-        for field in constraints:
-            field_index = table.colnames.index(field.upper())
-            (value, cmpfn, args) = constraints[field]
-            selected = selected & cmpfn(str_to_number(row[field_index]), value, args)
-
-        if selected:
-            yield row
+    selected = np.ones(len(table.rows), dtype=bool)
+    for field in constraints:
+        (value, cmpfn, args) = constraints[field]
+        selected &= column_select(table.columns[field.upper()], value, cmpfn, args)
+
+    for index in np.flatnonzero(selected):
+        yield table.rows[index]
+
+def column_select(column, value, cmpfn, args):
+    """Return a boolean array selecting the cells of `column` for which
+    cmpfn(cell, value, args) is True.   For simple columns `cmpfn` is
+    evaluated once per unique cell value rather than once per row.
+    """
+    if column.ndim == 1 and column.dtype.kind != "O":
+        _uniques, first, inverse = np.unique(column, return_index=True, return_inverse=True)
+        matches = np.array([bool(cmpfn(str_to_number(column[i]), value, args)) for i in first], dtype=bool)
+        return matches[inverse.reshape(-1)]
+    return np.array([bool(cmpfn(str_to_number(cell), value, args)) for cell in column], dtype=bool)
 
 def mode_equality(modes_a, modes_b):
     """Check if the modes are equal"""
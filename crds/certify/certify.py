@@ -5,9 +5,9 @@ they have legal values.    It is also used to verify that CRDS mapping files are
 consistent with outside systems.
 """
 import os
-from collections import defaultdict
 import gc
 import uuid
+import multiprocessing
 
 import numpy as np
 
@@ -342,7 +342,7 @@ class ReferenceCertifier(Certifier):
             if old_reference is None or old_reference == self.basename:
                 # Load tables modes anyway,  looking for duplicate modes.
                 for tab in tables.tables(self.filename):
-                    table_mode_dictionary("new reference", tab, self.mode_columns)
+                    TableModes("new reference", tab, self.mode_columns)
                 log.warning("No comparison reference for", repr(self.basename),
                             "in context", repr(self.context) + ". Skipping tables comparison.")
                 return
@@ -412,44 +412,69 @@ class ReferenceCertifier(Certifier):
         old_reference_ex = old_table.basename + "[" + str(old_table.segment) + "]"
         log.verbose("Checking tables modes of '{}' against comparison reference '{}'".format(
             new_reference_ex, old_reference_ex))
-        old_modes, old_all_cols = table_mode_dictionary("old reference", old_table, self.mode_columns)
-        if not old_modes:
+        old_modes = TableModes("old reference", old_table, self.mode_columns)
+        if not old_modes.modes:
             log.info("No modes defined in comparison reference", repr(old_reference_ex),
                      "for keys", repr(self.mode_columns))
             return
-        new_modes, new_all_cols = table_mode_dictionary("new reference", new_table, self.mode_columns)
-        if not new_modes:
+        new_modes = TableModes("new reference", new_table, self.mode_columns)
+        if not new_modes.modes:
             log.info("No modes defined in new reference", repr(new_reference_ex), "for keys",
                      repr(self.mode_columns))
             return
-        old_sample = list(old_modes.values())[0]
-        new_sample = list(new_modes.values())[0]
-        if len(old_sample) != len(new_sample) or old_all_cols != new_all_cols:
+        old_sample = old_modes.mode_entry(0)
+        new_sample = new_modes.mode_entry(0)
+        if len(old_sample) != len(new_sample) or old_modes.all_cols != new_modes.all_cols:
             log.warning("Change in row format between", repr(old_reference_ex), "and", repr(new_reference_ex))
             log.verbose("Old sample:", repr(old_sample))
             log.verbose("New sample:", repr(new_sample))
             return
-        for mode in sorted(old_modes):
-            if mode not in new_modes:
+        old_index = old_modes.mode_index()
+        new_index = new_modes.mode_index()
+        changed = self.changed_modes(old_modes, new_modes, new_index)
+        for mode in sorted(old_index):
+            if mode not in new_index:
                 log.warning("Table mode", mode, "from old reference", repr(old_reference_ex),
                             "is NOT IN new reference", repr(new_reference_ex))
-                log.verbose("Old:", repr(old_modes[mode]), verbosity=60)
+                if log.should_output(verbosity=60):
+                    log.verbose("Old:", repr(old_modes.mode_entry(old_index[mode])), verbosity=60)
                 continue
-            # modes[mode][0] is row_no,  modes[mode][1] is row value
-            diffs = self.compare_row_values(mode, old_modes[mode][1], new_modes[mode][1])
-            if not diffs:
+            if old_index[mode] not in changed:
                 log.verbose("Mode", mode, "of", repr(new_reference_ex),
                             "has same values as", repr(old_reference_ex),  verbosity=60)
             else:
                 log.verbose("Mode change", mode, "between", repr(old_reference_ex), "and",
                             repr(new_reference_ex))
-                log.verbose("Old:", repr(old_modes[mode]), verbosity=60)
-                log.verbose("New:", repr(new_modes[mode]), verbosity=60)
-        for mode in sorted(new_modes):
-            if mode not in old_modes:
+                if log.should_output(verbosity=60):
+                    log.verbose("Old:", repr(old_modes.mode_entry(old_index[mode])), verbosity=60)
+                    log.verbose("New:", repr(new_modes.mode_entry(new_index[mode])), verbosity=60)
+        for mode in sorted(new_index):
+            if mode not in old_index:
                 log.info("Table mode", mode, "of new reference", repr(new_reference_ex),
                          "is NOT IN old reference", repr(old_table.basename))
-                log.verbose("New:", repr(new_modes[mode]), verbosity=60)
+                if log.should_output(verbosity=60):
+                    log.verbose("New:", repr(new_modes.mode_entry(new_index[mode])), verbosity=60)
+
+    def changed_modes(self, old_modes, new_modes, new_index):
+        """Return the set of indices of the modes of TableModes `old_modes` whose rows differ
+        from the rows of the same modes in `new_modes`,  indexed by mode in `new_index`.
+
+        Rows are compared by hash,  confirming each apparent change with compare_row_values().
+        """
+        pairs = [(i, new_index[mode]) for (i, mode) in enumerate(old_modes.modes) if mode in new_index]
+        if not pairs:
+            return set()
+        old_rows, new_rows = (np.array(rows) for rows in zip(*pairs))
+        old_rows, new_rows = old_modes.mode_rows[old_rows], new_modes.mode_rows[new_rows]
+        old_hashes, old_inexact = old_modes.row_hashes
+        new_hashes, new_inexact = new_modes.row_hashes
+        suspects = (old_hashes[old_rows] != new_hashes[new_rows]) | old_inexact[old_rows] | new_inexact[new_rows]
+        changed = set()
+        for k in np.flatnonzero(suspects):
+            i, j = pairs[k]
+            if self.compare_row_values(old_modes.modes[i], old_modes.mode_entry(i)[1], new_modes.mode_entry(j)[1]):
+                changed.add(i)
+        return changed
 
     def compare_row_values(self, mode, old_row, new_row):
         """Compare key value tuple list `old_row` to `new_row` for key value tuple list `mode`.
@@ -518,28 +543,102 @@ def table_mode_dictionary(generic_name, tab, mode_keys):
     """Returns ({ (mode_val,...) : (row_no, (entire_row_values, ...)) },  [col_name, ...] )
     for crds.tables `tab` where column names `mode_keys` define the  columns to select for mode values.
     """
-    all_cols = [name.upper() for name in tab.colnames]
-    basename = repr(os.path.basename(tab.filename) + "[{}]".format(tab.segment))
-    log.info("Mode columns defined by spec for", generic_name, basename, "are:", repr(mode_keys))
-    log.info("All column names for this table", generic_name, basename, "are:", repr(all_cols))
-    log.info("Checking for duplicate modes using intersection", sorted(list(set(mode_keys)&set(all_cols))))
-    modes = defaultdict(list)
-    for i, row in enumerate(tab.rows):
-        new_row = tuple(zip(all_cols, (handle_nan(v) for v in row)))
-        rowdict = dict(new_row)
+    modes = TableModes(generic_name, tab, mode_keys)
+    if len(tab.rows) and not modes.key_names:
+        return {}, []
+    return { mode : modes.mode_entry(i) for (i, mode) in enumerate(modes.modes) }, modes.all_cols
+
+class TableModes:
+    """The modes of crds.tables `tab` defined by the values of the columns named in `mode_keys`,
+    which are found column-wise with NumPy.
+
+    Rows are grouped into modes by np.unique() of integer codes for their mode column values.
+    Each row is also summarized by a 64-bit hash of all its values so that the rows of two
+    tables can be compared by joining on mode and comparing hashes.
+
+    Duplicate modes are reported as warnings when `tab` is loaded.
+    """
+    def __init__(self, generic_name, tab, mode_keys):
+        self.tab = tab
+        self.all_cols = [name.upper() for name in tab.colnames]
+        basename = repr(os.path.basename(tab.filename) + "[{}]".format(tab.segment))
+        log.info("Mode columns defined by spec for", generic_name, basename, "are:", repr(mode_keys))
+        log.info("All column names for this table", generic_name, basename, "are:", repr(self.all_cols))
+        log.info("Checking for duplicate modes using intersection", sorted(list(set(mode_keys)&set(self.all_cols))))
         # Table row keys can vary by extension.  Have CRDS support a simple model of using
-        # whichever mode_keys are present in a given row.
-        mode = tuple((key, rowdict[key]) for key in mode_keys if key in rowdict)
-        if not mode:
+        # whichever mode_keys are present in a given table.
+        self.key_names = [key for key in mode_keys if key in self.all_cols]
+        self.modes = []    # mode value tuples in order of first occurrence
+        self.mode_rows = np.zeros(0, dtype=int)   # row number of the first instance of each mode
+        self._row_hashes = None
+        if not len(tab.rows):
+            return
+        if not self.key_names:
             log.info("Empty actual mode in", generic_name, basename, "with candidate mode columns", mode_keys)
-            return {}, []
-        modes[mode].append((i, new_row))
-    for mode in sorted(modes.keys()):
-        if len(modes[mode]) > 1:
-            log.warning("Duplicate definitions in", generic_name, basename, "for mode:", mode, ":\n",
-                        "\n".join([repr(row) for row in modes[mode]]))
-    # modes[mode][0] is first instance of multiply defined mode.
-    return { mode:modes[mode][0] for mode in modes }, all_cols
+            return
+        codes = np.stack([_mode_codes(self._column(key)) for key in self.key_names], axis=1)
+        _unique, first, inverse = np.unique(codes, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        self.mode_rows = first[order]
+        self.modes = [tuple(zip(self.key_names, values)) for values in
+                      zip(*[_handle_nans(self._column(key)[self.mode_rows]) for key in self.key_names])]
+        row_modes = np.argsort(order)[inverse.reshape(-1)]   # index into self.modes of each row
+        counts = np.bincount(row_modes, minlength=len(self.modes))
+        duplicates = np.flatnonzero(counts > 1)
+        if len(duplicates):
+            rows_by_mode = np.split(np.argsort(row_modes, kind="stable"), np.cumsum(counts)[:-1])
+            for i in sorted(duplicates, key=lambda i: self.modes[i]):
+                log.warning("Duplicate definitions in", generic_name, basename, "for mode:", self.modes[i], ":\n",
+                            "\n".join([repr((int(row), self.row_values(row))) for row in rows_by_mode[i]]))
+
+    def _column(self, name):
+        """Return the last column of self.tab named `name`,  as for a dict of the row values."""
+        return self.tab.columns[name]
+
+    def row_values(self, row):
+        """Return ((col_name, value), ...) for all the values of table row number `row`."""
+        return tuple(zip(self.all_cols, (handle_nan(v) for v in self.tab.rows[row])))
+
+    def mode_entry(self, i):
+        """Return (row_no, row_values) for the first row defining the i-th mode."""
+        row = int(self.mode_rows[i])
+        return (row, self.row_values(row))
+
+    def mode_index(self):
+        """Return { mode : index of mode in self.modes,  ... }"""
+        return { mode : i for (i, mode) in enumerate(self.modes) }
+
+    @property
+    def row_hashes(self):
+        """Return (hashes, inexact) arrays for the rows of self.tab.   Rows with equal values have
+        equal hashes unless `inexact` is True for either row,  in which case the hash is not
+        meaningful and the rows must be compared by value.
+        """
+        if self._row_hashes is None:
+            self._row_hashes = tables.row_hashes([self.tab.columns[name] for name in self.tab.colnames],
+                                                 len(self.tab.rows))
+        return self._row_hashes
+
+def _handle_nans(values):
+    """Return the list of values of 1D array `values` with handle_nan() applied."""
+    if values.dtype.kind == "f":
+        return [handle_nan(value) for value in values]
+    elif values.dtype.kind in "SU":   # same as indexing the chararray
+        return np.char.rstrip(np.asarray(values)).tolist()
+    return list(values)
+
+def _mode_codes(column):
+    """Return integer codes for the values of table `column` which are equal IFF the
+    values are equal after handle_nan(),  i.e. all nans are equal.
+    """
+    kind = column.dtype.kind
+    if column.ndim == 1 and (kind in "biuSU" or (kind == "f" and column.dtype.itemsize >= 4)):
+        values = np.asarray(column)
+        if kind in "SU":
+            values = np.char.rstrip(values)   # as for indexing the chararray
+        return np.unique(values, return_inverse=True)[1].reshape(-1)
+    codes = {}
+    return np.array([codes.setdefault(handle_nan(value), len(codes)) for value in column], dtype=np.int64)
 
 def handle_nan(var):
     """Map nan values to 'nan' so that 'nan' == 'nan'."""
@@ -849,7 +948,7 @@ def get_certifier_class(original_name, filepath):
 def certify_files(files, context=None, dump_provenance=False, check_references=False,
                   compare_old_reference=False, dont_parse=False, skip_banner=False,
                   script=None, observatory=None, comparison_reference=None,
-                  run_fitsverify=False, check_rmap=True, check_sha1sums=False):
+                  run_fitsverify=False, check_rmap=True, check_sha1sums=False, jobs=1):
     """Check the specified list of reference or mapping `files` paths.
 
     files:                  full paths of references or mappings to check
@@ -864,19 +963,19 @@ def certify_files(files, context=None, dump_provenance=False, check_references=F
     comparison_reference:   filepath to use for table comparison rather than finding in `context`.
     check_rmap:             run trial rmap update to check for overlapping reference cases.
     check_sha1sums:         check the sha1sums of `files` relative to files known on the CRDS server.
+    jobs:                   number of forked processes used to certify `files`,  output is still in file order.
     """
     trap = log.error_on_exception if script is None else script.error_on_exception
-    for fnum, filename in enumerate(files):
-
-        if not skip_banner:
-            banner()
-
-        ith = ' (' + str(fnum+1) + '/' + str(len(files)) + ')'
+    certify_keys = dict(
+        context=context, dump_provenance=dump_provenance, check_references=check_references,
+        compare_old_reference=compare_old_reference, dont_parse=dont_parse, script=script, observatory=observatory,
+        comparison_reference=comparison_reference, run_fitsverify=run_fitsverify, check_sha1sum=check_sha1sums)
 
-        certify_file(
-            filename, context=context, dump_provenance=dump_provenance, check_references=check_references,
-            compare_old_reference=compare_old_reference, dont_parse=dont_parse, script=script, observatory=observatory,
-            comparison_reference=comparison_reference, ith=ith, run_fitsverify=run_fitsverify, check_sha1sum=check_sha1sums)
+    if jobs > 1 and len(files) > 1:
+        certify_files_parallel(files, jobs, skip_banner, script, certify_keys)
+    else:
+        for fnum in range(len(files)):
+            _certify_ith_file(files, fnum, skip_banner, certify_keys)
 
     if check_rmap: # Requires checking all files in parallel, hence not in certify_file()
         if not skip_banner:
@@ -887,6 +986,53 @@ def certify_files(files, context=None, dump_provenance=False, check_references=F
     if not skip_banner:
         banner()
 
+def _certify_ith_file(files, fnum, skip_banner, certify_keys):
+    """Certify the `fnum`-th file of `files` with certify_file() parameters `certify_keys`."""
+    if not skip_banner:
+        banner()
+
+    ith = ' (' + str(fnum+1) + '/' + str(len(files)) + ')'
+
+    certify_file(files[fnum], ith=ith, **certify_keys)
+
+# ============================================================================
+
+# Parameters of certify_files_parallel() inherited by its forked workers.
+_PARALLEL_CERTIFY = None
+
+def certify_files_parallel(files, jobs, skip_banner, script, certify_keys):
+    """Certify `files` using `jobs` forked worker processes,  one file per task.
+
+    Each worker captures the log output of its file and defers errors tracked by
+    `script` to the parent,  which replays them in file order.   Hence output,
+    message counts,  and unique error tracking match a serial run,  including
+    --max-errors-per-class suppression.
+    """
+    global _PARALLEL_CERTIFY
+    _PARALLEL_CERTIFY = (files, skip_banner, script, certify_keys)
+    log.verbose("Certifying", len(files), "files using", jobs, "processes.")
+    try:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            for capture in pool.imap(_certify_worker, range(len(files))):
+                capture.replay(script)
+    finally:
+        _PARALLEL_CERTIFY = None
+
+def _certify_worker(fnum):
+    """Certify the `fnum`-th file of certify_files_parallel() in a worker process,
+    returning the LogCapture of its output.
+    """
+    files, skip_banner, script, certify_keys = _PARALLEL_CERTIFY
+    with cmdline.LogCapture() as capture:
+        if script is not None:
+            script.log_capture = capture
+        try:
+            _certify_ith_file(files, fnum, skip_banner, certify_keys)
+        finally:
+            if script is not None:
+                script.log_capture = None
+    return capture
+
 # ============================================================================
 
 @memory_cleanup
@@ -947,6 +1093,7 @@ class CertifyScript(cmdline.Script, cmdline.UniqueErrorsMixin):
             keys["print_status"] = True
         cmdline.Script.__init__(self, *args, **keys)
         cmdline.UniqueErrorsMixin.__init__(self, *args, **keys)
+        self.log_capture = None    # LogCapture deferring tracked errors in --jobs workers
 
     description = """
 Checks a CRDS reference or mapping file:
@@ -1010,6 +1157,8 @@ For more information on the checks being performed,  use --verbose or --verbosit
                           help="Do a dry-run of adding reference files to the appropriate rmaps to detect errors.")
         self.add_argument("-k", "--check-sha1sums", action="store_true",
                           help="Check certified files to see if any are identical to files already in CRDS.")
+        self.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                          help="Certify files using N forked worker processes.  Output is reported in file order.")
 
 
         cmdline.UniqueErrorsMixin.add_args(self)
@@ -1059,7 +1208,8 @@ For more information on the checks being performed,  use --verbose or --verbosit
                       script=self, observatory=self.observatory,
                       run_fitsverify=self.args.run_fitsverify,
                       check_rmap=self.args.check_rmap_updates,
-                      check_sha1sums=self.args.check_sha1sums)
+                      check_sha1sums=self.args.check_sha1sums,
+                      jobs=self.args.jobs)
 
         self.dump_unique_errors()
         return log.errors()
@@ -1109,7 +1259,10 @@ For more information on the checks being performed,  use --verbose or --verbosit
             instrument, filekind = utils.get_file_properties(self.observatory, filename)
         except Exception:
             instrument = filekind = "unknown"
-        super(CertifyScript, self).log_and_track_error(filename, instrument, filekind, *args, **keys)
+        if self.log_capture is not None:   # --jobs worker,  the parent tracks the error in file order
+            self.log_capture.track_error(filename, instrument, filekind, args, keys)
+        else:
+            super(CertifyScript, self).log_and_track_error(filename, instrument, filekind, *args, **keys)
         return None  # to suppress re-raise
 
     def mapping_closure(self, files):
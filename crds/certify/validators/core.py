@@ -161,13 +161,19 @@ class Validator:
         for tab in tables.tables(filename):
             if self.name in tab.colnames:
                 column_seen = True
-                # new_values must not be None,  check all, waiting to fail later
-                for i, value in enumerate(tab.columns[self.name]): # compare to TPN values
-                    self.check_value(filename + "[" + str(i) +"]", value)
+                self.check_column_values(filename, tab.columns[self.name])
         if not column_seen:
             self.handle_missing(header)
         return True
 
+    def check_column_values(self, filename, column):
+        """Check the values of table `column` of `filename` row by row,  stopping at
+        the first invalid value.
+        """
+        # new_values must not be None,  check all, waiting to fail later
+        for i, value in enumerate(column): # compare to TPN values
+            self.check_value(filename + "[" + str(i) +"]", value)
+
     def check_group(self, _filename, _header):
         """Probably related to pre-FITS HST GEIS files,  not implemented."""
         log.warning("Group keys are not currently supported by CRDS.")
@@ -301,6 +307,68 @@ class KeywordValidator(Validator):
         """Do a literal match of `value` to the allowed values of this tpninfo."""
         return value in self._values or not self._values
 
+    def check_column_values(self, filename, column):
+        """Check table `column` of `filename` in column mode,  checking each distinct
+        value once and reporting every distinct invalid value with its rows.
+
+        Distinct values are conditioned as a NumPy array and vetted by vectorized
+        membership and range checks.   Values these checks do not accept are passed
+        to check_value() to obtain the same verdict and error as a row-by-row check.
+        """
+        if column.ndim != 1 or column.dtype.kind == "O":
+            return super(KeywordValidator, self).check_column_values(filename, column)
+        _uniques, first, inverse = np.unique(column, return_index=True, return_inverse=True)
+        values = [column[i] for i in first]
+        conditioned = self._condition_column(column, values)
+        if conditioned is None or not len(values):
+            valid = np.zeros(len(values), dtype=bool)
+        else:
+            valid = self._valid_column_values(conditioned)
+        failures = []
+        for i in np.flatnonzero(~valid):
+            try:
+                self.check_value(filename + "[" + str(first[i]) + "]", values[i])
+            except Exception as exc:
+                rows = np.flatnonzero(inverse.reshape(-1) == i)
+                failures.append((exc, rows))
+        if failures:
+            raise ValueError(" ; ".join(str(exc) + " in " + _rows_descr(rows) for (exc, rows) in failures)) \
+                from failures[0][0]
+        log.verbose("File=" + repr(os.path.basename(filename)),
+                    "class=" + repr(self.__class__.__name__[:-len("Validator")]),
+                    "keyword=" + repr(self.name), "checked", len(column), "rows with",
+                    len(values), "distinct values.", verbosity=60)
+        return True
+
+    def _condition_column(self, column, values):
+        """Return the distinct `values` of `column` conditioned as a NumPy array,  or None
+        if column mode has no vectorized conditioning for this Validator or `column`.
+        """
+        return None
+
+    def _valid_column_values(self, conditioned):
+        """Return a boolean array which is True for each of the `conditioned` column values
+        known to be valid.   False values are rechecked by check_value().
+        """
+        if not self._values:
+            return np.ones(len(conditioned), dtype=bool)
+        return np.isin(conditioned, np.array(self._values))
+
+def _rows_descr(rows, max_rows=10):
+    """Describe the table row numbers `rows` briefly.
+
+    >>> _rows_descr(np.array([3]))
+    'row 3'
+    >>> _rows_descr(np.arange(12))
+    'rows 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ... (12 rows)'
+    """
+    if len(rows) == 1:
+        return "row " + str(rows[0])
+    descr = "rows " + ", ".join(str(row) for row in rows[:max_rows])
+    if len(rows) > max_rows:
+        descr += ", ... (" + str(len(rows)) + " rows)"
+    return descr
+
 # ----------------------------------------------------------------------------
 
 class CharacterValidator(KeywordValidator):
@@ -322,6 +390,16 @@ class CharacterValidator(KeywordValidator):
         for val in values:
             super(CharacterValidator, self)._check_value(filename, val)
 
+    def _condition_column(self, column, values):
+        if column.dtype.kind != "U":
+            return None
+        return np.char.upper(np.char.strip(np.array(values, dtype=str)))
+
+    def _valid_column_values(self, conditioned):
+        """Or-groups are left to check_value()."""
+        return super(CharacterValidator, self)._valid_column_values(conditioned) & \
+            (np.char.find(conditioned, "|") < 0)
+
 # ----------------------------------------------------------------------------
 
 class LogicalValidator(KeywordValidator):
@@ -329,6 +407,11 @@ class LogicalValidator(KeywordValidator):
 
     _values = ["T","F"]
 
+    def _condition_column(self, column, values):
+        if column.dtype.kind != "U":
+            return None
+        return np.array(values, dtype=str)
+
 # ----------------------------------------------------------------------------
 
 class NumericalValidator(KeywordValidator):
@@ -363,6 +446,26 @@ class NumericalValidator(KeywordValidator):
         else:   # First try a simple exact string match check
             KeywordValidator._check_value(self, filename, value)
 
+    # Column dtype kinds whose values self.condition() converts exactly as astype() does.
+    _column_kinds = "biuf"
+
+    def _condition_column(self, column, values):
+        if column.dtype.kind not in self._column_kinds:
+            return None
+        if self.condition is int and column.dtype.kind in "bi":
+            return np.array(values, dtype=np.int64)
+        conditioned = np.array(values, dtype=np.float64)
+        if self.condition is int:   # int() truncates toward zero and fails for nan/inf
+            finite = np.isfinite(conditioned)
+            conditioned = np.where(finite, np.trunc(conditioned), np.nan)
+        return conditioned
+
+    def _valid_column_values(self, conditioned):
+        if self.is_range:
+            with np.errstate(invalid="ignore"):
+                return (conditioned >= self.min) & (conditioned <= self.max)
+        return super(NumericalValidator, self)._valid_column_values(conditioned)
+
 # ----------------------------------------------------------------------------
 
 class IntValidator(NumericalValidator):
@@ -395,6 +498,13 @@ class FloatValidator(NumericalValidator):
                             repr(self.epsilon), "of any of", repr(self._values)])
             raise ValueError(msg) from exc
 
+    def _valid_column_values(self, conditioned):
+        valid = super(FloatValidator, self)._valid_column_values(conditioned)
+        if not self.is_range and self._values:
+            possibles = np.array(self._values, dtype=np.float64)
+            valid |= np.isclose(conditioned[:, np.newaxis], possibles[np.newaxis, :], self.epsilon).any(axis=1)
+        return valid
+
 # ----------------------------------------------------------------------------
 
 class RealValidator(FloatValidator):
@@ -537,6 +647,10 @@ class SybdateValidator(KeywordValidator):
 
 class JwstdateValidator(KeywordValidator):
     """Check &JWSTDATE date fields."""
+
+    # Non-compliant dates are warned about row by row.
+    check_column_values = Validator.check_column_values
+
     def _check_value(self, filename, value):
         self.verbose(filename, value)
 #         try:
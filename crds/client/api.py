@@ -5,6 +5,7 @@ cache them locally.
 import os
 import os.path
 import base64
+import hashlib
 import re
 import zlib
 import html
@@ -12,6 +13,8 @@ from urllib import request
 import warnings
 import json
 import ast
+import threading
+from concurrent import futures
 
 # ==============================================================================
 
@@ -616,23 +619,23 @@ class FileCacher:
         return int(self.info_map[os.path.basename(name)]["size"])
 
     def download_files(self, downloads, localpaths):
-        """Serial file-by-file download."""
+        """File-by-file download,  serial or using CRDS_DOWNLOAD_WORKERS threads.
+        Return the number of bytes downloaded.
+        """
         download_metadata = get_download_metadata()
         self.info_map = {}
         for filename in downloads:
             self.info_map[filename] = download_metadata.get(filename, "NOT FOUND unknown to server")
         if config.writable_cache_or_verbose("Readonly cache, skipping download of (first 5):", repr(downloads[:5]), verbosity=70):
+            total_bytes = get_total_bytes(self.info_map)
+            workers = min(config.DOWNLOAD_WORKERS.get(), len(downloads))
+            if workers > 1:
+                return self.download_files_concurrently(downloads, localpaths, total_bytes, workers)
             bytes_so_far = 0
             total_files = len(downloads)
-            total_bytes = get_total_bytes(self.info_map)
             for nth_file, name in enumerate(downloads):
                 try:
-                    if "NOT FOUND" in self.info_map[name]:
-                        raise CrdsDownloadError("file is not known to CRDS server.")
-                    bytes, path = self.catalog_file_size(name), localpaths[name]
-                    log.info(file_progress("Fetching", name, path, bytes, bytes_so_far, total_bytes, nth_file, total_files))
-                    self.download(name, path)
-                    bytes_so_far += os.stat(path).st_size
+                    bytes_so_far += self.fetch(name, localpaths[name], bytes_so_far, total_bytes, nth_file, total_files)
                 except Exception as exc:
                     if self.raise_exceptions:
                         raise
@@ -641,6 +644,50 @@ class FileCacher:
             return bytes_so_far
         return 0
 
+    def download_files_concurrently(self, downloads, localpaths, total_bytes, workers):
+        """Download `downloads` using a pool of `workers` threads,  reporting aggregate
+        progress.   Failures are reported or raised in `downloads` order,  as for serial
+        downloads.   Return the number of bytes downloaded.
+        """
+        lock = threading.Lock()
+        progress = dict(started=0, bytes=0)
+        total_files = len(downloads)
+
+        def fetch(name):
+            with lock:
+                nth_file, bytes_so_far = progress["started"], progress["bytes"]
+                progress["started"] += 1
+            size = self.fetch(name, localpaths[name], bytes_so_far, total_bytes, nth_file, total_files)
+            with lock:
+                progress["bytes"] += size
+
+        log.verbose("Downloading", total_files, "files using", workers, "threads.")
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = [pool.submit(fetch, name) for name in downloads]
+            try:
+                for name, future in zip(downloads, pending):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        if self.raise_exceptions:
+                            raise
+                        else:
+                            log.error("Failure downloading file", repr(name), ":", str(exc))
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return progress["bytes"]
+
+    def fetch(self, name, path, bytes_so_far, total_bytes, nth_file, total_files):
+        """Download file `name` to `path`,  logging progress.  Return the size of the downloaded file."""
+        if "NOT FOUND" in self.info_map[name]:
+            raise CrdsDownloadError("file is not known to CRDS server.")
+        bytes = self.catalog_file_size(name)
+        log.info(file_progress("Fetching", name, path, bytes, bytes_so_far, total_bytes, nth_file, total_files))
+        self.download(name, path)
+        return os.stat(path).st_size
+
     def download(self, name, localpath):
         """Download a single file."""
         # This code is complicated by the desire to blow away failed downloads.  For the specific
@@ -674,16 +721,57 @@ class FileCacher:
         """Download and verify file `name` under context `pipeline_context` to `localpath`."""
         if config.get_download_plugin():
             self.plugin_download(name, localpath)
+            self.verify_file(name, localpath)
         else:
-            generator = self.get_data_http(name)
-            self.generator_download(generator, localpath)
-        self.verify_file(name, localpath)
+            self.http_download(name, localpath)
+
+    def generator_download(self, generator, localpath, append=False, xsum=None):
+        """Read all bytes from `generator` until file is downloaded to `localpath.`
+        If `append` is True,  add the bytes to the end of an existing `localpath`.
+        If `xsum` is a hashlib object,  update it with the downloaded bytes.
 
-    def generator_download(self, generator, localpath):
-        """Read all bytes from `generator` until file is downloaded to `localpath.`"""
-        with open(localpath, "wb+") as outfile:
+        Return the number of bytes written.
+        """
+        length = 0
+        with open(localpath, "ab" if append else "wb+") as outfile:
             for data in generator:
                 outfile.write(data)
+                length += len(data)
+                if xsum is not None:
+                    xsum.update(data)
+        return length
+
+    def http_download(self, name, localpath):
+        """Download `name` to a partial file next to `localpath`,  computing its
+        length and sha1sum as the data streams in.  Only after verification is the
+        partial file renamed to `localpath`,  so readers never see partial files.
+
+        With CRDS_DOWNLOAD_RESUME,  a partial file left by a failed transfer is
+        continued rather than removed.
+        """
+        partial = partial_download_path(localpath)
+        resume = config.DOWNLOAD_RESUME.get()
+        offset = os.path.getsize(partial) if resume and os.path.exists(partial) else 0
+        if offset >= self.catalog_file_size(name):
+            offset = 0   # nothing left to resume,  start over
+        xsum = hashlib.sha1()
+        if offset:
+            with open(partial, "rb") as infile:
+                for block in iter(lambda: infile.read(config.CRDS_CHECKSUM_BLOCK_SIZE), b""):
+                    xsum.update(block)
+        try:
+            generator = self.get_data_http(name, offset)
+            length = offset + self.generator_download(generator, partial, append=offset > 0, xsum=xsum)
+        except BaseException:
+            if not resume:
+                self.remove_file(partial)
+            raise
+        try:
+            self.verify_download(name, length, xsum.hexdigest)
+        except Exception:
+            self.remove_file(partial)
+            raise
+        os.replace(partial, localpath)
 
     def plugin_download(self, filename, localpath):
         """Run an external program defined by CRDS_DOWNLOAD_PLUGIN to download filename to localpath."""
@@ -703,11 +791,26 @@ class FileCacher:
                     "Plugin download fail status =", repr(status),
                     "with command:", srepr(plugin_cmd))
 
-    def get_data_http(self, filename):
-        """Yield the data returned from `filename` of `pipeline_context` in manageable chunks."""
+    def get_data_http(self, filename, offset=0):
+        """Yield the data returned from `filename` of `pipeline_context` in manageable chunks,
+        starting at byte `offset` using an HTTP Range request when `offset` is non-zero.
+        """
         url = self.get_url(filename)
         try:
-            infile = request.urlopen(url)
+            if offset:
+                infile = request.urlopen(request.Request(url, headers={"Range" : "bytes={}-".format(offset)}))
+                if getattr(infile, "status", None) == 206:
+                    log.verbose("Resuming", repr(url), "at byte", offset)
+                else:   # Range ignored,  skip bytes already downloaded
+                    log.verbose("Server ignored Range request for", repr(url), "skipping", offset, "bytes")
+                    skip = offset
+                    while skip:
+                        skipped = len(infile.read(min(skip, config.CRDS_DATA_CHUNK_SIZE)))
+                        if not skipped:
+                            raise CrdsDownloadError("File shorter than partial download.")
+                        skip -= skipped
+            else:
+                infile = request.urlopen(url)
             file_size = utils.human_format_number(self.catalog_file_size(filename)).strip()
             stats = utils.TimingStats()
             data = infile.read(config.CRDS_DATA_CHUNK_SIZE)
@@ -734,8 +837,13 @@ class FileCacher:
 
     def verify_file(self, filename, localpath):
         """Check that the size and checksum of downloaded `filename` match the server."""
+        self.verify_download(filename, os.stat(localpath).st_size, lambda: utils.checksum(localpath))
+
+    def verify_download(self, filename, local_length, local_checksum):
+        """Check that the `local_length` and sha1sum of downloaded `filename` match the server.
+        `local_checksum` is called to obtain the local sha1sum only if one is needed.
+        """
         remote_info = self.info_map[filename]
-        local_length = os.stat(localpath).st_size
         original_length = int(remote_info["size"])
         if original_length != local_length and config.get_length_flag():
             raise CrdsDownloadError(
@@ -745,7 +853,7 @@ class FileCacher:
             log.verbose("Skipping sha1sum with CRDS_DOWNLOAD_CHECKSUMS=False")
         elif remote_info["sha1sum"] not in ["", "none"]:
             original_sha1sum = remote_info["sha1sum"]
-            local_sha1sum = utils.checksum(localpath)
+            local_sha1sum = local_checksum()
             if original_sha1sum != local_sha1sum:
                 raise CrdsDownloadError(
                     "downloaded file", srepr(filename),
@@ -754,6 +862,10 @@ class FileCacher:
         else:
             log.verbose("Skipping sha1sum check since server doesn't know it.")
 
+def partial_download_path(localpath):
+    """Return the path of the partial file `localpath` is downloaded to before verification."""
+    return localpath + ".part"
+
 # ==============================================================================
 
 def dump_mappings3(pipeline_context, ignore_cache=False, mappings=None, raise_exceptions=True):
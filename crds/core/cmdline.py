@@ -6,6 +6,7 @@ MAYBE integrate rc, environment, and command line parameters.
 
 import sys
 import os
+import io
 import argparse
 import pdb
 import cProfile, pstats
@@ -674,6 +675,61 @@ class UniqueErrorsMixin:
 
 # =============================================================================
 
+class LogCapture:
+    """Captures CRDS log output and errors tracked by a UniqueErrorsMixin script as a sequence
+    of events which can be replayed in another process.
+    """
+    def __init__(self):
+        self.events = []     # ("log", [output per handler]) or ("error", params, keys)
+        self.status = (0, 0, 0)
+        self._buffers = [io.StringIO() for handler in log.THE_LOGGER.handlers]
+        self._old_streams = None
+        self._old_status = None
+
+    def __enter__(self):
+        self._old_status = log.status()
+        self._old_streams = [handler.setStream(buffer)
+                             for (handler, buffer) in zip(log.THE_LOGGER.handlers, self._buffers)]
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+        for handler, stream in zip(log.THE_LOGGER.handlers, self._old_streams):
+            handler.setStream(stream)
+        self.status = tuple(new - old for (new, old) in zip(log.status(), self._old_status))
+        self._buffers = self._old_streams = None   # neither is picklable
+        return False
+
+    def flush(self):
+        """Record the log output captured since the last event."""
+        outputs = [buffer.getvalue() for buffer in self._buffers]
+        if any(outputs):
+            self.events.append(("log", outputs))
+            for buffer in self._buffers:
+                buffer.seek(0)
+                buffer.truncate()
+
+    def track_error(self, filename, instrument, filekind, args, keys):
+        """Record a UniqueErrorsMixin.log_and_track_error() call for replay."""
+        self.flush()
+        self.events.append(("error", (filename, instrument, filekind) + tuple(str(arg) for arg in args), keys))
+
+    def replay(self, script=None):
+        """Re-issue the captured output and tracked errors,  and add the captured
+        message counts to the CRDS log counts.
+        """
+        for event in self.events:
+            if event[0] == "log":
+                for handler, output in zip(log.THE_LOGGER.handlers, event[1]):
+                    handler.stream.write(output)
+                    handler.flush()
+            else:
+                _kind, params, keys = event
+                UniqueErrorsMixin.log_and_track_error(script, *params, **keys)
+        log.increment_status(*self.status)
+
+# =============================================================================
+
 class ContextsScript(Script):
     """Baseclass for a script proving support for command line specified contexts."""
 
@@ -332,6 +332,25 @@ FITS_IGNORE_MISSING_END = BooleanConfigItem("CRDS_FITS_IGNORE_MISSING_END", Fals
 FITS_VERIFY_CHECKSUM = BooleanConfigItem("CRDS_FITS_VERIFY_CHECKSUM", True,
     "When True, verify that FITS header CHECKSUM and DATASUM values are correct.  Otherwise fail.")
 
+SCAN_FITS_HEADERS = BooleanConfigItem("CRDS_SCAN_FITS_HEADERS", True,
+    "When True, read unverified FITS headers by scanning the raw header blocks rather than opening the "
+    "file with astropy,  which is still used for any file the scanner cannot read.")
+
+FITS_HEADER_THREADS = IntConfigItem("CRDS_FITS_HEADER_THREADS", 8,
+    "Number of threads used to scan the headers of many FITS files at once,  e.g. for bestrefs --files.")
+
+CACHE_FILE_HEADERS = BooleanConfigItem("CRDS_CACHE_FILE_HEADERS", False,
+    "When True, file headers are saved in a persistent cache in the CRDS cache keyed on file path, size, "
+    "modification time, and inode,  so later runs over unchanged files skip reading their headers.")
+
+HEADER_CACHE_BYTES = IntConfigItem("CRDS_HEADER_CACHE_BYTES", 2**28,
+    "Upper bound on the total size of the headers in the persistent header cache.  The least recently used "
+    "headers are dropped when it is exceeded.")
+
+CHECKSUM_LEDGER_MAX_AGE = IntConfigItem("CRDS_CHECKSUM_LEDGER_MAX_AGE", 0,
+    "Maximum age in days of the sha1sums crds sync --check-sha1sum reuses from the cache's checksum ledger. "
+    "Files last verified longer ago are rehashed and re-verified even if unchanged.  0 means no limit.")
+
 ADD_LOG_MSG_COUNTER = BooleanConfigItem(
     "CRDS_ADD_LOG_MSG_COUNTER", False, "When True, add a running counter.")
 log.set_add_log_msg_count(ADD_LOG_MSG_COUNTER)
@@ -547,12 +566,42 @@ def locate_pickle(mapping, observatory=None):
         observatory = mapping_to_observatory(mapping)
     return os.path.join(get_crds_picklepath(observatory), mapping + ".pkl")
 
+def get_crds_codepath():
+    """Return the directory name where CRDS stores verified and compiled mapping code."""
+    return _std_cache_path("", "CRDS_CODEPATH", "code")
+
+def get_crds_headerpath():
+    """Return the directory name where CRDS stores the persistent file header cache."""
+    return _std_cache_path("", "CRDS_HEADERPATH", "headers")
+
+CACHE_COMPILED_MAPPINGS = BooleanConfigItem("CRDS_CACHE_COMPILED_MAPPINGS", False,
+    "When True, mapping code verified and compiled at load time is saved in the CRDS cache keyed on the "
+    "sha1sum of the mapping text,  so later loads of the same mapping skip parsing and verification.  "
+    "Cached code is executed without being verified again,  so it is only loaded from files and "
+    "directories which no other user can write.")
+
+MAPPING_LOAD_PROCESSES = IntConfigItem("CRDS_MAPPING_LOAD_PROCESSES", 1,
+    "Number of processes used to verify and compile the uncached mappings of a pipeline context "
+    "concurrently when it is first loaded,  requires CRDS_CACHE_COMPILED_MAPPINGS.  1 compiles each "
+    "mapping as it is loaded.")
+
+MAPPING_PARSER = StrConfigItem("CRDS_MAPPING_PARSER", "exec",
+    "Method used to read mappings: 'exec' verifies mapping text as restricted Python and execs the "
+    "compiled code,  'native' reads the declarative mapping subset directly,  falling back to 'exec' for "
+    "anything else.  'native' is faster for mappings not yet in the compiled mappings cache.",
+    valid_values=["exec", "native"], lower=True)
+
 USE_PICKLED_CONTEXTS = BooleanConfigItem("CRDS_USE_PICKLED_CONTEXTS", False,
     "When True,  CRDS contexts should be loaded from a pickled version if possible.")
 
 AUTO_PICKLE_CONTEXTS = BooleanConfigItem("CRDS_AUTO_PICKLE_CONTEXTS", False,
     "When True, CRDS contexts should be automatically pickled and cached after loading.")
 
+CONTEXT_PICKLE_FORMAT = StrConfigItem("CRDS_CONTEXT_PICKLE_FORMAT", "snapshot",
+    "Format used to save context pickles: 'snapshot' stores each mapping separately for demand loading, "
+    "'pickle' stores the whole context as one Python pickle.  Either format can be loaded.",
+    valid_values=["snapshot", "pickle"], lower=True)
+
 # -------------------------------------------------------------------------------------
 
 FORCE_COMPLETE_LOAD = BooleanConfigItem("CRDS_FORCE_COMPLETE_LOAD", False,
@@ -560,12 +609,22 @@ FORCE_COMPLETE_LOAD = BooleanConfigItem("CRDS_FORCE_COMPLETE_LOAD", False,
 
 EXPLICIT_GARBAGE_COLLECTION = BooleanConfigItem("CRDS_EXPLICIT_GARBAGE_COLLECTION", True,
     "When False, the @gc_collected function decorator skips garbage collection.")
+
+BESTREFS_CACHE_SIZE = IntConfigItem("CRDS_BESTREFS_CACHE_SIZE", 0,
+    "Max number of lookup results remembered by each rmap,  keyed on matching parameters.  0 disables the cache.")
+
+BESTREFS_BATCH_SIZE = IntConfigItem("CRDS_BESTREFS_BATCH_SIZE", 1000,
+    "Number of datasets per server call or local work unit for batch best references.")
 # -------------------------------------------------------------------------------------
 
 def get_sqlite3_db_path(observatory):
     """Return the path to the downloadable CRDS catalog + history SQLite3 database file."""
     return locate_config("crds_db.sqlite3", observatory)
 
+def get_checksum_ledger_path(observatory):
+    """Return the path to the cache's record of previously computed file sha1sums."""
+    return locate_config("checksum_ledger.json", observatory)
+
 # ===========================================================================
 
 CRDS_SUBDIR_TAG_FILE = "ref_cache_subdir_mode"
@@ -756,6 +815,12 @@ DOWNLOAD_CHECKSUMS = BooleanConfigItem(
 DOWNLOAD_LENGTHS = BooleanConfigItem(
     "CRDS_DOWNLOAD_LENGTHS", True, "Verify downloaded files match server's file length.  If false,  allow bad lengths.")
 
+DOWNLOAD_WORKERS = IntConfigItem(
+    "CRDS_DOWNLOAD_WORKERS", 1, "Number of threads used to download files concurrently.  1 downloads serially.")
+
+DOWNLOAD_RESUME = BooleanConfigItem(
+    "CRDS_DOWNLOAD_RESUME", False, "Keep partially downloaded files as .part files and resume them using HTTP Range requests.")
+
 def get_checksum_flag():
     """Return True if the environment is configured for checksums."""
     return DOWNLOAD_CHECKSUMS.get()
@@ -94,6 +94,12 @@ class LazyFileDict(TransformedDict):
         """Drop all loaded selections reverting to pre-demand-loaded state."""
         super(LazyFileDict, self).__init__()
 
+    def unloaded(self, **load_keys):
+        """Return a copy of this dict with no members loaded,  updating the
+        copy's load keys (e.g. loader) with `load_keys`.
+        """
+        return self.__class__(self._xx_selector, dict(self._xx_load_keys, **load_keys))
+
     def __getstate__(self):
         """Drop dictionary attributes which correspond to loaded/cached members."""
         return dict(
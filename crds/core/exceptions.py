@@ -186,6 +186,9 @@ class JsonFormatError(FileFormatError):
 class YamlFormatError(FileFormatError):
     """What should be valid YAML didn't parse / load."""
 
+class FitsScanError(FileFormatError):
+    """A FITS file uses features the fast FITS header scanner does not read."""
+
 class UnsupportedFileOpError(CrdsError, NotImplementedError):
     """In CRDS,  some function is not supported for a particular file format."""
 
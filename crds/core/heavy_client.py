@@ -54,13 +54,17 @@ import traceback
 import uuid
 import fnmatch
 import pickle
+import collections
+import multiprocessing
+from concurrent import futures
 
 # ============================================================================
 
-from . import rmap, log, utils, config
+from . import rmap, log, utils, config, snapshot
 from .constants import ALL_OBSERVATORIES
 from .log import srepr
 from .exceptions import CrdsError, CrdsBadRulesError, CrdsBadReferenceError, CrdsConfigError, CrdsDownloadError
+from .exceptions import CrdsLookupError
 from crds.client import api
 
 # import crds  # forward
@@ -68,7 +72,7 @@ from crds.client import api
 # ============================================================================
 
 __all__ = [
-    "getreferences", "getrecommendations",
+    "getreferences", "getrecommendations", "getrecommendations_batch",
     "get_config_info", "update_config_info", "load_server_info",
     "get_processing_mode", "get_context_name",
     "version_info",
@@ -227,6 +231,147 @@ def _initial_recommendations(
 
 # ============================================================================
 
+def getrecommendations_batch(header_map, reftypes=None, context=None, observatory="jwst",
+                             fast=False, chunk_size=None, processes=1):
+    """
+    getrecommendations_batch() computes the best references for many datasets,
+    yielding (dataset_id, { reftype : bestref_basename }) in input order.
+
+    header_map      { dataset_id : parameters, ... }  or  iterable of (dataset_id, parameters)
+
+      Datasets are consumed and processed `chunk_size` at a time,  so an
+      iterable of items can stream an archive-scale set of headers without
+      holding all of them or all of the results in memory.
+
+    reftypes, context, observatory, fast
+
+      As for getrecommendations().
+
+    chunk_size      int
+
+      Number of datasets per server call or local work unit,  defaulting to
+      CRDS_BESTREFS_BATCH_SIZE.
+
+    processes       int
+
+      For local processing,  the number of worker processes to spread chunks
+      across.   Ignored when the server computes best references.
+
+    In "remote" mode each chunk is one get_best_references_by_header_map() call
+    to the server.   Otherwise chunks are computed locally against the cached
+    context,  in parallel if `processes` > 1.
+    """
+    if not fast:
+        check_observatory(observatory)
+        check_reftypes(reftypes)
+        check_context(context)
+
+    mode, final_context = get_processing_mode(observatory, context)
+    chunk_size = max(1, chunk_size or config.BESTREFS_BATCH_SIZE.get())
+    items = header_map.items() if isinstance(header_map, dict) else header_map
+    if not fast:
+        update_config_info(observatory)
+        items = _checked_batch_items(observatory, final_context, items)
+    chunks = utils.chunked(items, chunk_size)
+
+    if mode == "local":
+        log.verbose("Computing batch best references locally with", processes, "processes.")
+        ensure_mappings_cached(final_context)
+        results = _local_bestrefs_chunks(final_context, chunks, reftypes, processes)
+    else:
+        log.verbose("Computing batch best references remotely.")
+        results = _remote_bestrefs_chunks(final_context, chunks, reftypes)
+
+    for chunk_results in results:
+        for dataset_id, bestrefs in chunk_results:
+            if not fast:
+                warn_bad_references(observatory, bestrefs)
+            yield dataset_id, bestrefs
+
+def ensure_mappings_cached(context):
+    """Load `context` from the cache,  downloading its mappings if that fails."""
+    try:
+        get_symbolic_mapping(context)
+    except IOError:
+        log.verbose("Caching mapping files for context", srepr(context))
+        try:
+            api.dump_mappings(context)
+        except CrdsError as exc:
+            raise CrdsDownloadError("Failed caching mapping files:", str(exc)) from exc
+
+def _checked_batch_items(observatory, context, items):
+    """Yield the (dataset_id, parameters) `items` of getrecommendations_batch() with
+    checked parameters,  warning about `context` for each instrument as getrecommendations() does.
+    """
+    for dataset_id, header in items:
+        header = check_parameters(header)
+        warn_bad_context(observatory, context, utils.header_to_instrument(header))
+        yield dataset_id, header
+
+def _remote_bestrefs_chunks(context, chunks, reftypes):
+    """Yield a list of (dataset_id, bestrefs) for each chunk,  computed on the server."""
+    for chunk in chunks:
+        header_map = { dataset_id : { str(key) : str(value) for (key, value) in header.items() }
+                       for (dataset_id, header) in chunk }
+        bestrefs_map = api.get_best_references_by_header_map(context, header_map, reftypes)
+        yield [(dataset_id, bestrefs_map[dataset_id]) for (dataset_id, _header) in chunk]
+
+def _local_bestrefs_chunks(context, chunks, reftypes, processes):
+    """Yield a list of (dataset_id, bestrefs) for each chunk,  computed locally.
+    With multiple `processes` at most 2 chunks per process are in flight at once.
+    """
+    if processes <= 1:
+        for chunk in chunks:
+            yield _local_bestrefs_chunk(context, chunk, reftypes)
+        return
+    # fork so workers share the context already loaded by ensure_mappings_cached()
+    mp_context = multiprocessing.get_context("fork")
+    with futures.ProcessPoolExecutor(processes, mp_context=mp_context) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_local_bestrefs_chunk, context, chunk, reftypes))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _local_bestrefs_chunk(context, chunk, reftypes):
+    """Return [(dataset_id, bestrefs), ...] for the (dataset_id, header) pairs of `chunk`.
+    Headers requesting the same reftypes are matched together by rmap.get_best_references_batch().
+    If a group fails,  its headers are matched one at a time to identify the failing dataset.
+    """
+    ctx = get_symbolic_mapping(context, cached=True)
+    groups = collections.defaultdict(list)
+    for i, (dataset_id, header) in enumerate(chunk):
+        try:
+            conditioned = utils.condition_header(header)
+            include = reftypes if reftypes is not None else _default_reftypes(ctx, context, conditioned)
+        except Exception as exc:
+            raise CrdsLookupError("Failed computing best references for", repr(dataset_id), ":", str(exc)) from exc
+        groups[tuple(include)].append((i, conditioned))
+    results = [None] * len(chunk)
+    for include, members in groups.items():
+        try:
+            bestrefs = rmap.get_best_references_batch(
+                ctx, [header for (_i, header) in members], include=list(include), condition=False)
+        except Exception:
+            bestrefs = [_local_bestrefs_one(context, chunk[i], include) for (i, _header) in members]
+        for (i, _header), refs in zip(members, bestrefs):
+            results[i] = (chunk[i][0], refs)
+    return results
+
+def _local_bestrefs_one(context, item, reftypes):
+    """Return the bestrefs of (dataset_id, header) `item`,  raising CrdsLookupError naming
+    the dataset if they cannot be computed.
+    """
+    dataset_id, header = item
+    try:
+        return hv_best_references(context, header, list(reftypes))
+    except Exception as exc:
+        raise CrdsLookupError("Failed computing best references for", repr(dataset_id), ":", str(exc)) from exc
+
+# ============================================================================
+
 # This is cached because it should only produce output *once* per program run.
 @utils.cached
 def warn_bad_context(observatory, context, instrument=None):
@@ -367,14 +512,20 @@ def hv_best_references(context_file, header, include=None, condition=True):
     ctx = get_symbolic_mapping(context_file, cached=True)
     conditioned = utils.condition_header(header) if condition else header
     if include is None:
-        # requires conditioned header,  or compatible header
-        include = set(ctx.locate.header_to_reftypes(conditioned, context_file))
-        ctx_filekinds = set(ctx.get_filekinds(conditioned))
-        include = list(ctx_filekinds & include)
+        include = _default_reftypes(ctx, context_file, conditioned)
     minheader = ctx.minimize_header(conditioned)
     log.verbose("Bestrefs header:\n", log.PP(minheader))
     return ctx.get_best_references(minheader, include=include)
 
+def _default_reftypes(ctx, context_file, conditioned):
+    """Return the sorted reftypes of mapping `ctx` named `context_file` which apply to
+    `conditioned` header,  the reftypes hv_best_references() computes when `include` is None.
+    """
+    # requires conditioned header,  or compatible header
+    include = set(ctx.locate.header_to_reftypes(conditioned, context_file))
+    ctx_filekinds = set(ctx.get_filekinds(conditioned))
+    return sorted(ctx_filekinds & include)
+
 # ============================================================================
 
 # !!!!! interface to jwst.stpipe.crds_client
@@ -707,7 +858,10 @@ def load_pickled_mapping(mapping):
     if pickle_uri == "none":
         pickle_uri = config.locate_pickle(mapping)
     pickled = utils.get_uri_content(pickle_uri, mode="binary")
-    loaded = pickle.loads(pickled)
+    if snapshot.is_snapshot(pickled):
+        loaded = snapshot.loads(pickled)
+    else:
+        loaded = pickle.loads(pickled)
     log.info("Loaded pickled context", repr(mapping))
     return loaded
 
@@ -719,7 +873,10 @@ def save_pickled_mapping(mapping, loaded):
         return
     with log.verbose_warning_on_exception("Failed saving pickle for", repr(mapping), "to", repr(pickle_file)):
         loaded.force_load()
-        pickled = pickle.dumps(loaded)
+        if config.CONTEXT_PICKLE_FORMAT == "snapshot":
+            pickled = snapshot.dumps(loaded)
+        else:
+            pickled = pickle.dumps(loaded)
         cache_atomic_write(pickle_file, pickled, "CONTEXT PICKLE")
         log.info("Saved pickled context", repr(pickle_file))
 
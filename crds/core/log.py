@@ -303,6 +303,14 @@ def increment_errors(N=1):
     """Increment the error count by N without issuing a log message."""
     THE_LOGGER.errors += N
 
+def increment_status(errors=0, warnings=0, infos=0):
+    """Add to the global counts of errors, warnings, and infos without issuing log
+    messages,  e.g. to account for messages issued by worker processes.
+    """
+    THE_LOGGER.errors += errors
+    THE_LOGGER.warnings += warnings
+    THE_LOGGER.infos += infos
+
 def errors():
     """Return the global count of errors."""
     return THE_LOGGER.errors
@@ -0,0 +1,382 @@
+"""This module defines a native reader for CRDS mapping files,  an alternative
+to verifying a mapping as Python source with MAPPING_VERIFIER and exec'ing it.
+
+The reader accepts only the declarative subset of Python used by mappings:
+
+    header = { ... }
+    comment = \"\"\" ... \"\"\"
+    selector = Match({ ... })      or      selector = { ... }
+
+built from strings,  numbers,  True,  False,  None,  tuples,  lists,  dicts,
+and calls of the selector Parameters named in selectors.SELECTORS.   Nothing
+in the mapping text is evaluated:  strings and numbers are converted one token
+at a time and the only callables are the selector Parameters classes.
+
+Text outside the subset raises UnsupportedSyntaxError.   Mapping loads then
+fall back to the verified exec path,  which either accepts the text or reports
+the same errors it always has.
+"""
+import ast
+import marshal
+import re
+import sys
+import time
+
+from . import selectors, log
+from .exceptions import MappingFormatError
+
+# ===================================================================
+
+class UnsupportedSyntaxError(MappingFormatError):
+    """The mapping text uses syntax the native reader does not accept."""
+
+TOKEN_RE = re.compile(r"""
+     (?P<space>[ \t\f]+|\\\r?\n|\#[^\r\n]*)
+    |(?P<newline>\r?\n)
+    |(?P<string>[rRbBuU]{0,2}(?:'''(?:[^\\]|\\.)*?'''|\"\"\"(?:[^\\]|\\.)*?\"\"\"|'(?:[^'\\\r\n]|\\.)*'|"(?:[^"\\\r\n]|\\.)*"))
+    |(?P<number>0[xXoObB][0-9a-fA-F_]+|(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:[eE][-+]?\d[\d_]*)?[jJ]?)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>[-+{}()\[\],:=;])
+""", re.VERBOSE | re.DOTALL)
+
+FLOAT_RE = re.compile(r"^(?:\d+\.\d*|\.\d+|\d+(?:\.\d*)?[eE][-+]?\d+|\.\d+[eE][-+]?\d+)$")
+
+OPENERS = { "(" : ")", "[" : "]", "{" : "}" }
+
+CONSTANTS = { "True" : True, "False" : False, "None" : None }
+
+# Top level names a mapping may define,  as in MappingVerifier.visit_Assign()
+SECTIONS = ("header", "selector", "comment")
+
+END = ("end", None)
+
+# ===================================================================
+
+def tokenize(text):
+    """Return the list of (kind, value) tokens of mapping `text`,  kind being
+    one of "string", "number", "name", "op", or "newline".   String and number
+    values are converted to Python values.   Newlines inside brackets are dropped
+    as in Python.
+
+    >>> tokenize("x = ('a', -1.5, 0x10)  # comment")
+    [('name', 'x'), ('op', '='), ('op', '('), ('string', 'a'), ('op', ','), ('op', '-'), ('number', 1.5), ('op', ','), ('number', 16), ('op', ')')]
+
+    >>> tokenize("x = `a`")
+    Traceback (most recent call last):
+    ...
+    crds.core.mapping_reader.UnsupportedSyntaxError: Unsupported character '`' at line 1
+    """
+    tokens = []
+    depth = 0
+    pos = 0
+    match = TOKEN_RE.match
+    while pos < len(text):
+        found = match(text, pos)
+        if found is None:
+            raise UnsupportedSyntaxError(
+                "Unsupported character", repr(text[pos]), "at line", text.count("\n", 0, pos) + 1)
+        pos = found.end()
+        kind = found.lastgroup
+        token = found.group()
+        if kind == "space":
+            continue
+        elif kind == "newline":
+            if depth == 0:
+                tokens.append(("newline", None))
+            continue
+        elif kind == "string":
+            tokens.append((kind, _string_value(token)))
+        elif kind == "number":
+            tokens.append((kind, _number_value(token)))
+        else:
+            if token in OPENERS:
+                depth += 1
+            elif token in ")]}":
+                depth -= 1
+            tokens.append((kind, token))
+    return tokens
+
+def _string_value(token):
+    """Return the value of string literal `token`."""
+    if token[0] in "'\"" and "\\" not in token:
+        if token[:3] in ("'''", '"""') and len(token) >= 6:
+            return token[3:-3]
+        return token[1:-1]
+    return _literal(token)
+
+def _number_value(token):
+    """Return the value of number literal `token`."""
+    if token.isdigit() and (token[0] != "0" or not token.strip("0")):
+        return int(token)
+    if FLOAT_RE.match(token):
+        return float(token)
+    return _literal(token)
+
+def _literal(token):
+    """Convert a single literal `token` with ast.literal_eval(),  which evaluates nothing."""
+    try:
+        return ast.literal_eval(token)
+    except Exception as exc:
+        raise UnsupportedSyntaxError("Unsupported literal", repr(token)) from exc
+
+# ===================================================================
+
+def read_mapping(text):
+    """Read mapping `text` and return its namespace { name : value },  the
+    values of header,  selector,  and comment which exec'ing `text` would define.
+
+    >>> namespace = read_mapping('''
+    ... header = {
+    ...     'parkey' : (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')),
+    ...     'name' : 'test.rmap',   # trailing comments are white space
+    ... }
+    ... comment = \"\"\"first
+    ... second\"\"\"
+    ... selector = Match({
+    ...     ('HRC',) : UseAfter({
+    ...         '1992-01-01 00:00:00' : 'a.fits',
+    ...     }),
+    ... })
+    ... ''')
+    >>> namespace["header"]
+    {'parkey': (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')), 'name': 'test.rmap'}
+    >>> namespace["comment"]
+    'first\\nsecond'
+    >>> namespace["selector"], list(namespace["selector"].selections)
+    (Match, [(('HRC',), UseAfter)])
+
+    Expressions,  names,  and assignments other than the mapping sections are
+    not read:
+
+    >>> read_mapping("header = {'a' : 1 + 2}")
+    Traceback (most recent call last):
+    ...
+    crds.core.mapping_reader.UnsupportedSyntaxError: Expected ',' or '}' but found '+'
+
+    >>> read_mapping("header = {'a' : __import__}")
+    Traceback (most recent call last):
+    ...
+    crds.core.mapping_reader.UnsupportedSyntaxError: Unsupported name '__import__'
+
+    >>> read_mapping("x = {}")
+    Traceback (most recent call last):
+    ...
+    crds.core.mapping_reader.UnsupportedSyntaxError: Only define 'header' or 'selector' or 'comment' sections
+    """
+    return _Reader(tokenize(text)).read()
+
+class _Reader:
+    """Recursive descent reader over the tokens of one mapping."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        """Return the next token without consuming it."""
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else END
+
+    def next(self):
+        """Consume and return the next token."""
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, *ops):
+        """Consume the next token which must be one of `ops`,  returning it."""
+        kind, value = self.next()
+        if kind != "op" or value not in ops:
+            raise UnsupportedSyntaxError(
+                "Expected", " or ".join(repr(op) for op in ops), "but found", repr(value))
+        return value
+
+    def at_op(self, op):
+        """Return True IFF the next token is operator `op`."""
+        return self.peek() == ("op", op)
+
+    def read(self):
+        """Read all statements,  returning the namespace they define."""
+        namespace = {}
+        while self.peek() != END:
+            if self.peek() in (("newline", None), ("op", ";")):
+                self.next()
+                continue
+            if self.peek()[0] == "name" and self.pos + 1 < len(self.tokens) and \
+                    self.tokens[self.pos + 1] == ("op", "="):
+                name = self.next()[1]
+                self.next()
+                if name not in SECTIONS:
+                    raise UnsupportedSyntaxError("Only define 'header' or 'selector' or 'comment' sections")
+                value = self.value()
+                if not isinstance(value, (dict, str, selectors.Parameters)):
+                    raise UnsupportedSyntaxError(
+                        "Section value must be a selector call or dictionary or string")
+                namespace[name] = value
+            else:
+                self.value()    # expression statement,  e.g. a docstring
+            if self.peek() not in (END, ("newline", None), ("op", ";")):
+                raise UnsupportedSyntaxError("Unexpected", repr(self.peek()[1]), "after statement")
+        return namespace
+
+    def value(self):
+        """Read one value."""
+        kind, value = self.next()
+        if kind == "string":
+            while self.peek()[0] == "string":   # implicit concatenation
+                more = self.next()[1]
+                if type(more) is not type(value):
+                    raise UnsupportedSyntaxError("Cannot mix bytes and str literals")
+                value += more
+            return value
+        elif kind == "number":
+            return value
+        elif kind == "name":
+            return self.name(value)
+        elif kind == "op":
+            if value in ("-", "+"):
+                operand = self.value()
+                if type(operand) not in (int, float, complex):
+                    raise UnsupportedSyntaxError("Unary", repr(value), "only applies to numbers")
+                return -operand if value == "-" else +operand
+            elif value == "(":
+                return self.parenthesized()
+            elif value == "[":
+                return list(self.elements("]"))
+            elif value == "{":
+                return self.dict()
+        raise UnsupportedSyntaxError("Unexpected", repr(value))
+
+    def name(self, name):
+        """Read the value of a constant or a selector call starting with `name`."""
+        if name in CONSTANTS:
+            return CONSTANTS[name]
+        if name in selectors.SELECTORS and self.at_op("("):
+            self.next()
+            args = self.elements(")")
+            try:
+                return selectors.SELECTORS[name](*args)
+            except Exception as exc:
+                raise UnsupportedSyntaxError("Failed calling", repr(name), ":", str(exc)) from exc
+        raise UnsupportedSyntaxError("Unsupported name", repr(name))
+
+    def parenthesized(self):
+        """Read a tuple or parenthesized value following '('."""
+        if self.at_op(")"):
+            self.next()
+            return ()
+        first = self.value()
+        if self.expect(",", ")") == ")":
+            return first
+        return (first,) + tuple(self.elements(")"))
+
+    def elements(self, closer):
+        """Read comma separated values up to `closer`,  allowing a trailing comma."""
+        items = []
+        while not self.at_op(closer):
+            items.append(self.value())
+            if self.expect(",", closer) == closer:
+                return items
+        self.next()
+        return items
+
+    def dict(self):
+        """Read a dict following '{'.   Later duplicate keys replace earlier ones,
+        as for Python dict displays.
+        """
+        result = {}
+        while not self.at_op("}"):
+            key = self.value()
+            self.expect(":")
+            try:
+                result[key] = self.value()
+            except TypeError as exc:
+                raise UnsupportedSyntaxError("Unhashable dict key", repr(key)) from exc
+            if self.expect(",", "}") == "}":
+                return result
+        self.next()
+        return result
+
+# ===================================================================
+
+def benchmark(observatories=None, repeat=1):
+    """Compare reading every .rmap in the CRDS cache with the native reader and
+    with the verified exec path,  checking that both define the same header,
+    comment,  and instantiated selector.   Returns { method : seconds }.
+
+    "exec" verifies,  compiles,  and execs each mapping as an uncached load does,
+    "exec-cached" only execs the compiled code as loads from the compiled
+    mappings cache do.   All times include instantiating the selectors.
+
+    `observatories` defaults to all observatories.
+    """
+    from . import rmap
+    from .constants import ALL_OBSERVATORIES
+    from .mapping_verifier import MAPPING_VERIFIER
+    texts = []
+    for observatory in observatories or ALL_OBSERVATORIES:
+        for path in rmap.list_mappings("*.rmap", observatory, full_path=True):
+            with open(path) as handle:
+                texts.append((path, handle.read()))
+    nbytes = sum(len(text) for (_path, text) in texts)
+
+    def exec_read(text):
+        MAPPING_VERIFIER.visit(ast.parse(text))
+        return cached_read(marshal.dumps(compile(text, "<ast>", "exec")))
+
+    def cached_read(code):
+        namespace = dict(selectors.SELECTORS)
+        exec(marshal.loads(code), namespace)
+        return namespace
+
+    times = { "native" : 0.0, "exec" : 0.0, "exec-cached" : 0.0 }
+    fallbacks, mismatches = 0, 0
+    for path, text in texts:
+        results = {}
+        try:
+            code = marshal.dumps(compile(text, "<ast>", "exec"))
+        except Exception:
+            code = None
+        for method, reader, source in (("native", read_mapping, text),
+                                       ("exec", exec_read, text),
+                                       ("exec-cached", cached_read, code)):
+            try:
+                start = time.perf_counter()
+                for _i in range(repeat):
+                    namespace = reader(source)
+                    results[method] = _instantiate(namespace)
+                times[method] += time.perf_counter() - start
+            except Exception as exc:
+                results[method] = exc.__class__.__name__
+        if results["native"] == "UnsupportedSyntaxError":
+            fallbacks += 1
+        elif results["native"] != results["exec"]:
+            mismatches += 1
+            log.warning("Native reader disagrees with exec for", repr(path))
+    print("Read", len(texts), "rmaps,", nbytes, "bytes,", repeat, "time(s) each.")
+    for method, seconds in sorted(times.items()):
+        print("{:12s} {:8.3f} s {:8.1f} rmaps/s {:8.2f} MB/s".format(
+            method, seconds, len(texts) * repeat / seconds, nbytes * repeat / seconds / 1e6))
+    print("native fallbacks:", fallbacks, "mismatches:", mismatches)
+    return times
+
+def _instantiate(namespace):
+    """Return comparable (header, comment, selector dict) for mapping `namespace`."""
+    header = namespace["header"]
+    selector = namespace["selector"]
+    if isinstance(selector, selectors.Parameters):
+        selector = selector.instantiate(header).todict()
+    return header, namespace.get("comment"), selector
+
+# ===================================================================
+
+def test():
+    """Run module doctests."""
+    import doctest
+    from crds.core import mapping_reader
+    return doctest.testmod(mapping_reader)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--benchmark"]:
+        benchmark(sys.argv[2:] or None, repeat=3)
+    else:
+        print(test())
@@ -5,9 +5,13 @@ Mapping is loaded, and is non-recursive.
 """
 import ast
 import sys
+import os
+import hashlib
+import marshal
+import uuid
 
 from . import exceptions as crexc
-from . import selectors
+from . import selectors, config, log
 
 # ===================================================================
 
@@ -118,10 +122,25 @@ class MappingVerifier(ast.NodeVisitor):
     def compile_and_check(self, text, source="<ast>", mode="exec"):
         """Parse `text` to verify that it's a legal mapping, and return a
         compiled code object.
+
+        Code for whole mappings is cached on disk and expressions in memory,
+        both keyed on the sha1sum of `text`,  so identical text is only
+        parsed and verified once.
         """
-        if sys.version_info >= (2, 7, 0):
-            self.visit(ast.parse(text))
-        return compile(text, source, mode)
+        key = code_key(text, source, mode)
+        code = _EXPRESSION_CODE.get(key)
+        if code is None and mode == "exec":
+            code = load_code(key)
+        if code is None:
+            tree = ast.parse(text)
+            self.visit(tree)
+            if mode == "exec":
+                code = compile(tree, source, mode)
+                save_code(key, code)
+            else:
+                code = compile(text, source, mode)
+                _EXPRESSION_CODE[key] = code
+        return code
 
     def __getattribute__(self, attr):
         if attr.startswith("visit_"):
@@ -176,3 +195,102 @@ class MappingVerifier(ast.NodeVisitor):
         self.generic_visit(node)
 
 MAPPING_VERIFIER = MappingVerifier()
+
+# ===================================================================
+
+# Verified code for short expressions,  e.g. rmap relevance,  which repeat across rmaps:  { key : code }
+_EXPRESSION_CODE = {}
+
+def code_key(text, source="<ast>", mode="exec"):
+    """Return the cache key for the code compiled from `text`.   Since verification
+    rules belong to the CRDS version and code objects to the Python version,  the
+    key covers both.
+
+    >>> code_key("header = {}") == code_key("header = {}")
+    True
+    >>> code_key("header = {}") == code_key("header = {}", mode="eval")
+    False
+    """
+    import crds
+    ident = "\0".join([crds.__version__, sys.implementation.cache_tag, source, mode, text])
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+def locate_code(key):
+    """Return the path of the cached code for `key`."""
+    return os.path.join(config.get_crds_codepath(), key[:2], key + ".code")
+
+def load_code(key):
+    """Return the cached code for `key` or None if it is not cached or the
+    cached code cannot be trusted.
+    """
+    if not config.CACHE_COMPILED_MAPPINGS:
+        return None
+    path = locate_code(key)
+    try:
+        with open(path, "rb") as handle:
+            if not is_trusted_code(path, handle):
+                return None
+            return marshal.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        log.verbose_warning("Failed loading cached mapping code", repr(key), ":", str(exc))
+        return None
+
+def is_trusted_code(path, handle=None):
+    """Return True IFF cached code file `path` can be executed without verifying it.
+
+    Since cached code is exec'ed as is,  neither the file nor the directories
+    holding it may be writable by group or other,  and they must be owned by the
+    current user or root.   A readonly cache is maintained by others,  so there
+    other owners are also accepted.
+    """
+    code_path = os.path.abspath(config.get_crds_codepath())
+    stats = [os.fstat(handle.fileno()) if handle is not None else os.stat(path),
+             os.stat(os.path.dirname(path)),
+             os.stat(code_path)]
+    for stat in stats:
+        if stat.st_mode & 0o022:
+            log.verbose_warning("Ignoring cached mapping code", repr(path),
+                                "in location writable by other users.", verbosity=60)
+            return False
+        if stat.st_uid not in (os.getuid(), 0) and not config.get_cache_readonly():
+            log.verbose_warning("Ignoring cached mapping code", repr(path),
+                                "owned by another user.", verbosity=60)
+            return False
+    return True
+
+def save_code(key, code):
+    """Save `code` in the CRDS cache as the code for `key`,  atomically so that
+    concurrent loads of the same mapping never see partial code.   Files and
+    directories are created writable only by the current user.
+    """
+    if not config.CACHE_COMPILED_MAPPINGS or config.get_cache_readonly():
+        return
+    path = locate_code(key)
+    with log.verbose_warning_on_exception("Failed caching mapping code", repr(key)):
+        os.makedirs(config.get_crds_codepath(), mode=0o755, exist_ok=True)
+        os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+        temp_path = os.path.join(os.path.dirname(path), str(uuid.uuid4()))
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), "wb") as handle:
+            marshal.dump(code, handle)
+        os.replace(temp_path, path)
+
+def is_code_cached(text, source="<ast>", mode="exec"):
+    """Return True IFF trusted code for `text` is already cached."""
+    path = locate_code(code_key(text, source, mode))
+    try:
+        return is_trusted_code(path)
+    except OSError:
+        return False
+
+# ===================================================================
+
+def test():
+    """Run module doctests."""
+    import doctest
+    from crds.core import mapping_verifier
+    return doctest.testmod(mapping_verifier)
+
+if __name__ == "__main__":
+    print(test())
@@ -54,14 +54,16 @@ True
 import os.path
 import glob
 import json
+import multiprocessing
+from concurrent import futures
 
-from collections import namedtuple
+from collections import namedtuple, defaultdict, OrderedDict
 
 # ===================================================================
 
 from pkg_resources import Requirement
 
-from . import log, utils, config, selectors, substitutions
+from . import log, utils, config, selectors, substitutions, mapping_reader
 
 # XXX For backward compatability until refactored away.
 from .config import locate_file, locate_mapping, locate_reference
@@ -69,7 +71,7 @@ from .config import mapping_exists, is_mapping
 
 from . import exceptions as crexc
 from .custom_dict import LazyFileDict
-from .mapping_verifier import MAPPING_VERIFIER
+from .mapping_verifier import MAPPING_VERIFIER, is_code_cached
 from .log import srepr
 from .constants import ALL_OBSERVATORIES, INSTRUMENT_KEYWORDS
 
@@ -291,8 +293,18 @@ class Mapping:
         """
         with log.augment_exception("Can't load file " + where,
                                    exception_class=crexc.MappingError):
-            code = MAPPING_VERIFIER.compile_and_check(text)
-            header, selector, comment = cls._interpret(code)
+            namespace = None
+            if config.MAPPING_PARSER == "native":
+                try:
+                    namespace = mapping_reader.read_mapping(text)
+                except mapping_reader.UnsupportedSyntaxError as exc:
+                    log.verbose("Native mapping reader failed for", where, ":", str(exc),
+                                ": using exec.", verbosity=60)
+            if namespace is not None:
+                header, selector, comment = cls._interpret_namespace(namespace)
+            else:
+                code = MAPPING_VERIFIER.compile_and_check(text)
+                header, selector, comment = cls._interpret(code)
         return LowerCaseDict(header), selector, comment
 
     @classmethod
@@ -303,6 +315,13 @@ class Mapping:
         namespace = {}
         namespace.update(selectors.SELECTORS)
         exec(code, namespace)
+        return cls._interpret_namespace(namespace)
+
+    @classmethod
+    def _interpret_namespace(cls, namespace):
+        """Return the header,  instantiated selector,  and comment defined by
+        mapping `namespace`.
+        """
         header = LowerCaseDict(namespace["header"])
         selector = namespace["selector"]
         comment = namespace.get("comment", None)
@@ -413,6 +432,9 @@ class Mapping:
     @utils.cached
     def get_required_parkeys(self):
         """Determine the set of parkeys required for this mapping and all the mappings selected by it."""
+        recorded = getattr(self, "_recorded_parkeys", None)
+        if recorded is not None:   # see InstrumentContext.record_required_parkeys()
+            return list(recorded)
         parkeys = set(self.parkey)
         parkeys |= set(self.header.get("extra_keys",[]))
         if hasattr(self, "selections"):
@@ -736,6 +758,35 @@ class PipelineContext(ContextMapping):
         imap = self.get_imap(instrument)
         return imap.get_best_references(header, include)
 
+    def get_best_references_batch(self, headers, include=None, condition=True):
+        """Return a list of best references dicts { filekind : reffile_basename },
+        one for each header in iterable `headers`,  in the same order.
+
+        Each header is minimized and (if `condition` is True) conditioned as
+        for module-level get_best_references(),  then the headers are grouped
+        by instrument so that identical parameter sets are only matched once.
+
+        >>> p = get_cached_mapping("hst.pmap")
+        >>> h = {'INSTRUME': 'ACS', 'DETECTOR': 'SBC', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+        >>> batch = p.get_best_references_batch([h, h], include=["mlintab"])
+        >>> batch == [get_best_references(p, h, include=["mlintab"])] * 2
+        True
+        """
+        by_instrument = defaultdict(list)
+        minimized = []
+        for i, header in enumerate(headers):
+            by_instrument[self.get_instrument(header)].append(i)
+            minimized.append(self.minimize_header(header))
+        if condition:
+            minimized = utils.condition_headers(minimized)
+        results = [None] * len(minimized)
+        for instrument, indices in by_instrument.items():
+            imap = self.get_imap(instrument)
+            refs = imap.get_best_references_batch([minimized[i] for i in indices], include)
+            for i, ref in zip(indices, refs):
+                results[i] = ref
+        return results
+
     def get_old_references(self, header, include=None):
         """Return the old references defined in keyword map `header` using this
         context to define the types to return when `include` is None.
@@ -888,6 +939,14 @@ class InstrumentContext(ContextMapping):
         """
         return self
 
+    def record_required_parkeys(self):
+        """Store this instrument's required parkeys with the mapping itself so
+        that copies restored from a context snapshot can minimize headers
+        without loading every .rmap,  leaving each .rmap to load on first
+        lookup of its filekind.
+        """
+        self._recorded_parkeys = tuple(self.get_required_parkeys())
+
     def get_best_references(self, header, include=None):
         """Returns a map of best references { filekind : reffile_basename }
         appropriate for this `header`.   If `include` is None, include all
@@ -914,6 +973,23 @@ class InstrumentContext(ContextMapping):
         log.verbose("-"*120, verbosity=55)
         return refs
 
+    def get_best_references_batch(self, headers, include=None):
+        """Return a list of best references maps,  one for each header in
+        `headers`,  as computed by get_best_references().   Headers with
+        identical parameters are only matched once,  so `headers` should
+        already be minimized to the parkeys required by this context.
+        """
+        unique = {}
+        results = []
+        for header in headers:
+            key = tuple(sorted(header.items()))
+            if key not in unique:
+                unique[key] = self.get_best_references(header, include)
+            results.append(dict(unique[key]))
+        log.verbose("Batch bestrefs for", repr(self.instrument), "matched", len(unique),
+                    "unique parameter sets for", len(results), "headers.", verbosity=55)
+        return results
+
     def get_old_references(self, header, include=None):
         """Returns a map of old references which were recorded in `header`,
         returning only those types listed in `include` or all types if
@@ -1077,6 +1153,9 @@ class ReferenceMapping(Mapping):
         # Actually compile lambdas for the hooks above.
         self._init_compiled()
 
+        # Optional LRU of lookup outcomes keyed on preconditioned matching parameters,  see _get_best_ref().
+        self._init_lookup_cache()
+
     def __getstate__(self):
         """Return rmap pickling state,  minus lambdas and anything else that doesn't pickle."""
         state = dict(self.__dict__)
@@ -1086,12 +1165,35 @@ class ReferenceMapping(Mapping):
         del state["_precondition_header"]
         del state["_fallback_header"]
         del state["_rmap_update_headers"]
+        for key in ["_lookup_cache", "_lookup_cache_hits", "_lookup_cache_misses"]:
+            state.pop(key, None)
         return state
 
     def __setstate__(self, state):
         """Recreate rmap object from `state`,  recompiling missing __getstate__ objects on the fly."""
         self.__dict__ = dict(state)
         self._init_compiled()
+        self._init_lookup_cache()
+
+    def _init_lookup_cache(self):
+        """Create an empty lookup cache and reset its counters.  The cache is
+        bounded by CRDS_BESTREFS_CACHE_SIZE as of rmap creation;  0 disables it.
+        """
+        self._lookup_cache = OrderedDict()
+        self._lookup_cache_size = config.BESTREFS_CACHE_SIZE.get()
+        self._lookup_cache_hits = 0
+        self._lookup_cache_misses = 0
+
+    clear_lookup_cache = _init_lookup_cache
+
+    def get_lookup_cache_stats(self):
+        """Return a dict of counters describing the effectiveness of this rmap's lookup cache."""
+        return {
+            "hits" : self._lookup_cache_hits,
+            "misses" : self._lookup_cache_misses,
+            "size" : len(self._lookup_cache),
+            "maxsize" : self._lookup_cache_size,
+            }
 
     def force_load(self):
         """Nothing below ReferenceMapping is loaded."""
@@ -1111,10 +1213,18 @@ class ReferenceMapping(Mapping):
             name.lower() : self.get_expr(expr) for (name, expr) in relevant.items()
             }
 
-        self._precondition_header = self.get_hook("precondition_header", (lambda self, header: header))
-        self._fallback_header = self.get_hook("fallback_header", (lambda self, header: None))
+        no_precondition = (lambda self, header: header)
+        self._precondition_header = self.get_hook("precondition_header", no_precondition)
+        no_fallback = (lambda self, header: None)
+        self._fallback_header = self.get_hook("fallback_header", no_fallback)
+        self._has_fallback_header = self._fallback_header is not no_fallback
         self._rmap_update_headers = self.get_hook("rmap_update_headers", None)
 
+        # Hooks and parkey relevance expressions can read keywords other than the required parkeys,
+        # so lookups through them are cached on the whole lookup header,  see _lookup_cache_key().
+        self._lookup_on_full_header = (self._precondition_header is not no_precondition or
+                                       self._has_fallback_header or bool(self.header.get("parkey_relevance", {})))
+
     def validate(self):
         """Validate the contents of this rmap against the TPN for this
         filekind / reftype.   Each field of each Match tuple must have a value
@@ -1214,6 +1324,66 @@ class ReferenceMapping(Mapping):
         self.check_rmap_relevance(expr_header)  # Should bestref be set N/A based on rmap_relevance expr?
         # Some filekinds, .e.g. ACS biasfile, mutate the header
         header = self._precondition_header(self, header_in) # Execute type-specific plugin if applicable
+        if not self._lookup_cache_size:
+            return self._select_best_ref(header, header_in)
+        key = self._lookup_cache_key(header, header_in)
+        try:
+            found, outcome = self._lookup_cache[key]
+        except KeyError:
+            self._lookup_cache_misses += 1
+            try:
+                outcome = self._select_best_ref(header, header_in)
+            except Exception as exc:
+                found, outcome = False, exc
+            else:
+                found = True
+            self._lookup_cache[key] = (found, outcome)
+            if len(self._lookup_cache) > self._lookup_cache_size:
+                self._lookup_cache.popitem(last=False)
+        except TypeError:   # unhashable header value,  don't cache
+            return self._select_best_ref(header, header_in)
+        else:
+            self._lookup_cache_hits += 1
+            self._lookup_cache.move_to_end(key)
+        if not found:
+            raise outcome.with_traceback(None)
+        return outcome
+
+    def get_selection_headers(self, header_in):
+        """Return the list of headers which the selector of this rmap can be asked
+        to choose from when looking up `header_in`:  the preconditioned header and
+        the fallback header if a fallback hook is defined.   Return [] if `header_in`
+        is omitted or irrelevant based on the rmap header expressions.
+        """
+        header_in = dict(header_in)
+        expr_header = utils.condition_header_keys(header_in)
+        try:
+            self.check_rmap_omit(expr_header)
+            self.check_rmap_relevance(expr_header)
+        except (crexc.OmitReferenceTypeError, crexc.IrrelevantReferenceTypeError):
+            return []
+        header = self._precondition_header(self, header_in)
+        headers = [self.map_irrelevant_parkeys_to_na(header)]
+        if self._has_fallback_header:
+            fallback = self._fallback_header(self, header_in)
+            if fallback:
+                headers.append(self.map_irrelevant_parkeys_to_na(self.minimize_header(fallback)))
+        return headers
+
+    def _lookup_cache_key(self, header, header_in):
+        """Return the lookup cache key for preconditioned `header`.   Since hooks and
+        parkey relevance expressions can read any keyword of the original header,
+        rmaps which define them key on all of `header_in` rather than the required
+        parkeys of `header`.
+        """
+        if self._lookup_on_full_header:
+            return tuple(sorted(header_in.items()))
+        return tuple(header.get(parkey, "UNDEFINED") for parkey in self._required_parkeys)
+
+    def _select_best_ref(self, header, header_in):
+        """Return the bestref selected by preconditioned `header`,  falling back
+        on the fallback hook applied to `header_in` if the first selection fails.
+        """
         header = self.map_irrelevant_parkeys_to_na(header)  # Execute rmap parkey_relevance conditions
         try:
             bestref = self.selector.choose(header)
@@ -1521,6 +1691,7 @@ class ReferenceMapping(Mapping):
         new = self.copy()
         new.selector.insert(header, value,
             self.tpn_valid_values if not config.ALLOW_BAD_PARKEY_VALUES else {})
+        new.clear_lookup_cache()
         return new
 
     def delete(self, terminal):
@@ -1530,6 +1701,7 @@ class ReferenceMapping(Mapping):
         deleted_count = new.selector.delete(terminal)
         if deleted_count == 0:
             raise crexc.CrdsError("Terminal '%s' could not be found and deleted." % terminal)
+        new.clear_lookup_cache()
         return new
 
     def todict(self, recursive=10):
@@ -1626,7 +1798,60 @@ def _load_mapping(mapping, **keys):
     if config.S3_ENABLED:
         return cls.from_s3(mapping, **keys)
     else:
-        return cls.from_file(mapping, **keys)
+        loaded = cls.from_file(mapping, **keys)
+        processes = config.MAPPING_LOAD_PROCESSES.get()
+        if cls is PipelineContext and processes > 1 and config.CACHE_COMPILED_MAPPINGS:
+            compile_mappings(loaded, processes)
+        return loaded
+
+def compile_mappings(context, processes):
+    """Verify and compile the mappings nested under `context` into the compiled
+    mappings cache using `processes` worker processes.   Afterward,  loading the
+    nested mappings reads their code from the cache instead of parsing them.
+
+    Each worker handles one mapping and returns the names of the mappings nested
+    under it,  so the rmaps of one .imap are compiled while other .imaps are
+    still being read.   Mappings which fail are skipped here and reported when
+    they are actually loaded.
+    """
+    log.verbose("Compiling mappings of", repr(context.basename), "with", processes, "processes.", verbosity=55)
+    submitted, pending = set(), set()
+    mp_context = multiprocessing.get_context("fork")
+    with futures.ProcessPoolExecutor(processes, mp_context=mp_context) as pool:
+        def submit(names):
+            for name in names:
+                if name not in submitted:
+                    submitted.add(name)
+                    pending.add(pool.submit(_compile_mapping_file, _nested_mapping_path(name, context.path)))
+        submit(_nested_mapping_names(context.selector))
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                with log.verbose_warning_on_exception("Failed compiling nested mapping of", repr(context.basename)):
+                    submit(future.result())
+
+def _compile_mapping_file(filename):
+    """Verify and compile mapping `filename` into the compiled mappings cache.
+    Return the names of the mappings nested under it.
+    """
+    text = utils.get_uri_content(filename)
+    if filename.endswith(".rmap"):
+        if not is_code_cached(text):
+            MAPPING_VERIFIER.compile_and_check(text)
+        return []
+    _header, selector, _comment = Mapping._interpret(MAPPING_VERIFIER.compile_and_check(text))
+    return _nested_mapping_names(selector)
+
+def _nested_mapping_names(selector):
+    """Return the mapping names in context `selector` dict,  excluding N/A and OMIT."""
+    return [name for name in selector.values()
+            if isinstance(name, str) and not MappingSelectionsDict.is_special_value(name)]
+
+def _nested_mapping_path(name, path=None):
+    """Return the file path of nested mapping `name`,  relative to `path` if specified."""
+    if path:
+        return os.path.join(path, os.path.basename(name))
+    return config.locate_mapping(name)
 
 def asmapping(filename_or_mapping, cached=False, **keys):
     """Return the Mapping object corresponding to `filename_or_mapping`.
@@ -1823,6 +2048,23 @@ def get_best_references(context_file, header, include=None, condition=True):
         minheader = utils.condition_header(minheader)
     return ctx.get_best_references(minheader, include=include)
 
+def get_best_references_batch(context_file, headers, include=None, condition=True):
+    """Compute the best references for each header in iterable `headers`
+    for the given CRDS `context_file`,  returning a list of bestrefs dicts
+    in the same order as `headers`.   Results match calling
+    get_best_references() on each header,  but conditioning and matching
+    are shared between headers with identical parameters.
+    """
+    ctx = asmapping(context_file, cached=True)
+    if isinstance(ctx, PipelineContext):
+        return ctx.get_best_references_batch(headers, include=include, condition=condition)
+    minheaders = [ctx.minimize_header(header) for header in headers]
+    if condition:
+        minheaders = utils.condition_headers(minheaders)
+    if isinstance(ctx, InstrumentContext):
+        return ctx.get_best_references_batch(minheaders, include=include)
+    return [ctx.get_best_references(header, include=include) for header in minheaders]
+
 
 def test():
     """Run module doctests."""
@@ -87,6 +87,8 @@ with ClosestTime utilizing "time" and SelectVersion utilizing "sw_version".
 
 import re
 import fnmatch
+import bisect
+import datetime
 import sys
 import numbers
 from collections import namedtuple
@@ -1304,6 +1306,37 @@ class GlobMatcher(RegexMatcher):
         # To support automatic refactoring in the refactor module,  also
         # match on the original key such as A|B|C|D
 
+class SetMatcher(Matcher):
+    """Matcher for |-joined literal values,  i.e. or-globs with no wildcards,
+    which are matched by set membership rather than a regex.
+
+    >>> m = SetMatcher(" UVIS-SUB-QUAD  |  UVIS-SUB-W2K  ")
+    >>> m
+    SetMatcher('UVIS-SUB-QUAD|UVIS-SUB-W2K')
+    >>> m.match("UVIS-SUB-W2K")
+    1
+    >>> m.match("UVIS-SUB")
+    -1
+    >>> m.match("UVIS-SUB-QUAD|UVIS-SUB-W2K")
+    -1
+    >>> m.match("*")
+    1
+    >>> m.match("N/A")
+    0
+    """
+    def __init__(self, key):
+        parts = glob_list(key)
+        super(SetMatcher, self).__init__("|".join(parts))
+        self._values = frozenset(parts)
+
+    def match(self, value):
+        if value in self._values or value == "*":
+            return 1
+        elif value == "N/A":
+            return 0
+        else:
+            return -1
+
 class InequalityMatcher(Matcher):
     """
     >>> m = InequalityMatcher(">1.2")
@@ -1424,8 +1457,15 @@ def esoteric_key(key):
     key = key.upper()
     return key.startswith(("{","(","#")) and key.endswith(("}",")","#")) or key.startswith("BETWEEN") or key.startswith("NOT")
 
+# Matchers are shared by every MatchSelector using the same key:  { key : Matcher }
+MATCHERS = {}
+
 def matcher(key):
-    """Factory for different matchers based on key types.
+    """Factory for different matchers based on key types.   Matchers do not
+    change once created,  so there is one Matcher for each distinct key.
+
+    >>> matcher("FOO|BAR") is matcher("FOO|BAR")
+    True
 
     A tuple of values is treated as an or-ed glob expression.
 
@@ -1602,9 +1642,23 @@ def matcher(key):
     >>> someor.match("for|me")
     -1
 
+    Or-ed values without wildcards are matched as a set:
+
+    >>> matcher("FOO|BAR | BAZ")
+    SetMatcher('BAR|BAZ|FOO')
+    >>> matcher("FOO|BA*")
+    GlobMatcher('^((?s:BA.*)\\Z|(?s:FOO)\\Z)$')
     """
+    try:
+        return MATCHERS[key]
+    except KeyError:
+        result = MATCHERS[key] = _new_matcher(key)
+        return result
+
+def _new_matcher(key):
+    """Create the Matcher for `key`,  see matcher()."""
     if isinstance(key, tuple):
-        return GlobMatcher("|".join(key))
+        return _glob_matcher("|".join(key))
     elif key.startswith("(") and key.endswith(")"):
         return RegexMatcher(key[1:-1])
     elif key.startswith("{") and key.endswith("}"):
@@ -1627,7 +1681,7 @@ def matcher(key):
     elif key.upper().startswith("NOT "):
         return NotMatcher(key)
     elif "|" in key or "*" in key:
-        return GlobMatcher(key)
+        return _glob_matcher(key)
     elif key == "N/A":
         return NaMatcher("N/A")
     elif key.startswith((">","<")):
@@ -1635,6 +1689,157 @@ def matcher(key):
     else:
         return Matcher(key)
 
+# fnmatch special characters,  an or-glob part without these is a literal value.
+GLOB_SPECIAL_CHARS = ("*", "?", "[")
+
+def _glob_matcher(key):
+    """Return a SetMatcher for `key` if it has no wildcards,  otherwise a GlobMatcher."""
+    parts = glob_list(key)
+    if parts and not any(char in part for part in parts for char in GLOB_SPECIAL_CHARS):
+        return SetMatcher(key)
+    return GlobMatcher(key)
+
+# ==============================================================================
+
+MatchIndexColumn = namedtuple("MatchIndexColumn", ("literals", "literal_all", "na", "wild", "generic"))
+
+class MatchIndex:
+    """MatchIndex is a precompiled lookup structure for the match tuples of
+    a MatchSelector.   For each parameter,  the match tuples are partitioned
+    into buckets based on the kind of Matcher used for that parameter:
+
+    literals     { value : frozenset(match_tuples) } for literal and or-bar values
+    literal_all  frozenset(match_tuples) of every literal match tuple
+    na           frozenset(match_tuples) for N/A,  always "don't care"
+    wild         frozenset(match_tuples) for *,  always a match
+    generic      ((match_tuple, Matcher), ...) for regexes, inequalities, etc.
+
+    Winnowing a header then becomes a dictionary lookup and set intersection
+    for each parameter,  only calling Matcher.match() for the generic bucket.
+
+    >>> m = MatchSelector(("foo","bar"), {
+    ...    ('1.0', 'N/A') : "100",
+    ...    ('1.0', '2.0|3.0') : "200",
+    ...    ('4.0', '*') : "300",
+    ...    ('4.0', '>5.0') : "400",
+    ... })
+
+    >>> index = m._match_index
+    >>> sorted(index._columns[1].literals)
+    ['2.0', '3.0']
+    >>> index._columns[1].na
+    frozenset({('1.0', 'N/A')})
+    >>> index._columns[1].wild
+    frozenset({('4.0', '*')})
+    >>> index._columns[1].generic
+    ((('4.0', '>5.0'), InequalityMatcher('>5.0')),)
+
+    winnow() returns the weights and surviving match tuples in selector order,
+    identical to the unindexed MatchSelector._winnow():
+
+    >>> index.winnow(dict(foo='1.0', bar='3.0'), m._parameters)
+    ({('1.0', '2.0|3.0'): -2, ('1.0', 'N/A'): -1}, [('1.0', '2.0|3.0'), ('1.0', 'N/A')])
+
+    >>> weights, remaining = m._winnow(dict(foo='1.0', bar='3.0'), dict(m._match_selections))
+    >>> { match_tuple : weights[match_tuple] for match_tuple in remaining }
+    {('1.0', '2.0|3.0'): -2, ('1.0', 'N/A'): -1}
+
+    >>> index.winnow(dict(foo='4.0', bar='6.0'), m._parameters)
+    ({('4.0', '*'): -2, ('4.0', '>5.0'): -2}, [('4.0', '*'), ('4.0', '>5.0')])
+
+    >>> index.winnow(dict(foo='*', bar='N/A'), m._parameters)[1]
+    [('1.0', '2.0|3.0'), ('1.0', 'N/A'), ('4.0', '*'), ('4.0', '>5.0')]
+
+    Non-string header values cannot be indexed and return None to request
+    the unindexed search:
+
+    >>> index.winnow(dict(foo=1.0, bar='3.0'), m._parameters) is None
+    True
+    """
+    def __init__(self, parameters, match_selections):
+        self._order = { match_tuple : i for (i, match_tuple) in enumerate(match_selections) }
+        self._all = frozenset(match_selections)
+        self._columns = tuple(self._index_column(i, match_selections) for i in range(len(parameters)))
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(nselections=" + str(len(self._all)) + ")"
+
+    @staticmethod
+    def _index_column(i, match_selections):
+        """Partition the match tuples of `match_selections` into buckets based on
+        the Matcher for the `i`th parameter.   Return a MatchIndexColumn.
+        """
+        literals, literal_all, na, wild, generic = {}, set(), set(), set(), []
+        for match_tuple, selection in match_selections.items():
+            matcher_i = selection[0][i]
+            if isinstance(matcher_i, NaMatcher):
+                na.add(match_tuple)
+                continue
+            if isinstance(matcher_i, GlobMatcher) and match_tuple[i] == "*":
+                wild.add(match_tuple)
+                continue
+            values = MatchIndex._literal_values(matcher_i)
+            if values is not None:
+                for value in values:
+                    literals.setdefault(value, set()).add(match_tuple)
+                literal_all.add(match_tuple)
+            else:
+                generic.append((match_tuple, matcher_i))
+        literals = { value : frozenset(tuples) for (value, tuples) in literals.items() }
+        return MatchIndexColumn(literals, frozenset(literal_all), frozenset(na), frozenset(wild), tuple(generic))
+
+    @staticmethod
+    def _literal_values(matcher_i):
+        """Return the list of literal values matched by `matcher_i`,  or None if
+        `matcher_i` is not a simple equality or or-bar set.
+        """
+        if type(matcher_i) is Matcher:
+            return [matcher_i._key]
+        elif type(matcher_i) is SetMatcher:
+            return sorted(matcher_i._values)
+        return None
+
+    def winnow(self, header, parameters):
+        """Based on the parkey values in `header`,  winnow out match tuples which
+        cannot possibly match,  weighting each survivor by the negative count of
+        its exact matches.
+
+        Returns ( { match_tuple : weight, ... }, [ surviving match_tuples in selector order ] )
+        or None if `header` has values which cannot be indexed.
+        """
+        survivors = self._all
+        matched = []
+        for i, parkey in enumerate(parameters):
+            value = header.get(parkey, "UNDEFINED")
+            if not isinstance(value, str):
+                return None
+            log.verbose("Binding", repr(parkey), "=", repr(value), verbosity=60)
+            if value == "N/A":   # every Matcher returns 0,  don't care,  for N/A
+                continue
+            column = self._columns[i]
+            if value == "*":
+                hits = set(column.literal_all | column.wild)
+            else:
+                hits = set(column.literals.get(value, ()))
+                hits |= column.wild
+            dont_care = set(column.na)
+            for match_tuple, matcher_i in column.generic:
+                if match_tuple in survivors:
+                    status = matcher_i.match(value)
+                    if status == 1:
+                        hits.add(match_tuple)
+                    elif status == 0:
+                        dont_care.add(match_tuple)
+            survivors = survivors & (hits | dont_care)
+            matched.append(hits)
+            if not survivors:
+                break
+        survivors = sorted(survivors, key=self._order.__getitem__)
+        weights = { match_tuple : -sum(match_tuple in hits for hits in matched) for match_tuple in survivors }
+        return weights, survivors
+
+# ==============================================================================
+
 class MatchSelection(Selection):
     """
     MatchSelection's are an atypical Selection consisting of multiple keys
@@ -1823,6 +2028,7 @@ Restore original debug behavior:
     def __init__(self, parameters, selections, rmap_header={}):
         super(MatchSelector, self).__init__(parameters, selections, rmap_header)
         self._match_selections = self.get_matcher_selections(dict_wo_dups(self._selections))
+        self._match_index = MatchIndex(self._parameters, self._match_selections)
         self._value_map = self.get_value_map()
 
     def _equal_keys(self, key1, key2):
@@ -1898,7 +2104,7 @@ Restore original debug behavior:
         Successively yield any survivors,  in the order of most specific
         matching value (fewest *'s) to least specific matching value.
         """
-        weights, remaining = self._winnow(header, dict(self._match_selections))
+        weights, remaining = self._indexed_winnow(header)
 
         sorted_candidates = self._rank_candidates(weights, remaining)
 
@@ -1919,6 +2125,21 @@ Restore original debug behavior:
             yield MatchSelection((match_tuples, selector))
         raise MatchingError("No match found.")
 
+    def _indexed_winnow(self, header):
+        """Winnow self._match_selections based on `header` using the precompiled
+        MatchIndex,  falling back to the exhaustive _winnow() for headers the index
+        cannot handle or selectors unpickled from versions which predate the index.
+
+        returns   ( {match_tuple:weight ...},   remaining_selections )
+        """
+        index = getattr(self, "_match_index", None)
+        winnowed = index.winnow(header, self._parameters) if index is not None else None
+        if winnowed is None:
+            return self._winnow(header, dict(self._match_selections))
+        weights, survivors = winnowed
+        remaining = { match_tuple : self._match_selections[match_tuple] for match_tuple in survivors }
+        return weights, remaining
+
     def _winnow(self, header, remaining):
         """Based on the parkey values in `header`, winnow out selections
         from `remaining` which cannot possibly match.  For each surviving
@@ -2169,29 +2390,78 @@ Restore debug configuration.
     """
     error_class = UseAfterError
 
+    def __init__(self, *args, **keys):
+        super(UseAfterSelector, self).__init__(*args, **keys)
+        self._index_keys()
+
+    def _index_keys(self):
+        """Precompute the sorted list of selection keys searched by bsearch()."""
+        self._keys = [selection.key for selection in self._selections]
+
+    def __setstate__(self, state):
+        """Restore a pickled selector,  indexing its keys if it was pickled by a
+        version of CRDS which predates the precomputed keys.
+
+        >>> import pickle
+        >>> u = UseAfterSelector(("DATE-OBS", "TIME-OBS"), {'2003-09-26 01:28:00':'nal1503ij_bia.fits'})
+        >>> del u._keys
+        >>> pickle.loads(pickle.dumps(u)).choose({"DATE-OBS":"2004-01-01", "TIME-OBS":"00:00:00"})
+        'nal1503ij_bia.fits'
+
+        >>> t = ClosestTimeSelector(("time",), {'2017-04-24 00:00:00':'cref_flatfield_123.fits'})
+        >>> del t._keys, t._times
+        >>> pickle.loads(pickle.dumps(t)).choose({"time":"2018-02-02 00:00:00"})
+        'cref_flatfield_123.fits'
+        """
+        self.__dict__.update(state)
+        if "_keys" not in state:
+            self._index_keys()
+
+    def delete(self, terminal):
+        """Remove all instances of `terminal` from `self`,  re-indexing the remaining keys."""
+        deleted = super(UseAfterSelector, self).delete(terminal)
+        self._index_keys()
+        return deleted
+
     def get_selection(self, date):
         log.verbose("Matching", date, " ", verbosity=60)
         yield self.bsearch(date, self._selections)
 
     def bsearch(self, date, selections):
-        """Do a binary search over a sorted selections list."""
-        if len(selections) == 0:
+        """Do a binary search over a sorted selections list,  returning the
+        selection with the greatest key <= `date`.   The search is done on the
+        keys precomputed for self._selections,  other `selections` are indexed
+        as needed.
+        """
+        keys = self._keys if selections is self._selections else [selection.key for selection in selections]
+        index = bisect.bisect_right(keys, date) - 1
+        if index < 0:
             raise self.error_class("No selection <= " + repr(date))
-        elif len(selections) > 1:
-            left = selections[:len(selections)//2]
-            right = selections[len(selections)//2:]
-            compared = right[0].key
-            log.verbose("...against", compared, end="", verbosity=60)
-            if date >= compared:
-                return self.bsearch(date, right)
-            else:
-                return self.bsearch(date, left)
+        log.verbose("matched", repr(selections[index]), verbosity=60)
+        return selections[index]
+
+    def bsearch_batch(self, dates):
+        """Return an array of the indices in self._selections chosen for each
+        lookup key in `dates`,  -1 where no selection is <= the date.  Lookup
+        keys must be conditioned as returned by _validate_header().
+
+        >>> u = UseAfterSelector(("DATE-OBS", "TIME-OBS"), {
+        ...        '2003-09-26 01:28:00':'nal1503ij_bia.fits',
+        ...        '2004-02-14 00:00:00':'o3913216j_bia.fits',
+        ... })
+        >>> u.bsearch_batch(['2000-01-01 00:00:00', '2003-09-26 01:28:00', '2004-02-13 23:59:59.5', '2010-01-01 00:00:00']).tolist()
+        [-1, 0, 0, 1]
+
+        >>> v = VersionAfterSelector(("CAL_VER",), {'0.0.2':'test_0.json', '5.2':'test_2.json', '50.1':'test_3.json'})
+        >>> v.bsearch_batch([(0, 0, 1), (5, 2, 0), (49, 1, 0), (100, 0, 0)]).tolist()
+        [-1, 1, 1, 2]
+        """
+        import numpy as np
+        if all(isinstance(key, str) for key in self._keys):
+            indices = np.searchsorted(np.array(self._keys, dtype=str), np.array(dates, dtype=str), side="right")
         else:
-            if date >= selections[0].key:
-                log.verbose("matched", repr(selections[0]), verbosity=60)
-                return selections[0]
-            else:
-                raise self.error_class("No selection <= " + repr(date))
+            indices = np.array([bisect.bisect_right(self._keys, date) for date in dates], dtype=np.int64)
+        return indices - 1
 
     def _validate_raw_key(self, key, valid_values_map):
         """Validate a selector date/time field for this UseAfter."""
@@ -2453,9 +2723,23 @@ class ClosestTimeSelector(UseAfterSelector):
     >>> t.choose({"time":"2019-04-16 00:00:00"})
     'cref_flatfield_123.fits'
     """
+    def _index_keys(self):
+        """Precompute the selection keys,  deferring their conversion to times until lookup."""
+        super(ClosestTimeSelector, self)._index_keys()
+        self._times = None
+
+    def _key_times(self):
+        """Return the selection keys as integer microseconds since the epoch,
+        parsing them only once.
+        """
+        if self._times is None:
+            self._times = [timestamp_microseconds(key) for key in self._keys]
+        return self._times
+
     def get_selection(self, date):
         import numpy as np
-        diff = np.array([abs_time_delta(date, key) for key in self.keys()], 'f')
+        time = timestamp_microseconds(date)
+        diff = np.array([abs(key_time - time) / 1000000 for key_time in self._key_times()], 'f')
         index = np.argmin(diff)
         yield self._selections[index]
 
@@ -2877,6 +3161,19 @@ def abs_time_delta(time1, time2):
     date2 = timestamp.parse_date(time2)
     return abs((date1-date2).total_seconds())
 
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def timestamp_microseconds(time):
+    """Return date/time string `time` as integer microseconds since the epoch.
+
+    >>> timestamp_microseconds("1970-01-02 00:00:00.5")
+    86400500000
+    >>> delta = timestamp_microseconds("2017-04-24 00:00:00") - timestamp_microseconds("2016-05-05 00:00:00")
+    >>> delta / 1000000 == abs_time_delta("2017-04-24 00:00:00", "2016-05-05 00:00:00")
+    True
+    """
+    return (timestamp.parse_date(time) - EPOCH) // datetime.timedelta(microseconds=1)
+
 # ==============================================================================
 
 class Parameters:
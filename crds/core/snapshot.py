@@ -0,0 +1,202 @@
+"""This module implements CRDS context snapshots,  a versioned binary container
+for a whole context which is an alternative to pickling the context as a single
+object graph.
+
+A snapshot stores every mapping of a context as an independent record with its
+own sha1sum.   Loading a snapshot only unpacks the root mapping;  each nested
+.imap or .rmap is unpacked,  checked,  and recompiled the first time it is
+accessed,  so a pipeline worker which only needs one instrument does not pay to
+rebuild the entire context.   Instrument contexts carry their recorded required
+parkeys so that minimizing a header does not load every .rmap of the instrument.
+
+Layout::
+
+    MAGIC (8 bytes)
+    version (uint32, big endian)
+    index length (uint32, big endian)
+    index sha1 digest (20 bytes)
+    index (JSON:  {"root": name, "members": {name: [offset, length, sha1sum]}})
+    member records (pickled mappings with unloaded selections)
+
+Member offsets are relative to the first byte after the index.
+
+To compare snapshot and pickle load times for a context::
+
+    $ python -m crds.core.snapshot hst_0001.pmap
+"""
+import copy
+import hashlib
+import json
+import os
+import pickle
+import struct
+import sys
+import time
+
+from . import rmap, log, exceptions
+
+# ============================================================================
+
+MAGIC = b"CRDSSNAP"
+
+SNAPSHOT_VERSION = 1
+
+_PREFIX = struct.Struct(">8sII20s")
+
+# ============================================================================
+
+def is_snapshot(contents):
+    """Return True IFF bytes `contents` are a CRDS context snapshot.
+
+    >>> is_snapshot(MAGIC + b"whatever")
+    True
+    >>> is_snapshot(pickle.dumps("hst.pmap"))
+    False
+    """
+    return contents[:len(MAGIC)] == MAGIC
+
+def dumps(mapping):
+    """Return the bytes of a snapshot of `mapping` and all its loaded descendants.
+    The caller should force_load() `mapping` first to snapshot the complete context.
+    """
+    records = {}
+    _add_records(mapping, records)
+    members, blobs, offset = {}, [], 0
+    for name, blob in records.items():
+        members[name] = [offset, len(blob), hashlib.sha1(blob).hexdigest()]
+        blobs.append(blob)
+        offset += len(blob)
+    index = json.dumps(dict(root=_member_name(mapping), members=members)).encode("utf-8")
+    prefix = _PREFIX.pack(MAGIC, SNAPSHOT_VERSION, len(index), hashlib.sha1(index).digest())
+    return b"".join([prefix, index] + blobs)
+
+def _member_name(mapping):
+    """Return the name under which `mapping` is recorded in a snapshot."""
+    return mapping.basename
+
+def _add_records(mapping, records):
+    """Add pickled records for `mapping` and its loaded descendants to dict `records`."""
+    name = _member_name(mapping)
+    if name in records:
+        return
+    if isinstance(mapping, rmap.InstrumentContext):
+        mapping.record_required_parkeys()
+    if isinstance(mapping, rmap.ContextMapping):
+        member = copy.copy(mapping)
+        member.selections = mapping.selections.unloaded()
+        records[name] = pickle.dumps(member, protocol=pickle.HIGHEST_PROTOCOL)
+        for child in mapping.selections.normal_values():
+            _add_records(child, records)
+    else:
+        records[name] = pickle.dumps(mapping, protocol=pickle.HIGHEST_PROTOCOL)
+
+def loads(contents):
+    """Return the root mapping of snapshot bytes `contents`.  Nested mappings
+    are materialized from `contents` on demand.
+    """
+    return SnapshotReader(contents).load_root()
+
+# ============================================================================
+
+class SnapshotReader:
+    """Demand loader for the mappings stored in one context snapshot."""
+
+    def __init__(self, contents):
+        if len(contents) < _PREFIX.size or not is_snapshot(contents):
+            raise exceptions.CrdsError("Not a CRDS context snapshot.")
+        _magic, version, index_len, index_sha1 = _PREFIX.unpack_from(contents)
+        if version != SNAPSHOT_VERSION:
+            raise exceptions.CrdsError(
+                "Unsupported CRDS context snapshot version", repr(version),
+                "expected", repr(SNAPSHOT_VERSION))
+        index = contents[_PREFIX.size : _PREFIX.size + index_len]
+        if hashlib.sha1(index).digest() != index_sha1:
+            raise exceptions.ChecksumError("CRDS context snapshot index is corrupt.")
+        index = json.loads(index.decode("utf-8"))
+        self.contents = contents
+        self.data_offset = _PREFIX.size + index_len
+        self.root = index["root"]
+        self.members = index["members"]
+
+    def load_root(self):
+        """Materialize and return the root mapping of the snapshot."""
+        return self.load_member(self.root)
+
+    def load_member(self, name, **keys):
+        """Materialize mapping `name` from the snapshot.   Used as the loader of
+        context selections,  so mappings which are not in the snapshot or whose
+        records are corrupt are loaded normally instead.
+        """
+        keys.pop("loader", None)
+        try:
+            mapping = self._unpack(os.path.basename(name))
+        except Exception as exc:
+            log.verbose_warning("Loading", repr(name), "from mapping file,  not snapshot:", str(exc))
+            return rmap.get_cached_mapping(name, **keys)
+        if isinstance(mapping, rmap.ContextMapping):
+            mapping.selections = mapping.selections.unloaded(loader=self.load_member)
+        return mapping
+
+    def _unpack(self, name):
+        """Verify and unpickle the record for mapping `name`."""
+        if name not in self.members:
+            raise exceptions.CrdsError("Mapping " + repr(name) + " is not in snapshot.")
+        offset, length, sha1sum = self.members[name]
+        start = self.data_offset + offset
+        blob = self.contents[start : start + length]
+        if hashlib.sha1(blob).hexdigest() != sha1sum:
+            raise exceptions.ChecksumError("Snapshot record for " + repr(name) + " is corrupt.")
+        return pickle.loads(blob)
+
+# ============================================================================
+
+def benchmark(context, instrument=None, repeats=5):
+    """Compare load times of the pickle and snapshot forms of `context`,  returning
+    a dict of best-of-`repeats` seconds per phase.   `instrument` names the one
+    instrument a worker touches after loading,  defaulting to the first.
+    """
+    loaded = rmap.load_mapping(context)
+    loaded.force_load()
+    if instrument is None:
+        instrument = loaded.selections.normal_keys()[0]
+    formats = dict(pickle=(pickle.dumps(loaded), pickle.loads), snapshot=(dumps(loaded), loads))
+    results = {}
+    for name, (contents, loader) in formats.items():
+        results[name + "_bytes"] = len(contents)
+        results[name + "_load"] = _best_time(lambda: loader(contents), repeats)
+        results[name + "_load_instrument"] = _best_time(
+            lambda: loader(contents).get_imap(instrument).force_load(), repeats)
+        results[name + "_load_all"] = _best_time(lambda: loader(contents).force_load(), repeats)
+    return results
+
+def _best_time(func, repeats):
+    """Return the minimum elapsed seconds of `repeats` calls to `func`."""
+    best = None
+    for _i in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    """Benchmark the contexts named on the command line,  or run doctests if there are none."""
+    if len(sys.argv) < 2:
+        print(test())
+        return
+    for context in sys.argv[1:]:
+        results = benchmark(context)
+        print(context)
+        for key, value in results.items():
+            print("    {:<28s} {}".format(key, value))
+
+# ============================================================================
+
+def test():
+    """Run module doctests."""
+    import doctest
+    from crds.core import snapshot
+    return doctest.testmod(snapshot)
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import re
 import hashlib
 import io
 import functools
+import itertools
 from collections import Counter, defaultdict
 import datetime
 import ast
@@ -110,6 +111,22 @@ def flatten(sequence):
         flattened.extend(elem)
     return flattened
 
+def chunked(iterable, size):
+    """Yield successive lists of up to `size` items from `iterable`,  consuming
+    only one chunk of `iterable` at a time.
+
+    >>> list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    >>> list(chunked([], 2))
+    []
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 # ===================================================================
 
 def traced(func):
@@ -594,7 +611,10 @@ def create_path(path, mode=DEFAULT_DIR_PERMS):
         subdir = os.path.abspath(os.path.join(*current))
         if not os.path.exists(subdir):
             log.verbose("Creating", repr(subdir), "with permissions %o" % mode)
-            os.mkdir(subdir, mode)
+            try:
+                os.mkdir(subdir, mode)
+            except FileExistsError:   # created concurrently
+                continue
             with log.verbose_warning_on_exception(
                     "Failed chmod'ing new directory", repr(subdir), "to %o." % mode):
                 os.chmod(subdir, mode)
@@ -915,6 +935,31 @@ def condition_header(header, needed_keys=None):
     conditioned = { key:condition_value(header[key]) for key in needed_keys }
     return conditioned
 
+def condition_headers(headers):
+    """Return a list of conditioned copies of each header in `headers`,
+    equivalent to calling condition_header() on each,  but conditioning each
+    distinct value of each column only once.   Large batches of dataset
+    headers tend to repeat the same few values in most columns.
+
+    >>> condition_headers([{'detector': 'wfc', 'ccdgain': 1}, {'DETECTOR': 'WFC', 'CCDGAIN': True}])
+    [{'DETECTOR': 'WFC', 'CCDGAIN': '1.0'}, {'DETECTOR': 'WFC', 'CCDGAIN': 'T'}]
+    """
+    columns = {}
+    conditioned = []
+    for header in headers:
+        result = {}
+        for key, value in header.items():
+            key = key.upper()
+            column = columns.setdefault(key, {})
+            try:
+                result[key] = column[(type(value), value)]
+            except KeyError:
+                result[key] = column[(type(value), value)] = condition_value(value)
+            except TypeError:   # unhashable value
+                result[key] = condition_value(value)
+        conditioned.append(result)
+    return conditioned
+
 def _eval_keys(keys):
     """Return the replacement mapping from rmap-visible parkeys to eval-able keys.
 
@@ -1,14 +1,19 @@
 """This module defines limited facilities for extracting information from
 reference and datasets,  generally in the form of header dictionaries.
 """
-from crds.core  import utils, log
+import os.path
+import glob
+from concurrent import futures
+
+from crds.core  import utils, log, config, exceptions
 
 # =============================================================================
 
 from crds.io.abstract import hijack_warnings, convert_to_eval_header, ensure_keys_defined
 from crds.io.factory import file_factory, get_observatory, get_filetype, is_dataset
 from crds.io.geis import is_geis, is_geis_data, is_geis_header, get_conjugate
-from crds.io.fits import fits_open, fits_open_trapped, get_fits_header_union
+from crds.io.fits import fits_open, fits_open_trapped, get_fits_header_union, FitsFile, scan_fits_header
+from crds.io import header_cache
 
 # import asdf
 # import yaml
@@ -61,9 +66,85 @@ def get_free_header(filepath, needed_keys=(), original_name=None, observatory=No
 
     Since get_free_header() is cached,  loading file updates requires first
     clearing the function cache.
+
+    When CRDS_CACHE_FILE_HEADERS is True headers are also kept in the persistent
+    header_cache,  except for headers which logged errors or warnings.
+    """
+    header = header_cache.load_header(filepath, needed_keys, original_name, observatory)
+    if header is None:
+        problems = log.errors(), log.warnings()
+        file_obj = file_factory(filepath, original_name, observatory)
+        header = file_obj.get_header(needed_keys, checksum=False)
+        if (log.errors(), log.warnings()) == problems:   # reread and re-report problem headers
+            header_cache.save_header(filepath, header, needed_keys, original_name, observatory)
+    log.verbose("Header of", repr(filepath), "=", log.PP(header), verbosity=90)
+    return header
+
+def get_free_headers(filepaths, needed_keys=(), observatory=None, threads=None):
+    """Return { filepath : header } for `filepaths`,  a list of files or a directory
+    of .fits files,  where each header is what get_free_header() returns for it.
+
+    FITS headers are read concurrently by scan_raw_headers().   Other files,  and
+    FITS files the scanner cannot read,  are loaded one at a time with
+    get_free_header().   Files which cannot be loaded are omitted after a verbose
+    warning.
+
+    >>> headers = get_free_headers(["data/y951738kl_hv.fits", "data/j8btxxx_raw_bad.fits"], ("DETECTOR",))
+    >>> headers["data/y951738kl_hv.fits"]["DETECTOR"]
+    'FUV'
+    >>> headers == {path : get_free_header(path, ("DETECTOR",), None, None) for path in headers}
+    True
+    """
+    if isinstance(filepaths, str):
+        filepaths = sorted(glob.glob(os.path.join(filepaths, "*.fits")))
+    needed_keys = tuple(needed_keys)
+    raw_headers = scan_raw_headers(filepaths, needed_keys, threads, observatory)
+    headers = {}
+    for path in filepaths:
+        with log.verbose_warning_on_exception("Failed loading header of", repr(path)):
+            if path in raw_headers:
+                headers[path] = header_from_raw(path, raw_headers[path], needed_keys, observatory)
+            else:
+                headers[path] = get_free_header(path, needed_keys, None, observatory)
+    return headers
+
+def scan_raw_headers(filepaths, needed_keys=(), threads=None, observatory=None):
+    """Return { filepath : raw_header } for the FITS files in `filepaths` which
+    scan_fits_header() can read,  scanning them with `threads` threads,
+    nominally CRDS_FITS_HEADER_THREADS.   Files with headers in the persistent
+    header cache are skipped.   Returns {} when CRDS_SCAN_FITS_HEADERS is False.
+    """
+    if not config.SCAN_FITS_HEADERS:
+        return {}
+    if threads is None:
+        threads = config.FITS_HEADER_THREADS.get()
+    scanned = [path for path in filepaths
+               if not header_cache.is_cached(path, needed_keys, None, observatory)]
+    with futures.ThreadPoolExecutor(max(threads, 1)) as executor:
+        jobs = executor.map(_scan_raw_header, scanned, [needed_keys] * len(scanned))
+        return {path : raw_header for (path, raw_header) in zip(scanned, jobs)
+                if raw_header is not None}
+
+def _scan_raw_header(filepath, needed_keys):
+    """Return the raw header of FITS `filepath` read by scan_fits_header(),  or
+    None if it is not FITS,  cannot be typed or opened,  or must be read with
+    astropy.   Errors for such files are left to the normal per-file header read.
+    """
+    try:
+        if get_filetype(filepath) != "fits":
+            return None
+        return scan_fits_header(filepath, needed_keys)
+    except (exceptions.FitsScanError, OSError, ValueError):
+        return None
+
+def header_from_raw(filepath, raw_header, needed_keys=(), observatory=None):
+    """Return the header get_free_header() returns for FITS `filepath` given the
+    `raw_header` returned by scan_raw_headers().
     """
-    file_obj = file_factory(filepath, original_name, observatory)
-    header = file_obj.get_header(needed_keys, checksum=False)
+    problems = log.errors(), log.warnings()
+    header = FitsFile(filepath, None, observatory).header_from_raw(raw_header, needed_keys)
+    if (log.errors(), log.warnings()) == problems:
+        header_cache.save_header(filepath, header, needed_keys, None, observatory)
     log.verbose("Header of", repr(filepath), "=", log.PP(header), verbosity=90)
     return header
 
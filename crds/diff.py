@@ -17,7 +17,7 @@ import re
 # ============================================================================
 
 import crds
-from crds.core import config, log, pysh, utils, rmap
+from crds.core import config, log, pysh, utils, rmap, selectors
 from crds.core import cmdline, naming
 from crds import rowdiff, sync
 
@@ -287,6 +287,45 @@ class MappingDifferencer(Differencer):
                         instrs[instrument].add(filekind)
         return { key:list(val) for (key, val) in instrs.items() }
 
+    def get_affected_regions(self):
+        """Examine the diffs between `old_pmap` and `new_pmap` and return the changed
+        regions of each affected type.
+
+        Returns { affected_instrument : { affected_type : AffectedRegion or None, ... } }
+
+        where None means every dataset of the type may be affected.
+        """
+        affected = self.get_affected()
+        regions = { instrument : { filekind : None for filekind in filekinds }
+                    for (instrument, filekinds) in affected.items() }
+        rmap_diffs, whole_types = defaultdict(list), set()
+        for diff in remove_boring(self.mapping_diffs()):
+            lowest = simplify_to_lowest_mapping(diff)
+            pair = lowest[0]
+            old, new = diff_replace_old_new(lowest)
+            if old and new and config.is_mapping(old) and config.is_mapping(new):
+                continue   # nested mapping replacements are described by their own diffs
+            if len(pair) == 2 and all(name.endswith(".rmap") for name in pair):
+                rmap_diffs[pair].append(lowest)
+            elif len(pair) == 2 and pair[1].endswith(".imap") and len(lowest) == 3 and len(lowest[1]) == 1:
+                # added, deleted, or special valued rmaps are whole types
+                instrument = utils.get_file_properties(self.observatory, pair[1])[0]
+                whole_types.add((instrument, lowest[1][0]))
+            else:   # context header changes
+                return regions
+        for (old_name, new_name), diffs in rmap_diffs.items():
+            with log.verbose_warning_on_exception("Failed determining changed regions for",
+                                                  repr(old_name), "-->", repr(new_name)):
+                old_rmap = rmap.fetch_mapping(
+                    self.locate_file1(old_name), ignore_checksum=True, path=self.mappings_cache1)
+                new_rmap = rmap.fetch_mapping(
+                    self.locate_file2(new_name), ignore_checksum=True, path=self.mappings_cache2)
+                if (new_rmap.filekind in regions.get(new_rmap.instrument, {}) and
+                        (new_rmap.instrument, new_rmap.filekind) not in whole_types):
+                    regions[new_rmap.instrument][new_rmap.filekind] = AffectedRegion.from_diffs(
+                        old_rmap, new_rmap, diffs)
+        return regions
+
     def header_modified(self):
         """Return true IFF there were changes in an rmap header."""
         return self._find_diff_str("header")
@@ -573,6 +612,145 @@ def affected_mode(diff, excluded_parameters=DEFAULT_EXCLUDED_PARAMETERS):
         affected = [("INSTRUMENT", instrument.upper())] + affected
     return tuple(affected)
 
+class AffectedRegion:
+    """The parameter space of one rmap changed between two contexts,  defined as
+    a MatchSelector of only the changed match cases.   The choice of each case is
+    the earliest changed UseAfter date nested under it,  or '' if any date may be
+    affected.   Rmaps with no match cases have a single earliest changed date.
+
+    Only datasets contained by the region can have different bestrefs for the
+    type under the old and new rmaps.
+
+    >>> old_rmap = rmap.ReferenceMapping.from_string(AFFECTED_RMAP_OLD, ignore_checksum=True)
+    >>> new_rmap = rmap.ReferenceMapping.from_string(AFFECTED_RMAP_NEW, ignore_checksum=True)
+    >>> region = AffectedRegion.from_diffs(old_rmap, new_rmap, old_rmap.difference(new_rmap))
+    >>> region.selector.choices()
+    ['2005-01-01 00:00:00']
+
+    >>> header = {"DETECTOR": "HRC", "DATE-OBS": "2006-01-01", "TIME-OBS": "00:00:00"}
+    >>> region.contains(header, header)
+    True
+    >>> region.contains(dict(header, DETECTOR="WFC"), dict(header, DETECTOR="WFC"))
+    False
+    >>> region.contains(dict(header, **{"DATE-OBS": "2004-01-01"}), dict(header, **{"DATE-OBS": "2004-01-01"}))
+    False
+
+    Differences which are not rule changes,  e.g. a modified relevance expression,
+    affect the entire type:
+
+    >>> header_diff = rmap.ReferenceMapping.from_string(AFFECTED_RMAP_OLD.replace("'NO'", "'YES'"), ignore_checksum=True)
+    >>> AffectedRegion.from_diffs(old_rmap, header_diff, old_rmap.difference(header_diff, include_header_diffs=True)) is None
+    True
+    """
+
+    def __init__(self, old_rmap, new_rmap, selector, date_parameters, bound=None):
+        self.old_rmap = old_rmap
+        self.new_rmap = new_rmap
+        self.selector = selector
+        self.date_parameters = date_parameters
+        self.bound = bound
+
+    @classmethod
+    def from_diffs(cls, old_rmap, new_rmap, diffs):
+        """Return the AffectedRegion of `diffs` between `old_rmap` and `new_rmap`,  or None
+        if some difference cannot be localized to match cases or dates.
+        """
+        old_sel, new_sel = old_rmap.selector, new_rmap.selector
+        if type(old_sel) is not type(new_sel) or old_sel._parameters != new_sel._parameters:
+            return None
+        if any("header" in diff_action(diff) or len(diff) < 3 for diff in diffs):
+            return None
+        if type(new_sel) is selectors.UseAfterSelector:
+            bound = min(_useafter_bound(diff[1], old_sel, new_sel) for diff in diffs)
+            return cls(old_rmap, new_rmap, None, new_sel._parameters, bound)
+        if type(new_sel) is not selectors.MatchSelector:
+            return None
+        raw_keys = {}
+        for sel in (old_sel, new_sel):
+            for key, choice in sel._raw_selections:
+                raw_keys.setdefault(sel._diff_key(key), []).append((key, choice))
+        cases, date_parameters = {}, ()
+        for diff in diffs:
+            if diff[1] not in raw_keys:
+                return None
+            for key, choice in raw_keys[diff[1]]:
+                bound = ""
+                if len(diff) == 4 and type(choice) is selectors.UseAfterSelector:
+                    date_parameters = choice._parameters
+                    nested = [nested for (_match, nested) in raw_keys[diff[1]]]
+                    bound = _useafter_bound(diff[2], *nested)
+                cases[key] = min(cases.get(key, bound), bound)
+        try:
+            selector = selectors.MatchSelector(new_sel._parameters, cases, new_sel._rmap_header)
+        except Exception as exc:
+            log.verbose("Changed match cases of", repr(new_rmap.basename), "cannot be indexed:", str(exc))
+            return None
+        return cls(old_rmap, new_rmap, selector, date_parameters)
+
+    def contains(self, old_header, new_header):
+        """Return True IFF the lookup of minimized header `old_header` under the old rmap or
+        `new_header` under the new rmap can select a changed match case or date.
+        """
+        try:
+            headers = self.old_rmap.get_selection_headers(old_header) + \
+                self.new_rmap.get_selection_headers(new_header)
+            return any(self._contains(header) for header in headers)
+        except Exception as exc:
+            log.verbose("Assuming affected,  failed checking changed region of",
+                        repr(self.new_rmap.basename), ":", str(exc), verbosity=60)
+            return True
+
+    def _contains(self, header):
+        """Return True IFF selection `header` falls inside this region."""
+        if self.selector is None:
+            return self._after(header, self.bound)
+        _weights, remaining = self.selector._indexed_winnow(header)
+        return any(self._after(header, selection.choice) for selection in remaining.values())
+
+    def _after(self, header, bound):
+        """Return True IFF the UseAfter date of `header` is on or after `bound`."""
+        if not bound:
+            return True
+        useafter = selectors.UseAfterSelector(self.date_parameters, {})
+        return useafter._validate_header(header) >= bound
+
+def _useafter_bound(diff_key, *useafters):
+    """Return the raw date of the UseAfter case `diff_key` in any of `useafters`,  or ''
+    if it cannot be determined.
+    """
+    for useafter in useafters:
+        if isinstance(useafter, selectors.UseAfterSelector):
+            for key in useafter.raw_keys():
+                if useafter._diff_key(key) == diff_key:
+                    return key
+    return ""
+
+AFFECTED_RMAP_OLD = """
+header = {
+    'derived_from' : 'generated',
+    'filekind' : 'DARKFILE',
+    'instrument' : 'ACS',
+    'mapping' : 'REFERENCE',
+    'name' : 'hst_acs_darkfile_old.rmap',
+    'observatory' : 'HST',
+    'parkey' : (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')),
+    'reffile_required' : 'NO',
+    'sha1sum' : 'none',
+}
+
+selector = Match({
+    ('HRC',) : UseAfter({
+        '1992-01-01 00:00:00' : 'hrc_1_drk.fits',
+        '2005-01-01 00:00:00' : 'hrc_2_drk.fits',
+    }),
+    ('WFC',) : UseAfter({
+        '1992-01-01 00:00:00' : 'wfc_1_drk.fits',
+    }),
+})
+"""
+
+AFFECTED_RMAP_NEW = AFFECTED_RMAP_OLD.replace("hrc_2_drk.fits", "hrc_3_drk.fits")
+
 def format_affected_mode(mode):
     """Format an affected mode as a string."""
     return " ".join(["=".join([item[0], repr(item[1])]) for item in mode])
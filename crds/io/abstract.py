@@ -250,6 +250,12 @@ class AbstractFile:
          dictionary featuring keywords `needed_keys`.
          """
         raw_header = self.get_raw_header(needed_keys, **keys)
+        return self.header_from_raw(raw_header, needed_keys)
+
+    def header_from_raw(self, raw_header, needed_keys=()):
+        """Return the header dictionary get_header() defines for `raw_header`,
+        the result of get_raw_header(needed_keys).
+        """
         reduced_header = self._reduce_header(raw_header, needed_keys)
         crossed_header = cross_strap_header(reduced_header)
         crossed_header["FILE_FORMAT"] = \
@@ -18,7 +18,7 @@ import numpy as np
 
 # ============================================================================
 
-from crds.core import config, utils, log
+from crds.core import config, utils, log, exceptions
 
 from .abstract import AbstractFile, hijack_warnings
 
@@ -69,6 +69,118 @@ def get_fits_header_union(filepath, needed_keys=(), original_name=None, observat
 
 # ============================================================================
 
+# The fast header scanner reads FITS headers directly from their 2880 byte blocks,
+# skipping data,  and only accepts cards whose values it can convert exactly as
+# astropy does.   Anything else raises FitsScanError so the file is read with
+# astropy instead.
+
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+
+COMMENTARY_KEYS = ("COMMENT", "HISTORY")
+
+KEYWORD_RE = re.compile(r"^[A-Z0-9_-]*$")
+
+VALUE_RE = re.compile(r"""^[ ]*(?:
+    '(?P<string>(?:[^']|'')*)'
+   |(?P<bool>[TF])
+   |(?P<int>[-+]?\d+)
+   |(?P<float>[-+]?(?:\.\d+|\d+(?:\.\d*)?)(?:[DE][-+]?\d+)?)
+)[ ]*(?:/.*)?$""", re.VERBOSE)
+
+def scan_fits_header(filepath, needed_keys=()):
+    """Return the (keyword, value) cards of all HDU headers of FITS file
+    `filepath` as get_raw_header() does,  limited to `needed_keys` if specified.
+    Only the header blocks are read.
+
+    >>> import os.path
+    >>> path = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "y951738kl_hv.fits")
+    >>> scan_fits_header(path, ["EXTNAME", "DETECTOR", "TFIELDS"])
+    [('DETECTOR', 'FUV'), ('TFIELDS', '2'), ('EXTNAME', 'FUVA'), ('TFIELDS', '2'), ('EXTNAME', 'FUVB')]
+    >>> scan_fits_header(path) == FitsFile(path).get_raw_header(checksum=False)
+    True
+    """
+    needed_keys = {key.upper() for key in needed_keys}
+    union = []
+    with open(filepath, "rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        offset = 0
+        while offset < size:
+            handle.seek(offset)
+            cards, nblocks = _scan_hdu_header(handle, primary=(offset == 0))
+            offset += nblocks * BLOCK_SIZE + _data_blocks(cards, primary=(offset == 0)) * BLOCK_SIZE
+            union.extend(card for card in cards if not needed_keys or card[0] in needed_keys)
+    return union
+
+def _scan_hdu_header(handle, primary):
+    """Read the header of the HDU at the current position of `handle` returning
+    ([(keyword, value), ...], number of header blocks).
+    """
+    cards = []
+    nblocks = 0
+    while True:
+        block = handle.read(BLOCK_SIZE)
+        if len(block) != BLOCK_SIZE:
+            raise exceptions.FitsScanError("Missing END or truncated header")
+        if nblocks == 0 and not block.startswith(b"SIMPLE  =" if primary else b"XTENSION="):
+            raise exceptions.FitsScanError("Not a FITS HDU")
+        nblocks += 1
+        try:
+            text = block.decode("ascii")
+        except UnicodeDecodeError as exc:
+            raise exceptions.FitsScanError("Non-ASCII header") from exc
+        for start in range(0, BLOCK_SIZE, CARD_SIZE):
+            card = text[start:start + CARD_SIZE]
+            keyword = card[:8].rstrip()
+            if keyword == "END":
+                if card[8:].strip():
+                    raise exceptions.FitsScanError("Malformed END card")
+                return cards, nblocks
+            if keyword:
+                cards.append(_scan_card(keyword, card))
+
+def _scan_card(keyword, card):
+    """Return the (keyword, str(value)) of FITS header `card`."""
+    if not KEYWORD_RE.match(keyword) or keyword in ("HIERARCH", "CONTINUE"):
+        raise exceptions.FitsScanError("Unsupported keyword", repr(keyword))
+    if keyword in COMMENTARY_KEYS:
+        return keyword, card[8:].rstrip()
+    if card[8:10] != "= ":
+        raise exceptions.FitsScanError("Missing value indicator for", repr(keyword))
+    match = VALUE_RE.match(card[10:])
+    if match is None:
+        raise exceptions.FitsScanError("Unsupported value for", repr(keyword))
+    kind = match.lastgroup
+    value = match.group(kind)
+    if kind == "string":
+        value = value.replace("''", "'").rstrip()
+    elif kind == "bool":
+        value = str(value == "T")
+    elif kind == "int":
+        value = str(int(value))
+    else:
+        value = str(float(value.replace("D", "E")))
+    return keyword, value
+
+def _data_blocks(cards, primary):
+    """Return the number of data blocks following a header with `cards`."""
+    header = dict(reversed(cards))    # first value wins,  as for astropy
+    try:
+        bitpix = int(header["BITPIX"])
+        naxes = [int(header["NAXIS" + str(i)]) for i in range(1, int(header["NAXIS"]) + 1)]
+        pcount = int(header.get("PCOUNT", 0))
+        gcount = int(header.get("GCOUNT", 1))
+    except (KeyError, ValueError) as exc:
+        raise exceptions.FitsScanError("Bad array structure keywords") from exc
+    if primary and naxes and naxes[0] == 0 and header.get("GROUPS") == "True":
+        naxes = naxes[1:]    # random groups
+    elif not naxes:
+        return 0
+    nbytes = abs(bitpix) // 8 * gcount * (pcount + int(np.prod(naxes, dtype=np.int64)))
+    return (nbytes + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+# ============================================================================
+
 class FitsFile(AbstractFile):
 
     format = "FITS"
@@ -157,7 +269,16 @@ class FitsFile(AbstractFile):
         """Get the union of keywords from all header extensions of FITS
         file `fname`.  In the case of collisions, keep the first value
         found as extensions are loaded in numerical order.
+
+        Unless checksums are verified,  headers are read by scan_fits_header()
+        when CRDS_SCAN_FITS_HEADERS is True,  falling back to astropy for
+        files the scanner cannot read.
         """
+        if config.SCAN_FITS_HEADERS and keys == {"checksum": False}:
+            try:
+                return scan_fits_header(self.filepath, needed_keys)
+            except exceptions.FitsScanError as exc:
+                log.verbose("Reading", repr(self.filepath), "with astropy:", str(exc), verbosity=70)
         union = []
         with fits_open(self.filepath, **keys) as hdulist:
             for hdu in hdulist:
@@ -0,0 +1,203 @@
+"""This module defines a persistent cache of file headers,  stored in an SQLite
+database in the CRDS cache,  which lets repeated runs over the same staged
+datasets skip reading their headers.
+
+Headers are keyed on the identity of the file they came from,  its absolute
+path,  size,  modification time,  and inode,  as well as the parameters of the
+header request and the CRDS version,  so any change to a file or to CRDS
+misses the cache rather than returning a stale header.   The total size of the
+cached headers is bounded by CRDS_HEADER_CACHE_BYTES by dropping the least
+recently used headers.
+
+The cache is used only when CRDS_CACHE_FILE_HEADERS is True and is not
+updated when the CRDS cache is readonly.   Headers which do not survive a
+round trip through JSON,  e.g. ASDF headers with tuple values,  are not cached.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+from crds.core import config, log
+
+# ===================================================================
+
+DATABASE_NAME = "headers.sqlite"
+
+# Fraction of CRDS_HEADER_CACHE_BYTES kept when the cache is trimmed.
+TRIM_FRACTION = 0.9
+
+_DATABASE = None    # (pid, path, connection, total bytes) of the open database
+
+# ===================================================================
+
+def load_header(filepath, needed_keys=(), original_name=None, observatory=None):
+    """Return the cached header of `filepath` or None if it is not cached.
+
+    >>> import tempfile
+    >>> old = config.CACHE_FILE_HEADERS.set("1")
+    >>> os.environ["CRDS_HEADERPATH_SINGLE"] = tempfile.mkdtemp()
+    >>> path = os.path.join(os.environ["CRDS_HEADERPATH_SINGLE"], "dataset.fits")
+    >>> with open(path, "w") as handle:
+    ...     _ = handle.write("some data")
+    >>> load_header(path, ("DETECTOR",)) is None
+    True
+    >>> save_header(path, {"DETECTOR": "HRC"}, ("DETECTOR",))
+    >>> load_header(path, ("DETECTOR",))
+    {'DETECTOR': 'HRC'}
+    >>> is_cached(path, ("DETECTOR",)), is_cached(path, ("DETECTOR",), observatory="jwst")
+    (True, False)
+    >>> load_header(path, ("DETECTOR", "FILTER")) is None
+    True
+
+    Changing the file invalidates its headers:
+
+    >>> with open(path, "a") as handle:
+    ...     _ = handle.write("more data")
+    >>> load_header(path, ("DETECTOR",)) is None
+    True
+
+    >>> close()
+    >>> _ = config.CACHE_FILE_HEADERS.set(old)
+    >>> del os.environ["CRDS_HEADERPATH_SINGLE"]
+    """
+    if not config.CACHE_FILE_HEADERS:
+        return None
+    with log.verbose_warning_on_exception("Failed loading cached header of", repr(filepath)):
+        key = header_key(filepath, needed_keys, original_name, observatory)
+        if key is None:
+            return None
+        connection = _connect()
+        row = connection.execute("SELECT header FROM headers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if not config.get_cache_readonly():
+            with connection:
+                connection.execute("UPDATE headers SET used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+    return None
+
+def save_header(filepath, header, needed_keys=(), original_name=None, observatory=None):
+    """Save `header` as the header of `filepath` for the given request parameters."""
+    if not config.CACHE_FILE_HEADERS or config.get_cache_readonly():
+        return
+    with log.verbose_warning_on_exception("Failed saving cached header of", repr(filepath)):
+        key = header_key(filepath, needed_keys, original_name, observatory)
+        if key is None:
+            return
+        blob = json.dumps(header)
+        if json.loads(blob) != header:
+            log.verbose("Not caching header of", repr(filepath), ": not JSON compatible.", verbosity=70)
+            return
+        global _DATABASE
+        connection = _connect()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO headers (key, header, size, used) VALUES (?, ?, ?, ?)",
+                               (key, blob, len(blob), time.time()))
+        pid, path, connection, total = _DATABASE
+        _DATABASE = (pid, path, connection, total + len(blob))
+        if _DATABASE[3] > config.HEADER_CACHE_BYTES.get():
+            trim()
+
+def header_key(filepath, needed_keys=(), original_name=None, observatory=None):
+    """Return the cache key of the header of `filepath` or None if `filepath`
+    is not a regular file.
+    """
+    import crds
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    if not os.path.isfile(filepath):
+        return None
+    ident = json.dumps([crds.__version__, os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns,
+                        stat.st_ino, list(needed_keys), original_name, observatory])
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+def trim(max_bytes=None):
+    """Drop the least recently used headers until the cache holds at most
+    TRIM_FRACTION of `max_bytes`,  nominally CRDS_HEADER_CACHE_BYTES.
+    """
+    global _DATABASE
+    if max_bytes is None:
+        max_bytes = config.HEADER_CACHE_BYTES.get()
+    connection = _connect()
+    with connection:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM headers").fetchone()[0]
+        if total > max_bytes:
+            keep = int(max_bytes * TRIM_FRACTION)
+            dropped = 0
+            for key, size in connection.execute("SELECT key, size FROM headers ORDER BY used").fetchall():
+                if total - dropped <= keep:
+                    break
+                connection.execute("DELETE FROM headers WHERE key = ?", (key,))
+                dropped += size
+            log.verbose("Dropped", dropped, "bytes of least recently used headers from the header cache.",
+                        verbosity=60)
+            total -= dropped
+    pid, path, connection, _total = _DATABASE
+    _DATABASE = (pid, path, connection, total)
+
+def is_cached(filepath, needed_keys=(), original_name=None, observatory=None):
+    """Return True IFF load_header() would return a header for these parameters."""
+    if not config.CACHE_FILE_HEADERS:
+        return False
+    with log.verbose_warning_on_exception("Failed checking cached header of", repr(filepath)):
+        key = header_key(filepath, needed_keys, original_name, observatory)
+        return key is not None and _connect().execute(
+            "SELECT 1 FROM headers WHERE key = ?", (key,)).fetchone() is not None
+    return False
+
+def clear():
+    """Remove all headers from the persistent header cache."""
+    global _DATABASE
+    connection = _connect()
+    with connection:
+        connection.execute("DELETE FROM headers")
+    pid, path, connection, _total = _DATABASE
+    _DATABASE = (pid, path, connection, 0)
+
+def close():
+    """Close the header cache database,  if open."""
+    global _DATABASE
+    if _DATABASE is not None:
+        pid, _path, connection, _total = _DATABASE
+        if pid == os.getpid():
+            connection.close()
+        _DATABASE = None
+
+def _connect():
+    """Return the connection to the header cache database,  reopening it after
+    a fork or a change of cache location.
+    """
+    global _DATABASE
+    path = os.path.join(config.get_crds_headerpath(), DATABASE_NAME)
+    if _DATABASE is not None and _DATABASE[:2] == (os.getpid(), path):
+        return _DATABASE[2]
+    if _DATABASE is not None and _DATABASE[0] == os.getpid():
+        _DATABASE[2].close()
+    if config.get_cache_readonly():
+        connection = sqlite3.connect("file:" + path + "?mode=ro", uri=True, timeout=60)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=60)
+        connection.execute("PRAGMA synchronous = OFF")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS headers "
+                               "(key TEXT PRIMARY KEY, header TEXT, size INTEGER, used REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS headers_used ON headers (used)")
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM headers").fetchone()[0]
+    _DATABASE = (os.getpid(), path, connection, total)
+    return connection
+
+# ===================================================================
+
+def test():
+    """Run module doctests."""
+    import doctest
+    from crds.io import header_cache
+    return doctest.testmod(header_cache)
+
+if __name__ == "__main__":
+    print(test())
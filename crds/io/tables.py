@@ -5,7 +5,10 @@ readonly row acess to each segment.
 """
 
 import os.path
+import zlib
+from collections.abc import Sequence
 
+import numpy as np
 from astropy import table
 
 from crds.core import utils, log
@@ -51,37 +54,162 @@ def clear_cache():
 
 
 class SimpleTable:
-    """A simple class to encapsulate astropy tables for basic CRDS readonly table row and colname access."""
+    """A simple class to encapsulate astropy tables for basic CRDS readonly table row and colname access.
+
+    Table data is stored as one NumPy array per column,  copied out of the file so it can be closed
+    during __init__.   Rows are produced lazily from the column arrays.
+    """
     def __init__(self, filename, segment=1):
         self.filename = filename
         self.segment = segment
         self.basename = os.path.basename(filename)
-        self._columns = None  # dynamic,  independent of astropy
         if filename.endswith(".fits"):
             with data_file.fits_open(filename) as hdus:
                 tab = hdus[segment].data
                 self.colnames = tuple(name.upper() for name in tab.columns.names)
-                self.rows = tuple(tuple(row) for row in tab)   # readonly
+                arrays = tuple(_column_array(tab.field(i)) for i in range(len(self.colnames)))
+                nrows = len(tab)
         else:
             tab = table.Table.read(filename)
             self.colnames = tuple(name.upper() for name in tab.columns)
-            self.rows = tuple(tuple(row) for row in tab)   # readonly
+            arrays = tuple(_column_array(tab[name].data) for name in tab.columns)
+            nrows = len(tab)
+        self._columns = dict(zip(self.colnames, arrays))
+        self.rows = TableRows(arrays, nrows)   # readonly
         log.verbose("Creating", repr(self), verbosity=60)
 
     @property
     def columns(self):
-        """Based on the row tuples,  create columns dict dynamically.  This permits closing astropy Table during __init__.
+        """Returns { colname : column_array, ... }
 
-        Retuns { colname : column, ... }
+        String columns are NumPy chararrays so that,  like rows,  their values have trailing
+        whitespace removed when indexed.
         """
-        if self._columns is None:
-            self._columns = dict(list(zip(self.colnames, list(zip(*self.rows)))))
         return self._columns
 
     def __repr__(self):
         return (self.__class__.__name__ + "(" + repr(self.basename) + ", " + repr(self.segment) + ", colnames=" +
                 repr(self.colnames) + ", nrows=" + str(len(self.rows)) + ")")
 
+def _column_array(column):
+    """Return a copy of table `column` independent of the file it came from,  preserving
+    the chararray view of string columns.
+    """
+    array = np.array(column)
+    if isinstance(column, np.char.chararray):
+        array = array.view(np.char.chararray)
+    return array
+
+class TableRows(Sequence):
+    """A readonly sequence of row tuples produced on demand from a sequence of column arrays.
+
+    >>> rows = TableRows((np.array(["1", "2"]).view(np.char.chararray), np.array(["a ", "b"]).view(np.char.chararray)), 2)
+    >>> len(rows)
+    2
+    >>> rows[-1]
+    ('2', 'b')
+    >>> list(rows)
+    [('1', 'a'), ('2', 'b')]
+    >>> rows[5]
+    Traceback (most recent call last):
+    ...
+    IndexError: table row index out of range
+    """
+    def __init__(self, columns, nrows):
+        self._columns = tuple(columns)
+        self._nrows = nrows
+
+    def __len__(self):
+        return self._nrows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(self._nrows)))
+        if index < 0:
+            index += self._nrows
+        if not 0 <= index < self._nrows:
+            raise IndexError("table row index out of range")
+        return tuple(column[index] for column in self._columns)
+
+    def __iter__(self):
+        if self._columns:
+            return zip(*self._columns)
+        return iter([()] * self._nrows)
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(ncols=" + str(len(self._columns)) + ", nrows=" + str(self._nrows) + ")"
+
+
+# ===================================================================
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def _mix64(hashes):
+    """Scramble the bits of uint64 array `hashes`,  mapping 0 to 0."""
+    with np.errstate(over="ignore"):
+        hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return hashes ^ (hashes >> np.uint64(31))
+
+def column_hashes(column):
+    """Return (hashes, inexact) arrays for the cells of table `column`.
+
+    Cell values are canonicalized so cells which compare equal as row values,  e.g. 0.0
+    and -0.0,  or strings differing only in trailing blanks or width,  hash equally.
+    Cells for which equal hashes do not imply equal values,  e.g. object cells or cells
+    whose nans always compare unequal,  are flagged as inexact.
+    """
+    nrows = len(column)
+    values = np.asarray(column)
+    kind = values.dtype.kind
+    if kind == "O" or not nrows:
+        return np.zeros(nrows, dtype=np.uint64), np.ones(nrows, dtype=bool)
+    inexact = np.zeros(nrows, dtype=bool)
+    if kind in "SU":
+        values = np.char.rstrip(values)
+        seed = kind
+    else:
+        seed = kind + str(values.dtype.itemsize)
+        if kind in "fc":
+            nans = np.isnan(values).reshape(nrows, -1).any(axis=1)
+            if kind == "f" and values.ndim == 1 and values.dtype.itemsize >= 4:
+                values = np.where(nans, np.nan, values)   # all nans hash equally
+            else:
+                inexact |= nans
+            values = values + values.dtype.type(0)   # -0.0 --> 0.0
+    seed += repr(values.shape[1:])
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("="))
+    raw = values.view(np.uint8).reshape(nrows, -1)
+    raw = np.hstack([raw, np.zeros((nrows, -raw.shape[1] % 8), dtype=np.uint8)])
+    words = np.ascontiguousarray(raw).view(np.uint64)
+    hashes = np.zeros(nrows, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(words.shape[1]-1, -1, -1):  # trailing zero words,  e.g. string padding,  leave 0
+            hashes = _mix64(hashes * _HASH_MULTIPLIER + words[:, j])
+        hashes = _mix64(hashes + np.uint64(zlib.crc32(seed.encode("utf-8"))))
+    return hashes, inexact
+
+def row_hashes(columns, nrows):
+    """Return (hashes, inexact) arrays for the `nrows` rows of the sequence of table `columns`.
+
+    Rows with equal values have equal hashes unless `inexact` is True for either row,  in which
+    case the hash is not meaningful and the rows must be compared by value.
+
+    >>> hashes, inexact = row_hashes([np.array([1, 2, 1]), np.array(["a", "b", "a  "])], 3)
+    >>> bool(hashes[0] == hashes[2]), bool(hashes[0] == hashes[1]), bool(inexact.any())
+    (True, False, False)
+    >>> hashes, inexact = row_hashes([np.array([0.0, -0.0, np.nan, np.nan])], 4)
+    >>> bool(hashes[0] == hashes[1]), bool(hashes[2] == hashes[3]), bool(inexact.any())
+    (True, True, False)
+    """
+    hashes = np.zeros(nrows, dtype=np.uint64)
+    inexact = np.zeros(nrows, dtype=bool)
+    for column in columns:
+        cell_hashes, cell_inexact = column_hashes(column)
+        with np.errstate(over="ignore"):
+            hashes = _mix64(hashes * _HASH_MULTIPLIER + cell_hashes)
+        inexact |= cell_inexact
+    return hashes, inexact
 
 
 def test():
@@ -3,6 +3,8 @@ FITS files or HDU lists. This can be a command-line module or class in a
 script. Written to add this functionality to crds.diff.
 """
 import sys
+import bisect
+import hashlib
 
 import difflib
 from itertools import product
@@ -42,10 +44,29 @@ def table_to_string(a_table):
     """
     result = list()
     for element in a_table:
-        result.append(str(list(element)).strip('[]'))
+        result.append(', '.join(value_to_string(value) for value in element))
     return result
 
 
+def value_to_string(value):
+    """Format one table value as it appears in the rows of table_to_string().
+
+    Numbers are formatted as str() of the NumPy scalar so the rows do not
+    depend on the version of NumPy,  strings are quoted.
+
+    >>> value_to_string(np.float32(-2779.0322)), value_to_string(np.int16(-1))
+    ('-2779.0322', '-1')
+    >>> value_to_string(np.str_('yes')), value_to_string('no')
+    ("'yes'", "'no'")
+    """
+    if isinstance(value, (str, bytes)):
+        return repr(value.item() if isinstance(value, np.generic) else value)
+    elif isinstance(value, np.ndarray):
+        return repr(value)
+    else:
+        return str(value)
+
+
 def list_intersection(a_list, b_list, transform=lambda element: element):
     """Return a list of the intersection of two lists.
 
@@ -284,6 +305,273 @@ def selected(element, wanted):
     return element in wanted
 
 
+# ==========================================================================
+# Hash engine utilities
+
+
+def table_row_hashes(a_table):
+    """Return a uint64 array of hashes of the rows of `a_table`.
+
+    Rows are hashed column-wise by crds.io.tables.row_hashes().   The few
+    rows it cannot hash by value,  e.g. rows of arrays containing NaNs,  are
+    hashed by their table_to_string() representation instead.
+
+    Parameters
+    ----------
+    a_table : astropy.table.Table
+        The table to hash
+
+    Returns
+    -------
+    result : numpy.ndarray
+        One hash per row, equal for rows with equal values
+
+    """
+    from crds.io import tables    # Deferred
+    hashes, inexact = tables.row_hashes([a_table[name] for name in a_table.colnames],
+                                        len(a_table))
+    for row in np.flatnonzero(inexact):
+        digest = hashlib.sha1(table_to_string(a_table[row:row+1])[0].encode("utf-8")).digest()
+        hashes[row] = np.frombuffer(digest[:8], dtype=np.uint64)[0]
+    return hashes
+
+
+def key_occurrences(keys):
+    """Number the repeated occurrences of each key.
+
+    Parameters
+    ----------
+    keys : numpy.ndarray
+        The keys of each row
+
+    Returns
+    -------
+    result : numpy.ndarray
+        A structured array of (key, occurrence) for each row, where
+        occurrence counts the earlier rows with the same key.
+        The result contains no duplicates.
+
+    >>> key_occurrences(np.array([7, 3, 7, 7])).tolist()
+    [(7, 0), (3, 0), (7, 1), (7, 2)]
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    firsts = np.ones(len(keys), dtype=bool)
+    firsts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    positions = np.arange(len(keys))
+    group_starts = np.maximum.accumulate(np.where(firsts, positions, 0))
+    result = np.empty(len(keys), dtype=[("key", keys.dtype), ("occurrence", np.int64)])
+    result["key"] = keys
+    result["occurrence"][order] = positions - group_starts
+    return result
+
+
+def match_keys(a_keys, b_keys):
+    """Pair up the rows of two tables with equal keys by sort-merge.
+
+    The n-th occurrence of a key in `a_keys` is paired with the n-th
+    occurrence of the same key in `b_keys`.
+
+    Parameters
+    ----------
+    a_keys, b_keys : numpy.ndarray
+        The keys of each row of the tables
+
+    Returns
+    -------
+    a_rows, b_rows : numpy.ndarray
+        Row indices of the matched pairs, in order of `a_rows`
+
+    >>> [rows.tolist() for rows in match_keys(np.array([1, 2, 2, 3]), np.array([2, 4, 1, 2]))]
+    [[0, 1, 2], [2, 0, 3]]
+    """
+    _matched, a_rows, b_rows = np.intersect1d(key_occurrences(a_keys),
+                                              key_occurrences(b_keys),
+                                              assume_unique=True,
+                                              return_indices=True)
+    order = np.argsort(a_rows)
+    return a_rows[order], b_rows[order]
+
+
+def increasing_subsequence(values):
+    """Find a longest strictly increasing subsequence of `values`.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Integers to search
+
+    Returns
+    -------
+    result : numpy.ndarray
+        Indices of the elements of `values` in the subsequence
+
+    >>> increasing_subsequence(np.array([0, 4, 1, 2, 5, 3])).tolist()
+    [0, 2, 3, 5]
+    """
+    if np.all(np.diff(values) > 0):
+        return np.arange(len(values))
+    tails = []          # smallest tail value of an increasing subsequence of each length
+    tail_indices = []
+    previous = np.zeros(len(values), dtype=np.int64)
+    for index, value in enumerate(values.tolist()):
+        length = bisect.bisect_left(tails, value)
+        previous[index] = tail_indices[length-1] if length else -1
+        if length == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[length] = value
+            tail_indices[length] = index
+    result = []
+    index = tail_indices[-1] if tail_indices else -1
+    while index >= 0:
+        result.append(index)
+        index = previous[index]
+    return np.array(result[::-1], dtype=np.int64)
+
+
+def aligned_opcodes(a_rows, b_rows, a_length, b_length):
+    """Convert aligned rows into difflib.SequenceMatcher style opcodes.
+
+    Parameters
+    ----------
+    a_rows, b_rows : numpy.ndarray
+        Indices of the equal rows of each table, both increasing.
+
+    a_length, b_length : int
+        Lengths of the tables
+
+    Returns
+    -------
+    result : list
+        Opcodes as returned by difflib.SequenceMatcher.get_opcodes()
+
+    >>> aligned_opcodes(np.array([0, 2, 3]), np.array([0, 1, 2]), 5, 4)
+    [('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 4, 1, 3), ('replace', 4, 5, 3, 4)]
+    """
+    breaks = np.flatnonzero((np.diff(a_rows) != 1) | (np.diff(b_rows) != 1)) + 1
+    starts = np.concatenate([[0], breaks]).astype(np.int64)
+    sizes = np.diff(np.concatenate([starts, [len(a_rows)]]))
+    if not len(a_rows):
+        starts, sizes = starts[:0], sizes[:0]
+    blocks = list(zip(a_rows[starts].tolist(), b_rows[starts].tolist(), sizes.tolist()))
+    blocks.append((a_length, b_length, 0))
+    result = []
+    a_index = b_index = 0
+    for a_start, b_start, size in blocks:
+        if a_index < a_start and b_index < b_start:
+            result.append(('replace', a_index, a_start, b_index, b_start))
+        elif a_index < a_start:
+            result.append(('delete', a_index, a_start, b_index, b_start))
+        elif b_index < b_start:
+            result.append(('insert', a_index, a_start, b_index, b_start))
+        a_index, b_index = a_start + size, b_start + size
+        if size:
+            result.append(('equal', a_start, a_index, b_start, b_index))
+    return result
+
+
+def mode_keys(a_modes, b_modes):
+    """Give each combination of mode values an integer key.
+
+    Parameters
+    ----------
+    a_modes, b_modes : astropy.table.Table
+        Tables of just the mode columns
+
+    Returns
+    -------
+    a_keys, b_keys : numpy.ndarray
+        The key of each row of the tables.
+
+    all_modes : astropy.table.Table
+        All combinations of the mode values of both tables, in sorted
+        order, such that each key is the row index of its mode.
+
+    """
+    from astropy.table import Table    # Deferred
+    a_keys = np.zeros(len(a_modes), dtype=np.int64)
+    b_keys = np.zeros(len(b_modes), dtype=np.int64)
+    values_possible = []
+    for field in a_modes.colnames:
+        values, codes = np.unique(np.concatenate([np.asarray(a_modes[field]),
+                                                  np.asarray(b_modes[field])]),
+                                  return_inverse=True)
+        codes = codes.reshape(-1)
+        a_keys = a_keys * len(values) + codes[:len(a_modes)]
+        b_keys = b_keys * len(values) + codes[len(a_modes):]
+        values_possible.append(values)
+    combinations = np.indices([len(values) for values in values_possible]).reshape(len(values_possible), -1)
+    all_modes = Table([values[indices] for (values, indices) in zip(values_possible, combinations)],
+                      names=a_modes.colnames)
+    return a_keys, b_keys, all_modes
+
+
+def unified_diff(opcodes, a_lines, b_lines, fromfile='', tofile='', n=3, lineterm='\n'):
+    """Produce difflib.unified_diff() output for precomputed `opcodes`.
+
+    Parameters
+    ----------
+    opcodes : sequence
+        Opcodes as returned by difflib.SequenceMatcher.get_opcodes()
+
+    a_lines, b_lines : function(start, stop)
+        Return the lines start:stop of each sequence. Lines are only
+        produced for the hunks of the diff, as the diff is consumed.
+
+    Returns
+    -------
+    result : generator
+        The lines of the unified diff.
+
+    Other Parameters
+    ----------------
+    fromfile, tofile, n, lineterm :
+        As for difflib.unified_diff()
+
+    >>> lines = ['a', 'b', 'c']
+    >>> fetch = lambda start, stop: lines[start:stop]
+    >>> list(unified_diff([('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 3, 1, 2)],
+    ...                   fetch, lambda start, stop: ['a', 'c'][start:stop], 'A', 'B', lineterm=''))
+    ['--- A', '+++ B', '@@ -1,3 +1,2 @@', ' a', '-b', ' c']
+    """
+    matcher = difflib.SequenceMatcher()
+    matcher.opcodes = list(opcodes)     # get_grouped_opcodes() works from these
+    started = False
+    for group in matcher.get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield '--- {}{}'.format(fromfile, lineterm)
+            yield '+++ {}{}'.format(tofile, lineterm)
+        first, last = group[0], group[-1]
+        yield '@@ -{} +{} @@{}'.format(_unified_range(first[1], last[2]),
+                                       _unified_range(first[3], last[4]),
+                                       lineterm)
+        for tag, a_start, a_end, b_start, b_end in group:
+            if tag == 'equal':
+                for line in a_lines(a_start, a_end):
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a_lines(a_start, a_end):
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b_lines(b_start, b_end):
+                    yield '+' + line
+
+
+def _unified_range(start, stop):
+    """Format a unified diff hunk range as difflib does."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '{}'.format(beginning)
+    if not length:
+        beginning -= 1
+    return '{},{}'.format(beginning, length)
+
+
 # ==========================================================================
 class RowDiff:
     """Perform FITS table difference by rows
@@ -308,6 +596,12 @@ class RowDiff:
     mode_fields: sequence
         List of fields that define modes to compare
 
+    engine: string
+        'difflib' to align rows with difflib.SequenceMatcher over the rows
+        formatted as strings, or 'hash' to align rows by sort-merge on
+        column-wise NumPy row hashes or mode keys. The 'hash' engine
+        avoids the quadratic behavior of difflib on large tables.
+
 
     Returns
     -------
@@ -322,6 +616,8 @@ class RowDiff:
     --------
     self.rowdiff : Function that does the row differencing
     self.modediff : Function that does the mode differencing
+    self.hash_rowdiff, self.hash_modediff : The same, for the 'hash' engine
+    self.report : Write the report without formatting it as one string
 
     Notes
     -----
@@ -332,20 +628,28 @@ class RowDiff:
     are compared between each table extension. These are mutually
     exclusive parameters and an error will generate if both are specified.
 
+    The 'hash' engine reports in the same format as the 'difflib' engine
+    but, since it pairs rows by key rather than by longest matching runs,
+    the rows it pairs up as changed can differ.
+
     """
 
+    engines = ('difflib', 'hash')
+
     def __init__(self,
                  a_fits,
                  b_fits,
                  fields=[],
                  ignore_fields=[],
-                 mode_fields=[]):
+                 mode_fields=[],
+                 engine='difflib'):
 
         self.a_hdulist = a_fits
         self.b_hdulist = b_fits
         self.fields = [field.lower() for field in fields]
         self.ignore_fields = [field.lower() for field in ignore_fields]
         self.mode_fields = mode_fields
+        self.engine = engine
         self.summary_only = False
         self.consistent = False
 
@@ -355,6 +659,10 @@ class RowDiff:
             raise RuntimeError('Both fields and ignore_fields' +
                                ' cannot be specified.')
 
+        if engine not in self.engines:
+            raise RuntimeError('Unknown engine %s, must be one of %s' %
+                               (repr(engine), ', '.join(self.engines)))
+
         # Get the FITS HDU's.
         with get_hdulist(a_fits) as self.a_hdulist, \
              get_hdulist(b_fits) as self.b_hdulist:
@@ -368,9 +676,9 @@ class RowDiff:
 
             # Set the differencing function.
             if self.mode_fields:
-                self.diff = self.modediff
+                self.diff = self.hash_modediff if engine == 'hash' else self.modediff
             else:
-                self.diff = self.rowdiff
+                self.diff = self.hash_rowdiff if engine == 'hash' else self.rowdiff
 
             # Loop through the HDU's, pick out the tables, then diff them.
             # We only need to look at the first HDUlist because we have
@@ -650,6 +958,158 @@ class RowDiff:
         # Return the opcodes
         return result
 
+    def common_fields(self, a_fitstable, b_fitstable):
+        """Determine the fields to compare without a full table data diff
+
+        Parameters
+        ----------
+        self: RowDiff instance
+        a_fitstable, b_fitstable: FITS table data
+            The tables to compare
+
+        Returns
+        -------
+        common_column_names : set
+            The lowercase names of the columns in both tables,
+            less self.ignore_fields, as for TableDataDiff
+
+        fields_common : list
+            The fields to compare, in the order of self.fields or else
+            the order of the columns of `a_fitstable`.
+
+        """
+        common_column_names = (set(name.lower() for name in a_fitstable.columns.names) &
+                               set(name.lower() for name in b_fitstable.columns.names))
+        common_column_names -= set(self.ignore_fields)
+        if self.fields:
+            fields_common = list_intersection(self.fields, common_column_names)
+        else:
+            fields_common = list_intersection(a_fitstable.columns.names,
+                                              common_column_names,
+                                              lambda element: element.lower())
+        return common_column_names, fields_common
+
+    def hash_modediff(self, a_fitstable, b_fitstable):
+        """Produce the results of modediff using the 'hash' engine
+
+        Rows are identified by integer keys computed column-wise from their
+        mode values, and the tables are aligned by sort-merge on the keys.
+        The rows of the common modes are compared by row hash.
+
+        Parameters
+        ----------
+        self: RowDiff instance
+        a_fitstable: HDUList object
+            First FITS table to compare
+        b_fitstable: HDUList object
+            Second FITS table to compare
+
+        Returns
+        -------
+        result : As for modediff
+
+        """
+        # self.mode_fields can also be a dict of values for the fields.
+        mode_field_names = list(self.mode_fields)
+
+        common_column_names, fields_common = self.common_fields(a_fitstable, b_fitstable)
+        if not set(mode_field_names) <= common_column_names:
+            raise RuntimeError('Mode select columns are not in both tables.')
+
+        from astropy.table import Table    # Deferred
+        a_table = Table(a_fitstable)
+        b_table = Table(b_fitstable)
+        column_name_lower(a_table)
+        column_name_lower(b_table)
+        a_table.sort(mode_field_names)
+        b_table.sort(mode_field_names)
+        a_table_modes = a_table[mode_field_names]
+        b_table_modes = b_table[mode_field_names]
+
+        # Since the tables are sorted on the modes, the keys are increasing.
+        a_keys, b_keys, vc_table = mode_keys(a_table_modes, b_table_modes)
+        vc_keys = np.arange(len(vc_table))
+
+        results = []
+        for (x_table, x_keys, y_table, y_keys) in [(vc_table, vc_keys, a_table_modes, a_keys),
+                                                   (vc_table, vc_keys, b_table_modes, b_keys),
+                                                   (a_table_modes, a_keys, b_table_modes, b_keys)]:
+            x_rows, y_rows = match_keys(x_keys, y_keys)
+            results.append((x_table, y_table,
+                            aligned_opcodes(x_rows, y_rows, len(x_table), len(y_table))))
+
+        # Compare the rows of the modes common to both tables.
+        a_rows, b_rows = match_keys(a_keys, b_keys)
+        if isinstance(self.mode_fields, dict):
+            selected_rows = np.ones(len(a_rows), dtype=bool)
+            for (field, values) in self.mode_fields.items():
+                if values:
+                    selected_rows &= np.isin(np.asarray(a_table[field])[a_rows], list(values))
+            a_rows, b_rows = a_rows[selected_rows], b_rows[selected_rows]
+        fields_all = list_intersection(a_table.colnames, mode_field_names + fields_common)
+        a_table_values = a_table[fields_all][a_rows]
+        b_table_values = b_table[fields_all][b_rows]
+        unchanged = np.flatnonzero(table_row_hashes(a_table_values) == table_row_hashes(b_table_values))
+        common_mode_diffs = None
+        if len(unchanged) < len(a_rows):
+            common_mode_diffs = (a_table_values,
+                                 b_table_values,
+                                 aligned_opcodes(unchanged, unchanged, len(a_rows), len(b_rows)))
+
+        return tuple(results) + (common_mode_diffs,)
+
+    def hash_rowdiff(self, a_fitstable, b_fitstable):
+        """Produce the results of rowdiff using the 'hash' engine
+
+        Each row is hashed column-wise. Rows with equal hashes are paired up
+        by sort-merge, and the longest run of pairs in the same order in
+        both tables is kept as the equal rows of the diff.
+
+        Parameters
+        ----------
+        self: RowDiff instance
+        a_fitstable: HDUList object
+            First FITS table to compare
+        b_fitstable: HDUList object
+            Second FITS table to compare
+
+        Returns
+        -------
+        result : Either None or a tuple of
+            - List of SequenceMatcher style opcodes
+            - Generator of the lines of the unified diff,
+              formatted as they are consumed.
+
+        """
+        _common_column_names, fields_common = self.common_fields(a_fitstable, b_fitstable)
+        if not fields_common:
+            return None
+
+        from astropy.table import Table    # Deferred
+        a_table = Table(a_fitstable)
+        b_table = Table(b_fitstable)
+        column_name_lower(a_table)
+        column_name_lower(b_table)
+        a_table = a_table[fields_common]
+        b_table = b_table[fields_common]
+
+        a_rows, b_rows = match_keys(table_row_hashes(a_table), table_row_hashes(b_table))
+        in_order = increasing_subsequence(b_rows)
+        a_rows, b_rows = a_rows[in_order], b_rows[in_order]
+
+        # As for difflib.SequenceMatcher.ratio()
+        total = len(a_table) + len(b_table)
+        ratio = 2.0 * len(a_rows) / total if total else 1.0
+        if ratio >= 0.99:
+            return None
+
+        opcodes = aligned_opcodes(a_rows, b_rows, len(a_table), len(b_table))
+        diff_lines = unified_diff(opcodes,
+                                  lambda start, stop: table_to_string(a_table[start:stop]),
+                                  lambda start, stop: table_to_string(b_table[start:stop]),
+                                  "Table A", "Table B")
+        return (opcodes, diff_lines)
+
     def __str__(self):
         """Provide readable output
 
@@ -659,9 +1119,33 @@ class RowDiff:
             String of human readable version of the RowDiff object.
 
         """
+        return ''.join(self.report_lines())
+
+    def report(self, fileobj=None):
+        """Write the human readable report as it is produced
+
+        Unlike str(), the report is never held in memory as a whole.
+
+        Parameters
+        ----------
+        fileobj : file-like object
+            Where to write the report, nominally sys.stdout.
+
+        """
+        if fileobj is None:
+            fileobj = sys.stdout
+        for text in self.report_lines():
+            fileobj.write(text)
 
-        # Initialize the result string.
-        result = ''
+    def report_lines(self):
+        """Produce the human readable report
+
+        Returns
+        -------
+        result : generator
+            The strings making up the report in order.
+
+        """
 
         # Save time, see if there are any diffs.
         if len(self.diffs) > 0:
@@ -670,7 +1154,7 @@ class RowDiff:
             if self.mode_fields:
                 diff_current = 0
                 for (diff_current, diff) in self.diffs:
-                    result += 'Difference for HDU extension #%d\n' % diff_current
+                    result = 'Difference for HDU extension #%d\n' % diff_current
 
                     (result_modes_vs_a,
                      result_modes_vs_b,
@@ -705,16 +1189,18 @@ class RowDiff:
                         result += result_mode
                     else:
                         result += '\n    All common modes are equivalent.\n'
+                    yield result
 
             # Row difference reporting
             else:
-                result_temp = ''
+                reported = False
                 for (diff_current, diff) in self.diffs:
                     if diff:
-                        (sm_opcodes, unified_diff) = diff
+                        (sm_opcodes, diff_lines) = diff
                         filtered_diff = sm_filter_opcodes(sm_opcodes)
                         if filtered_diff:
-                            result_temp += 'Row differences for HDU extension #%d\n\n' % diff_current
+                            reported = True
+                            result_temp = 'Row differences for HDU extension #%d\n\n' % diff_current
                             result_temp += '    Summary:\n'
                             for opcode in filtered_diff:
 
@@ -731,19 +1217,15 @@ class RowDiff:
                                     result_temp += '        Add to b rows %d-%d\n' % (b_start, b_end)
                                 else:
                                     pass
+                            yield result_temp
 
                             if not self.summary_only:
-                                result_temp += '\n    Row difference, unified diff format:\n'
-                                for unified_diff_row in unified_diff:
-                                    result_temp += '        %s\n' % unified_diff_row
+                                yield '\n    Row difference, unified diff format:\n'
+                                for unified_diff_row in diff_lines:
+                                    yield '        %s\n' % unified_diff_row
 
-                if result_temp:
-                    result += result_temp
-                else:
-                    result = '    HDU extension #%d contains no differences' % diff_current
-
-        # Return the string
-        return result
+                if not reported:
+                    yield '    HDU extension #%d contains no differences' % diff_current
 
 # =========================================================================
 class RowDiffScript(cmdline.Script):
@@ -756,6 +1238,7 @@ class RowDiffScript(cmdline.Script):
     fields: List of fields to compare on.
     ignore_fields: List of fields to ignore.
     mode_fields: List of fields that define modes to compare
+    engine: 'difflib' or 'hash',  the RowDiff differencing engine
 
     Note: The parameters 'fields' and 'ignore_fields' are mutually exclusive.
           An error will be raised if both are specified.
@@ -878,6 +1361,10 @@ class RowDiffScript(cmdline.Script):
 
             All common modes are equivalent.
 
+    The parameter --engine=hash selects a differencing engine for large tables.
+    Rather than matching rows formatted as strings using difflib, it hashes rows
+    column-wise and aligns the tables by sorting on the mode fields or row hashes.
+    The report has the same format, and is written as it is produced.
     """
 
     # Define the user interface
@@ -894,6 +1381,9 @@ class RowDiffScript(cmdline.Script):
         self.add_argument("--mode-fields",
                           help="List of fields to do a mode compare",
                           type=str)
+        self.add_argument("--engine",
+                          help="Differencing engine,  'hash' scales to large tables",
+                          choices=RowDiff.engines, default="difflib")
 
     locate_file = cmdline.Script.locate_file_outside_cache
 
@@ -916,10 +1406,13 @@ class RowDiffScript(cmdline.Script):
         if self.args.mode_fields is not None:
             mode_fields = self.args.mode_fields.split(',')
 
-        print(RowDiff(tableA_path, tableB_path,
-                      fields=fields,
-                      ignore_fields=ignore_fields,
-                      mode_fields=mode_fields))
+        rdiff = RowDiff(tableA_path, tableB_path,
+                        fields=fields,
+                        ignore_fields=ignore_fields,
+                        mode_fields=mode_fields,
+                        engine=self.args.engine)
+        rdiff.report()
+        print()
 
 if __name__ == "__main__":
     sys.exit(RowDiffScript()())
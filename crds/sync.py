@@ -28,6 +28,9 @@ import os.path
 import re
 import shutil
 import glob
+import json
+import time
+from concurrent import futures
 
 # ============================================================================
 
@@ -232,6 +235,13 @@ class SyncScript(cmdline.ContextsScript):
                           help='Check cached files against the CRDS database and report anomalies.')
         self.add_argument('-s', '--check-sha1sum', action='store_true', dest='check_sha1sum',
                           help='For --check-files,  also verify file sha1sums.')
+        self.add_argument('--force-rehash', action='store_true',
+                          help='Recompute sha1sums even for files the checksum ledger records as unchanged.')
+        self.add_argument('--max-checksum-age', type=int, default=None, metavar="DAYS",
+                          help='Recompute sha1sums for files the checksum ledger last verified more than DAYS days ago. '
+                          'Defaults to CRDS_CHECKSUM_LEDGER_MAX_AGE,  0 means no limit.')
+        self.add_argument('--hash-workers', type=int, default=1, metavar="N",
+                          help='Number of threads used to compute sha1sums while verifying files.')
         self.add_argument('-r', '--repair-files', action='store_true', dest='repair_files',
                           help='Repair or re-download files noted as bad by --check-files')
         self.add_argument('--purge-rejected', action='store_true', dest='purge_rejected',
@@ -574,6 +584,8 @@ class SyncScript(cmdline.ContextsScript):
         except Exception as exc:
             log.error("Failed getting file info.  CACHE VERIFICATION FAILED.  Exception: ", repr(str(exc)))
             return
+        checksums = self.get_checksums([
+            file for file in files if self.needs_checksum(file, infos[os.path.basename(file)])])
         bytes_so_far = 0
         total_bytes = api.get_total_bytes(infos)
         for nth_file, file in enumerate(files):
@@ -581,11 +593,50 @@ class SyncScript(cmdline.ContextsScript):
             if infos[bfile] == "NOT FOUND":
                 log.error("CRDS has no record of file", repr(bfile))
             else:
-                self.verify_file(file, infos[bfile], bytes_so_far, total_bytes, nth_file, len(files))
+                self.verify_file(file, infos[bfile], bytes_so_far, total_bytes, nth_file, len(files),
+                                 sha1sum=checksums.get(file))
                 bytes_so_far += int(infos[bfile]["size"])
 
-    def verify_file(self, file, info, bytes_so_far, total_bytes, nth_file, total_files):
-        """Check one `file` against the provided CRDS database `info` dictionary."""
+    def needs_checksum(self, file, info):
+        """Return True IFF verify_file() will compute the sha1sum of `file`."""
+        if info == "NOT FOUND" or not (self.args.check_sha1sum or config.is_mapping(file)):
+            return False
+        path = config.locate_file(file, observatory=self.observatory)
+        return os.path.exists(path) and os.stat(path).st_size == int(info["size"])
+
+    def get_checksums(self, files):
+        """Return { file : sha1sum } for `files`.   Reuse sha1sums from the cache's
+        checksum ledger for files which have not changed and were verified within
+        --max-checksum-age days,  unless --force-rehash,  and compute the rest using
+        --hash-workers threads.
+        """
+        max_age = self.args.max_checksum_age
+        if max_age is None:
+            max_age = config.CHECKSUM_LEDGER_MAX_AGE.get()
+        ledger = ChecksumLedger(config.get_checksum_ledger_path(self.observatory),
+                                max_age=max_age * 24 * 3600 if max_age > 0 else None)
+        paths = { file : config.locate_file(file, observatory=self.observatory) for file in files }
+        checksums, rehash = {}, []
+        for file in files:
+            sha1sum = None if self.args.force_rehash else ledger.lookup(paths[file])
+            if sha1sum is None:
+                rehash.append(file)
+            else:
+                checksums[file] = sha1sum
+        log.verbose("Reusing ledger checksums for", len(checksums), "files,  computing", len(rehash),
+                    "using", self.args.hash_workers, "threads.", verbosity=10)
+        with futures.ThreadPoolExecutor(max_workers=max(1, self.args.hash_workers)) as pool:
+            for file, sha1sum in zip(rehash, pool.map(_checksum_or_none, [paths[file] for file in rehash])):
+                if sha1sum is not None:   # verify_file() will retry and report
+                    checksums[file] = sha1sum
+                    ledger.record(paths[file], sha1sum)
+        ledger.save()
+        return checksums
+
+    def verify_file(self, file, info, bytes_so_far, total_bytes, nth_file, total_files, sha1sum=None):
+        """Check one `file` against the provided CRDS database `info` dictionary.
+        If `sha1sum` is None,  compute the sha1sum of `file` if needed.
+        """
         path = config.locate_file(file, observatory=self.observatory)
         base = os.path.basename(file)
         n_bytes = int(info["size"])
@@ -607,8 +658,9 @@ class SyncScript(cmdline.ContextsScript):
             self.error_and_repair(path, "File", repr(base), "length mismatch LOCAL size=" + srepr(size),
                                   "CRDS size=" + srepr(info["size"]))
         elif self.args.check_sha1sum or config.is_mapping(base):
-            log.verbose("Computing checksum for", repr(base), "of size", repr(size), verbosity=60)
-            sha1sum = utils.checksum(path)
+            if sha1sum is None:
+                log.verbose("Computing checksum for", repr(base), "of size", repr(size), verbosity=60)
+                sha1sum = utils.checksum(path)
             if info["sha1sum"] == "none":
                 log.warning("CRDS doesn't know the checksum for", repr(base))
             elif info["sha1sum"] != sha1sum:
@@ -693,5 +745,111 @@ class SyncScript(cmdline.ContextsScript):
 
 # ==============================================================================================================
 
+class ChecksumLedger:
+    """Persistent record of the sha1sums of cache files,  keyed by absolute path,
+    so that repeated `crds sync --check-files --check-sha1sum` runs only rehash
+    files whose size,  modification time,  or inode have changed.   Each entry
+    records when its sha1sum was last verified;  if `max_age` seconds is given,
+    older entries are not reused so that unchanged files are periodically rehashed.
+
+    >>> import tempfile
+    >>> tempdir = tempfile.mkdtemp()
+    >>> ledger_path = os.path.join(tempdir, "checksum_ledger.json")
+    >>> data_path = os.path.join(tempdir, "data.txt")
+    >>> with open(data_path, "w") as handle:
+    ...     _ = handle.write("hello")
+
+    >>> ledger = ChecksumLedger(ledger_path)
+    >>> ledger.lookup(data_path) is None
+    True
+    >>> ledger.record(data_path, utils.checksum(data_path))
+    >>> ledger.save()
+
+    >>> ChecksumLedger(ledger_path).lookup(data_path)
+    'aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d'
+
+    >>> ledger.entries[os.path.abspath(data_path)]["verified"] <= time.time()
+    True
+    >>> ledger.entries[os.path.abspath(data_path)]["verified"] -= 7200
+    >>> ledger.dirty = True
+    >>> ledger.save()
+    >>> ChecksumLedger(ledger_path, max_age=3600).lookup(data_path) is None
+    True
+    >>> ChecksumLedger(ledger_path, max_age=3*3600).lookup(data_path)
+    'aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d'
+
+    >>> with open(data_path, "w") as handle:
+    ...     _ = handle.write("goodbye")
+    >>> ChecksumLedger(ledger_path).lookup(data_path) is None
+    True
+
+    >>> shutil.rmtree(tempdir)
+    """
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self):
+        """Return the ledger dictionary stored at self.path or {} if it is missing or corrupt."""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as handle:
+                entries = json.load(handle)
+            assert isinstance(entries, dict), "ledger is not a dictionary"
+            return entries
+        except Exception as exc:
+            log.verbose_warning("Ignoring unreadable checksum ledger", repr(self.path), ":", repr(exc))
+            return {}
+
+    @staticmethod
+    def _stat_key(path):
+        """Return the (size, mtime, inode) identifying the current contents of `path`."""
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def lookup(self, path):
+        """Return the recorded sha1sum of `path` or None if it is unknown,  `path` changed,
+        or the sha1sum was last verified more than self.max_age seconds ago.
+        """
+        entry = self.entries.get(os.path.abspath(path))
+        try:
+            if entry and entry["stat"] == self._stat_key(path) and not self._expired(entry):
+                return entry["sha1sum"]
+        except (OSError, KeyError, TypeError):
+            pass
+        return None
+
+    def _expired(self, entry):
+        """Return True IFF ledger `entry` was verified too long ago to be reused.   Entries
+        recorded before verification times were kept count as expired.
+        """
+        return self.max_age is not None and time.time() - entry.get("verified", 0) > self.max_age
+
+    def record(self, path, sha1sum):
+        """Record `sha1sum` as the checksum of the current contents of `path`,  verified now."""
+        self.entries[os.path.abspath(path)] = dict(
+            stat=self._stat_key(path), sha1sum=sha1sum, verified=time.time())
+        self.dirty = True
+
+    def save(self):
+        """Atomically rewrite the ledger file if any checksums were recorded."""
+        if self.dirty:
+            heavy_client.cache_atomic_write(
+                self.path, json.dumps(self.entries), "Checksums will be recomputed next time.")
+            self.dirty = False
+
+def _checksum_or_none(path):
+    """Return the sha1sum of `path` or None if it cannot be computed."""
+    try:
+        return utils.checksum(path)
+    except Exception as exc:
+        log.verbose_warning("Failed computing checksum for", repr(path), ":", repr(exc))
+        return None
+
+# ==============================================================================================================
+
 if __name__ == "__main__":
     sys.exit(SyncScript()())
@@ -2,6 +2,7 @@ import os
 import json
 import shutil
 import datetime
+from unittest import mock
 
 from crds import bestrefs
 from crds.bestrefs import BestrefsScript
@@ -440,6 +441,28 @@ class TestBestrefs(test_config.CRDSTestCase):
         self.run_script("crds.bestrefs --new-context hst_0315.pmap --load-pickle data/test_cos.pkl --stats --print-affected-details",
                         expected_errs=0)
 
+    def test_bestrefs_from_pickle_processes(self):
+        self.run_script("crds.bestrefs --new-context hst_0315.pmap --load-pickle data/test_cos.pkl --stats --print-affected-details "
+                        "--processes 2", expected_errs=0)
+
+    def test_bestrefs_processes_matches_serial(self):
+        with open("data/test_cos.json") as handle:
+            header = list(json.loads(handle.readline()).values())[0]
+        header["DETECTOR"] = "BOGUS"
+        with open(self.temp("bogus_cos.json"), "w+") as handle:
+            for i in range(6):
+                handle.write(json.dumps({f"LCE31SW{i}Q:LCE31SW{i}Q": header}) + "\n")
+        def bestrefs_with_processes(processes):
+            script = BestrefsScript(f"crds.bestrefs --new-context hst_0315.pmap --load-pickle {self.temp('bogus_cos.json')} "
+                                    f"--max-errors-per-class 2 --save-pickle {self.temp('bogus_cos.pkl')} "
+                                    f"--processes {processes}")
+            errors = script()
+            saved = bestrefs.headers.load_bestrefs_headers(self.temp("bogus_cos.pkl"))
+            return errors, script.ue_mixin.tracked_errors, dict(script.ue_mixin.count), saved
+        serial = bestrefs_with_processes(1)
+        self.assertGreater(serial[1], 0)
+        self.assertEqual(bestrefs_with_processes(2), serial)
+
     def test_bestrefs_to_pickle(self):
         self.run_script("crds.bestrefs --datasets LA9K03C3Q:LA9K03C3Q LA9K03C5Q:LA9K03C5Q LA9K03C7Q:LA9K03C7Q "
                         "--new-context hst_0315.pmap --save-pickle test_cos.pkl --stats",
@@ -455,6 +478,32 @@ class TestBestrefs(test_config.CRDSTestCase):
                         f"--datasets-since {self.get_10_days_ago()}", expected_errs=None)
         os.remove("test_cos.json")
 
+    def test_bestrefs_instrument_save_pickle_update_bestrefs(self):
+        with open("data/test_cos.json") as handle:
+            header = list(json.loads(handle.readline()).values())[0]
+        dumped = { f"LCE31SW{i}Q:LCE31SW{i}Q" : dict(header) for i in range(3) }
+        with mock.patch.object(BestrefsScript, "require_server_connection"), \
+                mock.patch("crds.client.api.get_dataset_ids", return_value=sorted(dumped)), \
+                mock.patch("crds.client.api.get_dataset_headers_by_id",
+                           side_effect=lambda context, ids: { dataset : dict(dumped[dataset]) for dataset in ids }):
+            self.run_script(f"crds.bestrefs --instruments cos --new-context hst_0315.pmap "
+                            f"--save-pickle {self.temp('test_cos.json')} --update-bestrefs", expected_errs=None)
+        saved = bestrefs.headers.load_bestrefs_headers(self.temp("test_cos.json"))
+        self.assertEqual(sorted(saved), sorted(dumped))
+
+    def test_bestrefs_to_header_store(self):
+        self.run_script("crds.bestrefs --new-context hst_0315.pmap --load-pickle data/test_cos.pkl "
+                        "--save-pickle test_cos.npz --stats", expected_errs=0)
+        expected = bestrefs.headers.load_bestrefs_headers("data/test_cos.pkl")
+        store = bestrefs.headers.load_bestrefs_headers("test_cos.npz")
+        self.assertEqual(dict(store.items()), expected)
+        only_ids = sorted(expected)[:1]
+        store = bestrefs.headers.load_bestrefs_headers("test_cos.npz", only_ids=only_ids)
+        self.assertEqual(list(store), only_ids)
+        self.run_script("crds.bestrefs --new-context hst_0315.pmap --load-pickle test_cos.npz --stats "
+                        "--only-ids " + only_ids[0], expected_errs=0)
+        os.remove("test_cos.npz")
+
     def test_bestrefs_at_file(self):
         self.run_script("crds.bestrefs --files @data/bestrefs_file_list  --new-context hst_0315.pmap --stats",
                         expected_errs=0)
@@ -1,5 +1,7 @@
 import os
+import io
 import doctest
+import contextlib
 from pprint import pprint as pp
 
 # ==================================================================================
@@ -12,6 +14,7 @@ from nose.tools import assert_raises, assert_true, assert_false
 from crds.core import utils, log, exceptions
 from crds import client
 from crds import data_file
+from crds.io import tables
 from crds import certify
 from crds.certify import CertifyScript
 from crds.certify import generic_tpn
@@ -1432,6 +1435,26 @@ def test_asdf_standard_requirement_succeed():
     >>> test_config.cleanup(old_state)
     """
 
+def test_certify_jobs_matches_serial():
+    """
+    Certifying with --jobs reports the same errors and unique error counts as a serial run.
+
+    >>> old_state = test_config.setup()
+    >>> def certify_with_jobs(jobs):
+    ...     script = TestCertifyScript("crds.certify data/hst_synphot_new_syn.fits data/hst_synphot_new_th.fits "
+    ...         "data/missing_keyword.fits data/j8bt05njq_raw.fits --comparison-context none --hst "
+    ...         "--max-errors-per-class 1 --jobs " + str(jobs))
+    ...     with contextlib.redirect_stdout(io.StringIO()):
+    ...         errors = script()
+    ...     return errors, script.ue_mixin.tracked_errors, dict(script.ue_mixin.count)
+    >>> serial = certify_with_jobs(1)
+    >>> serial[1]
+    4
+    >>> certify_with_jobs(2) == serial
+    True
+    >>> test_config.cleanup(old_state)
+    """
+
 # ==================================================================================
 class TestCertify(test_config.CRDSTestCase):
 
@@ -1467,6 +1490,36 @@ class TestCertify(test_config.CRDSTestCase):
         header = {"DETECTOR" : "WFD" }
         assert_raises(ValueError, cval.check, "foo.fits", header)
 
+    def test_character_validator_column_reports_rows(self):
+        tinfo = generic_tpn.TpnInfo('SEGMENT','C','C','R', ('FUVA',))
+        cval = validators.validator(tinfo)
+        with assert_raises(ValueError) as context:
+            cval.check(self.data('s7g1700gl_dead.fits'), {})
+        assert_true("'FUVB'" in str(context.exception))
+        assert_true("rows 5, 6, 7, 8, 9" in str(context.exception))
+
+    def test_real_validator_column_range(self):
+        tinfo = generic_tpn.TpnInfo('OBS_RATE','C','R','R', ('0:30000',))
+        cval = validators.validator(tinfo)
+        with assert_raises(ValueError) as context:
+            cval.check(self.data('s7g1700gl_dead.fits'), {})
+        assert_true("45000.0" in str(context.exception))
+        assert_true("rows 4, 9" in str(context.exception))
+        tinfo = generic_tpn.TpnInfo('OBS_RATE','C','R','R', ('0:45000',))
+        validators.validator(tinfo).check(self.data('s7g1700gl_dead.fits'), {})
+
+    def test_table_modes_duplicates_and_hashes(self):
+        tab = tables.tables(self.data('s7g1700gl_dead.fits'))[0]
+        modes = certify.certify.TableModes("new reference", tab, ["SEGMENT"])
+        assert_true(modes.modes == [(("SEGMENT", "FUVA"),), (("SEGMENT", "FUVB"),)])
+        assert_true(list(modes.mode_rows) == [0, 5])
+        assert_true(modes.mode_entry(1) == (5, tuple(zip(tab.colnames, tab.rows[5]))))
+        hashes, inexact = modes.row_hashes
+        assert_true(len(set(hashes)) == len(tab.rows))
+        assert_false(inexact.any())
+        other = certify.certify.TableModes("old reference", tab, ["SEGMENT", "OBS_RATE"])
+        assert_true(list(other.row_hashes[0]) == list(hashes))
+
     def test_character_validator_missing_required(self):
         tinfo = generic_tpn.TpnInfo('DETECTOR','H','C','R', ('WFC','HRC','SBC'))
         cval = validators.validator(tinfo)
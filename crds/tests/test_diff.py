@@ -568,6 +568,34 @@ def dt_diff_print_affected_instruments():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_diff_affected_region():
+    """
+    Only the match case and dates following the added useafter are affected:
+
+    >>> old_state = test_config.setup()
+    >>> from crds.core import rmap
+    >>> from crds.diff import AffectedRegion, remove_boring
+    >>> old = rmap.fetch_mapping("data/hst_acs_flshfile_0251.rmap", ignore_checksum=True)
+    >>> new = rmap.fetch_mapping("data/hst_acs_flshfile_0252.rmap", ignore_checksum=True)
+    >>> region = AffectedRegion.from_diffs(old, new, remove_boring(old.difference(new, include_header_diffs=True)))
+    >>> region.selector.keys()
+    [('WFC', 'ABCD', '2.0', 'LOW', 'B')]
+    >>> region.selector.choices()
+    ['2014-07-01 00:00:00']
+
+    >>> header = {"DETECTOR": "WFC", "CCDAMP": "ABCD", "CCDGAIN": "2.0", "FLASHCUR": "LOW", "SHUTRPOS": "B",
+    ...           "FLSHCORR": "PERFORM", "DATE-OBS": "2015-01-01", "TIME-OBS": "00:00:00"}
+    >>> region.contains(header, header)
+    True
+    >>> early = dict(header, **{"DATE-OBS": "2014-01-01"})
+    >>> region.contains(early, early)
+    False
+    >>> other_mode = dict(header, SHUTRPOS="A")
+    >>> region.contains(other_mode, other_mode)
+    False
+    >>> test_config.cleanup(old_state)
+    """
+
 def dt_diff_recurse_added_deleted_na():
     """
     For this test,  checking recursive terminal adds/deletes and N/A + OMIT at all levels:
@@ -11,7 +11,7 @@ from pprint import pprint as pp
 import doctest
 
 
-from crds.core import rmap, log, config, heavy_client
+from crds.core import rmap, log, config, heavy_client, snapshot
 from crds.core.exceptions import *
 from crds import tests
 from crds.tests import test_config
@@ -89,6 +89,20 @@ def dt_getreferences_ignore_cache():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_getrecommendations_batch():
+    """
+    >>> old_state = test_config.setup(url="https://jwst-crds-serverless.stsci.edu", observatory="jwst")
+    >>> header = { "META.INSTRUMENT.NAME":"MIRI", "META.EXPOSURE.TYPE":"MIR_IMAGE",
+    ...            "META.OBSERVATION.DATE":"2018-05-25", "META.OBSERVATION.TIME":"00:00:00" }
+    >>> expected = heavy_client.getrecommendations(header, context="jwst_0016.pmap", reftypes=["flat"])
+    >>> batch = heavy_client.getrecommendations_batch(
+    ...     [("ds1", header), ("ds2", header), ("ds3", header)], context="jwst_0016.pmap", reftypes=["flat"],
+    ...     chunk_size=2, processes=2)
+    >>> list(batch) == [("ds1", expected), ("ds2", expected), ("ds3", expected)]
+    True
+    >>> test_config.cleanup(old_state)
+    """
+
 def dt_cache_references_multiple_bad_files():
     """
 
@@ -214,6 +228,40 @@ def dt_pickled_mappings(mapping):
     >>> test_config.cleanup(old_state)
     """
 
+def dt_context_snapshots():
+    """
+    >>> old_state = test_config.setup()
+
+    >>> pickle_file = config.locate_pickle("jwst_0016.pmap","jwst")
+    >>> heavy_client.save_pickled_mapping("jwst_0016.pmap", rmap.load_mapping("jwst_0016.pmap"))  # doctest: +ELLIPSIS
+    CRDS - INFO -  Saved pickled context '.../pickles/jwst/jwst_0016.pmap.pkl'
+    >>> with open(pickle_file, "rb") as handle:
+    ...     snapshot.is_snapshot(handle.read())
+    True
+
+    >>> loaded = heavy_client.load_pickled_mapping("jwst_0016.pmap")
+    CRDS - INFO -  Loaded pickled context 'jwst_0016.pmap'
+    >>> len(loaded.selections._contents)    # no instruments materialized yet
+    0
+    >>> loaded.mapping_names() == rmap.load_mapping("jwst_0016.pmap").mapping_names()
+    True
+
+    >>> os.environ["CRDS_CONTEXT_PICKLE_FORMAT"] = "pickle"
+    >>> heavy_client.save_pickled_mapping("jwst_0016.pmap", rmap.load_mapping("jwst_0016.pmap"))  # doctest: +ELLIPSIS
+    CRDS - INFO -  Saved pickled context '.../pickles/jwst/jwst_0016.pmap.pkl'
+    >>> with open(pickle_file, "rb") as handle:
+    ...     snapshot.is_snapshot(handle.read())
+    False
+    >>> heavy_client.load_pickled_mapping("jwst_0016.pmap")
+    CRDS - INFO -  Loaded pickled context 'jwst_0016.pmap'
+    PipelineContext('jwst_0016.pmap')
+
+    >>> del os.environ["CRDS_CONTEXT_PICKLE_FORMAT"]
+    >>> heavy_client.remove_pickled_mapping("jwst_0016.pmap")  # doctest: +ELLIPSIS
+    CRDS - INFO -  Removed pickle for context '.../pickles/jwst/jwst_0016.pmap.pkl'
+    >>> test_config.cleanup(old_state)
+    """
+
 def dt_check_parameters():
     """
     >>> old_state = test_config.setup(url="https://jwst-crds-serverless.stsci.edu", observatory="jwst")
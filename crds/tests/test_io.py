@@ -123,7 +123,7 @@ def dt_fits_table():
     'DETCHIP'
 
     >>> tab.columns['DETCHIP'][:1]
-    (1,)
+    array([1], dtype='>i2')
     >>> test_config.cleanup(old_state)
     """
 
@@ -412,6 +412,52 @@ def dt_get_array_properties_extension_number3():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_scan_fits_headers():
+    """
+    >>> old_state = test_config.setup()
+    >>> import glob
+    >>> from crds.io import fits
+    >>> paths = sorted(glob.glob("data/*.fits"))
+    >>> raw_headers = data_file.scan_raw_headers(paths, threads=4)
+    >>> sorted(set(paths) - set(raw_headers))
+    ['data/j8btyyy_raw_bad.fits']
+    >>> all(raw_headers[path] == fits.FitsFile(path).get_raw_header(checksum=False, ignore_missing_end=False)
+    ...     for path in raw_headers)
+    True
+    >>> data_file.scan_raw_headers(["data/missing_file.unknown"])
+    {}
+    >>> paths = ["data/j8bt05njq_raw.fits", "data/j8bt06o6q_raw.fits", "data/y951738kl_hv.fits"]
+    >>> headers = data_file.get_free_headers(paths, ("DETECTOR", "INSTRUME"))
+    >>> all(headers[path] == data_file.get_free_header(path, ("DETECTOR", "INSTRUME"), None, None) for path in paths)
+    True
+    >>> headers["data/j8bt05njq_raw.fits"]["DETECTOR"]
+    'HRC'
+    >>> test_config.cleanup(old_state)
+    """
+
+def dt_persistent_header_cache():
+    """
+    >>> old_state = test_config.setup()
+    >>> import tempfile
+    >>> from crds.core import config
+    >>> from crds.io import header_cache
+    >>> os.environ["CRDS_HEADERPATH_SINGLE"] = tempfile.mkdtemp()
+    >>> old_enabled = config.CACHE_FILE_HEADERS.set("1")
+    >>> header = data_file.get_free_header("data/j8bt05njq_raw.fits", (), None, "hst")
+    >>> header_cache.is_cached("data/j8bt05njq_raw.fits", (), None, "hst")
+    True
+    >>> data_file.clear_header_cache()
+    >>> data_file.get_free_header("data/j8bt05njq_raw.fits", (), None, "hst") == header
+    True
+    >>> header_cache.trim(max_bytes=0)
+    >>> header_cache.is_cached("data/j8bt05njq_raw.fits", (), None, "hst")
+    False
+    >>> header_cache.close()
+    >>> _ = config.CACHE_FILE_HEADERS.set(old_enabled)
+    >>> del os.environ["CRDS_HEADERPATH_SINGLE"]
+    >>> test_config.cleanup(old_state)
+    """
+
 # ==================================================================================
 
 def main():
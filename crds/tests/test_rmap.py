@@ -581,6 +581,190 @@ selector = Match({
         with self.assertRaises(CrdsUnknownReftypeError):
             r.get_best_references(header, include=["flatfile"])
 
+    def test_rmap_lookup_cache(self):
+        old_size = config.BESTREFS_CACHE_SIZE.set("2")
+        try:
+            r = rmap.ReferenceMapping.from_file("data/hst_acs_darkfile_comment.rmap")
+        finally:
+            config.BESTREFS_CACHE_SIZE.set(old_size)
+        header = {
+            'CCDAMP': 'ABCD',
+            'CCDGAIN': '1.0',
+            'DARKCORR': 'UNDEFINED',
+            'DATE-OBS': '2002-07-18',
+            'DETECTOR': 'HRC',
+            'TIME-OBS': '18:09:15.773332'}
+        bad_header = dict(header, DETECTOR="FOO")
+        found = r.get_best_ref(header)
+        not_found = r.get_best_ref(bad_header)
+        assert found == r.get_best_ref(header) == 'n3o1022lj_drk.fits'
+        assert not_found == r.get_best_ref(bad_header)
+        assert not_found.startswith("NOT FOUND")
+        assert r.get_lookup_cache_stats() == dict(hits=2, misses=2, size=2, maxsize=2)
+        r.get_best_ref(dict(header, CCDGAIN="2.0"))   # evicts least recently used
+        assert r.get_lookup_cache_stats()["size"] == 2
+        q = pickle.loads(pickle.dumps(r))
+        assert q.get_lookup_cache_stats()["size"] == 0
+        r2 = r.delete("lcb12060j_drk.fits")
+        assert r2.get_lookup_cache_stats()["size"] == 0
+
+    def test_rmap_lookup_cache_relevance_keys(self):
+        old_size = config.BESTREFS_CACHE_SIZE.set("10")
+        try:
+            r = rmap.ReferenceMapping.from_string('''
+header = {
+    'derived_from' : 'created by hand',
+    'filekind' : 'BPIXTAB',
+    'instrument' : 'COS',
+    'mapping' : 'REFERENCE',
+    'name' : 'hst_cos_bpixtab.rmap',
+    'observatory' : 'HST',
+    'parkey' : (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')),
+    'parkey_relevance' : {
+        'detector' : '(OBSTYPE != "SPECTROSCOPIC")',
+    },
+}
+
+selector = Match({
+    ('NUV',) : UseAfter({
+        '1996-10-01 00:00:00' : 'nuv_bpx.fits',
+    }),
+})
+''', ignore_checksum=True)
+        finally:
+            config.BESTREFS_CACHE_SIZE.set(old_size)
+        header = {
+            "DETECTOR" : "FUV",
+            "OBSTYPE" : "IMAGING",
+            "DATE-OBS" : "2010-01-01",
+            "TIME-OBS" : "00:00:00",
+        }
+        assert r.get_best_ref(header).startswith("NOT FOUND")
+        assert r.get_best_ref(dict(header, OBSTYPE="SPECTROSCOPIC")) == "nuv_bpx.fits"
+        assert r.get_lookup_cache_stats()["misses"] == 2
+
+    def test_imap_get_best_references_batch(self):
+        i = rmap.get_cached_mapping("data/hst_acs_9999.imap")
+        header = {
+            "DETECTOR" : "SBC",
+            "CCDAMP" : "A",
+            "CCDGAIN" : "1.0",
+            "DATE-OBS" : "1993-01-01",
+            "TIME-OBS" : "12:00:00",
+            "OBSTYPE" : "IMAGING",
+            "FLATCORR" : "PERFORM",
+            "DQICORR" : "PERFORM",
+            "DRIZCORR" : "PERFORM",
+            "PHOTCORR" : "PERFORM",
+        }
+        header2 = dict(header, **{"DATE-OBS" : "2002-03-19", "TIME-OBS" : "00:34:32"})
+        headers = [header, header2, header]
+        expected = [rmap.get_best_references(i, hdr) for hdr in headers]
+        batch = rmap.get_best_references_batch(i, headers)
+        assert batch == expected
+        batch[0]["pctetab"] = "modified"
+        assert batch[2] == expected[2]
+
+    def test_rmap_compiled_code_cache(self):
+        from crds.core import mapping_verifier
+        os.environ["CRDS_CODEPATH"] = self.temp_dir
+        old = config.CACHE_COMPILED_MAPPINGS.set("1")
+        try:
+            with open("data/hst_acs_darkfile_comment.rmap") as handle:
+                text = handle.read()
+            assert not mapping_verifier.is_code_cached(text)
+            r = rmap.ReferenceMapping.from_string(text, ignore_checksum=True)
+            assert mapping_verifier.is_code_cached(text)
+            r2 = rmap.ReferenceMapping.from_string(text, ignore_checksum=True)
+            assert r2.todict() == r.todict()
+            i = rmap.load_mapping("data/hst_acs_9999.imap")
+            rmap.compile_mappings(i, 2)
+            for name in i.selections.normal_keys():
+                with open(rmap.locate_mapping(i.selector[name])) as handle:
+                    assert mapping_verifier.is_code_cached(handle.read())
+        finally:
+            config.CACHE_COMPILED_MAPPINGS.set(old)
+            del os.environ["CRDS_CODEPATH"]
+
+    def test_rmap_compiled_code_cache_untrusted(self):
+        from crds.core import mapping_verifier
+        os.environ["CRDS_CODEPATH"] = self.temp_dir
+        old = config.CACHE_COMPILED_MAPPINGS.set("1")
+        try:
+            text = "header = {}\nselector = {}\n"
+            key = mapping_verifier.code_key(text)
+            mapping_verifier.MAPPING_VERIFIER.compile_and_check(text)
+            assert mapping_verifier.load_code(key) is not None
+            os.chmod(mapping_verifier.locate_code(key), 0o666)
+            assert not mapping_verifier.is_code_cached(text)
+            assert mapping_verifier.load_code(key) is None
+        finally:
+            config.CACHE_COMPILED_MAPPINGS.set(old)
+            del os.environ["CRDS_CODEPATH"]
+
+    def test_rmap_compiled_code_cache_default_off(self):
+        from crds.core import mapping_verifier
+        assert not config.CACHE_COMPILED_MAPPINGS
+        os.environ["CRDS_CODEPATH"] = self.temp_dir
+        try:
+            text = "header = {}\nselector = {}\n"
+            mapping_verifier.MAPPING_VERIFIER.compile_and_check(text)
+            assert not mapping_verifier.is_code_cached(text)
+        finally:
+            del os.environ["CRDS_CODEPATH"]
+
+    def test_rmap_native_reader(self):
+        import glob
+        from crds.core import mapping_reader
+        for path in glob.glob("data/*.rmap"):
+            with open(path) as handle:
+                text = handle.read()
+            try:
+                mapping_reader.read_mapping(text)
+            except mapping_reader.UnsupportedSyntaxError:
+                continue
+            try:
+                exec_ = rmap.ReferenceMapping.from_string(text, ignore_checksum=True)
+            except Exception:
+                exec_ = None
+            os.environ["CRDS_MAPPING_PARSER"] = "native"
+            try:
+                if exec_ is None:
+                    assert_raises(Exception, rmap.ReferenceMapping.from_string, text, ignore_checksum=True)
+                    continue
+                native = rmap.ReferenceMapping.from_string(text, ignore_checksum=True)
+            finally:
+                del os.environ["CRDS_MAPPING_PARSER"]
+            assert native.todict() == exec_.todict(), path
+            assert native.comment == exec_.comment, path
+
+    def test_rmap_native_reader_fallback(self):
+        from crds.core import mapping_reader
+        text = "header = {'name':'x.rmap', 'parkey':(('DETECTOR',),), 'a':1 < 2}\nselector = Match({})\n"
+        assert_raises(mapping_reader.UnsupportedSyntaxError, mapping_reader.read_mapping, text)
+        os.environ["CRDS_MAPPING_PARSER"] = "native"
+        try:
+            header, _selector, _comment = rmap.Mapping._parse_header_selector(text)
+            assert header["a"] is True
+            assert_raises(MappingError, rmap.Mapping._parse_header_selector, text.replace("1 < 2", "__import__('os')"))
+        finally:
+            del os.environ["CRDS_MAPPING_PARSER"]
+
+    def test_snapshot_loads_only_used_rmaps(self):
+        from crds.core import snapshot
+        i = rmap.load_mapping("data/hst_acs_9999.imap")
+        i.force_load()
+        header = {
+            "DETECTOR" : "SBC",
+            "DATE-OBS" : "1993-01-01",
+            "TIME-OBS" : "12:00:00",
+        }
+        expected = rmap.get_best_references(i, header, include=["biasfile"])
+        lazy = snapshot.loads(snapshot.dumps(i))
+        assert rmap.get_best_references(lazy, header, include=["biasfile"]) == expected
+        assert list(lazy.selections._contents) == ["biasfile"]
+        assert lazy.get_required_parkeys() == i.get_required_parkeys()
+
     def test_rmap_get_parkey_map(self):
         i = rmap.get_cached_mapping("hst_acs.imap")
         i.get_parkey_map() == {'APERTURE': ['*',
@@ -57,7 +57,7 @@ TEST CASES
 >>> from crds.tests import test_config
 >>> old_state = test_config.setup()
 
->>> from crds.rowdiff import RowDiffScript
+>>> from crds.rowdiff import RowDiff, RowDiffScript
 
 Only should work with Table extensions
     >>> case = RowDiffScript(argv="rowdiff.py data/hst_acs_biasfile_0001.fits data/hst_acs_biasfile_0002.fits")
@@ -304,6 +304,86 @@ Mode test: duplicate modes
         no      yes        -1 -2689.26...   ogeed
     <BLANKLINE>
 
+Hash engine: row change
+    >>> case = RowDiffScript(argv="rowdiff.py --engine=hash data/test-source.fits data/test-change-row1-valueLeft.fits")
+    >>> case.run() # doctest: +ELLIPSIS
+    Row differences for HDU extension #1
+    <BLANKLINE>
+        Summary:
+            a rows 1-1 differ from b rows 1-1
+    <BLANKLINE>
+        Row difference, unified diff format:
+            --- Table A
+    <BLANKLINE>
+            +++ Table B
+    <BLANKLINE>
+            @@ -1,5 +1,5 @@
+    <BLANKLINE>
+             'yes', 'yes', 2988, -2779.03..., 'coquille'
+            -'yes', 'no', 5748, 6357.97..., 'ferly'
+            +'yes', 'no', -1, 6357.97..., 'ferly'
+             'yes', 'maybe', 9735, -9132.53..., 'misreliance'
+             'no', 'yes', 425, -2689.26..., 'ogeed'
+             'no', 'no', 8989, 9870.02..., 'readmittance'
+    <BLANKLINE>
+
+Hash engine: row addition, summary only
+    >>> rdiff = RowDiff("data/test-single-modes.fits", "data/test-source.fits", engine="hash")
+    >>> rdiff.summary_only = True
+    >>> rdiff.report()
+    Row differences for HDU extension #1
+    <BLANKLINE>
+        Summary:
+            Add to b rows 1-3
+            Add to b rows 5-7
+
+Hash engine: no differences
+    >>> case = RowDiffScript(argv="rowdiff.py --engine=hash --ignore-fields=valueleft data/test-source.fits data/test-change-row1-valueLeft.fits")
+    >>> case.run()
+        HDU extension #1 contains no differences
+
+Hash engine: duplicate modes
+    >>> case = RowDiffScript(argv="rowdiff.py --engine=hash --mode-fields=modeup,modedown data/test-source.fits data/test-duplicate-mode.fits")
+    >>> case.run()  # doctest: +ELLIPSIS
+    Difference for HDU extension #1
+    <BLANKLINE>
+        Table A has all modes.
+    <BLANKLINE>
+        Table B changes:
+    <BLANKLINE>
+            Duplicated Modes:
+    modeup modedown
+    ------ --------
+        no    maybe
+    <BLANKLINE>
+        Table A to B changes:
+    <BLANKLINE>
+            Duplicated Modes:
+    modeup modedown
+    ------ --------
+        no    maybe
+    <BLANKLINE>
+        Common mode changes:
+        If there were duplicate modes, the following may be nonsensical.
+    <BLANKLINE>
+            Changed Modes:
+            From Table A:
+    modeup modedown valueleft valueright wordage
+    ------ -------- --------- ---------- -------
+        no      yes       425 -2689.26...   ogeed
+    <BLANKLINE>
+            To Table B:
+    modeup modedown valueleft valueright wordage
+    ------ -------- --------- ---------- -------
+        no      yes        -1 -2689.26...   ogeed
+    <BLANKLINE>
+
+Unknown engine
+    >>> RowDiff("data/test-source.fits", "data/test-source.fits", engine="fast")
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Unknown engine 'fast', must be one of difflib, hash
+
 CLEANUP
 
     >>> test_config.cleanup(old_state)
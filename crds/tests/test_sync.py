@@ -4,8 +4,8 @@ a CRDS cache of rules and references.
 import os
 
 import crds
-from crds.core import config, rmap
-from crds.sync import SyncScript
+from crds.core import config, rmap, utils
+from crds.sync import SyncScript, ChecksumLedger
 from crds.tests import test_config
 
 # ==================================================================================
@@ -38,6 +38,19 @@ class TestSync(test_config.CRDSTestCase):
         self.run_script("crds.sync --files hst_cos_deadtab.rmap --check-files --repair-files --check-sha1sum")
         crds.get_cached_mapping("hst_cos_deadtab.rmap")
 
+    def test_sync_checksum_ledger(self):
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum --hash-workers 4")
+        ledger = ChecksumLedger(config.get_checksum_ledger_path("hst"))
+        for name in crds.get_cached_mapping("hst_cos_deadtab.rmap").reference_names():
+            path = config.locate_file(name, "hst")
+            self.assertEqual(ledger.lookup(path), utils.checksum(path))
+            with open(path, "w+") as handle:
+                handle.write("foo")
+            self.assertIsNone(ledger.lookup(path))
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --repair-files --check-sha1sum")
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum --force-rehash")
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum --max-checksum-age 1")
+
     def test_sync_readonly_cache(self):
         super(TestSync, self).setUp()
         # self.tearDown()   # switch to default test environment (currently) from hst-crds-dev.csh